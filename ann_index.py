@@ -0,0 +1,279 @@
+"""
+Approximate nearest-neighbour search over embeddings, in pure NumPy.
+
+`IVFPQIndex` is an inverted-file index with product quantization:
+
+* k-means splits the vectors into `nlist` cells; a query only visits the
+  `nprobe` cells whose centroids are closest to it.
+* Inside a cell, each vector is stored as the residual from its centroid,
+  compressed to `m` one-byte codes (one per subspace). Distances are
+  computed from per-query lookup tables without decompressing anything.
+* Optionally the best `k * refine` candidates are re-ranked with the exact
+  vectors.
+
+`nprobe` and `refine` trade recall for latency at query time. Indexes are
+saved as plain `.npy` files and loaded with `mmap_mode="r"`; vectors can be
+added without retraining.
+"""
+
+import os
+import json
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+
+ARRAYS = ("centroids", "codebooks", "codes", "ids", "lists")
+
+
+def _squared_distances(x, centroids):
+    x_norms = np.einsum("ij,ij->i", x, x)[:, None]
+    c_norms = np.einsum("ij,ij->i", centroids, centroids)[None, :]
+    return x_norms - 2 * x @ centroids.T + c_norms
+
+
+def assign(x, centroids, block_rows=16384):
+    """Index of the nearest centroid for each row of `x`."""
+    # ||x||^2 is the same for every centroid, so it does not affect argmin
+    c_norms = np.einsum("ij,ij->i", centroids, centroids)
+    labels = np.empty(len(x), dtype=np.int64)
+    for start in range(0, len(x), block_rows):
+        block = np.ascontiguousarray(x[start : start + block_rows], dtype=np.float32)
+        dists = block @ centroids.T
+        dists *= -2
+        dists += c_norms
+        labels[start : start + len(block)] = dists.argmin(1)
+    return labels
+
+
+def kmeans(x, k, iterations=20, seed=0):
+    """Lloyd's k-means; empty clusters are re-seeded from random points."""
+    rng = np.random.default_rng(seed)
+    x = np.ascontiguousarray(x, dtype=np.float32)
+    if len(x) < k:
+        raise ValueError(f"Need at least {k} training vectors, got {len(x)}")
+
+    centroids = x[rng.choice(len(x), size=k, replace=False)].copy()
+    for _ in range(iterations):
+        labels = assign(x, centroids)
+        counts = np.bincount(labels, minlength=k)
+        empty = counts == 0
+
+        order = np.argsort(labels, kind="stable")
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[~empty]
+        sums = np.add.reduceat(x[order], starts, axis=0)
+        centroids[~empty] = sums / counts[~empty, None]
+        if empty.any():
+            centroids[empty] = x[rng.choice(len(x), size=int(empty.sum()), replace=False)]
+
+    return centroids
+
+
+class IVFPQIndex:
+    """
+    Inverted-file index with product-quantized residuals (squared L2).
+
+    Args:
+        dim (int): Vector dimension; must be divisible by `m`.
+        nlist (int): Number of k-means cells.
+        m (int): Number of PQ subspaces, i.e. bytes per stored vector.
+        nprobe (int): Default number of cells visited per query.
+        seed (int): Seed for k-means initialization and training samples.
+    """
+
+    def __init__(self, dim, nlist=256, m=16, nprobe=8, seed=0):
+        if dim % m:
+            raise ValueError(f"dim ({dim}) must be divisible by m ({m})")
+        self.dim = dim
+        self.nlist = nlist
+        self.m = m
+        self.ksub = 256
+        self.nprobe = nprobe
+        self.seed = seed
+        self.path = None
+
+        self.centroids = None
+        self.codebooks = None
+        self.codes = np.zeros((0, m), dtype=np.uint8)
+        self.ids = np.zeros(0, dtype=np.int64)
+        # Codes and ids are kept sorted by cell; cell c is
+        # codes[offsets[c]:offsets[c + 1]]
+        self.lists = np.zeros(0, dtype=np.int32)
+        self.offsets = np.zeros(nlist + 1, dtype=np.int64)
+        self._dirty = False
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def train(self, vectors, max_samples=50000, iterations=20):
+        """Fit the coarse centroids and the PQ codebooks on a sample."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        rng = np.random.default_rng(self.seed)
+        if len(vectors) > max_samples:
+            vectors = vectors[np.sort(rng.choice(len(vectors), max_samples, replace=False))]
+
+        self.centroids = kmeans(vectors, self.nlist, iterations, self.seed)
+        residuals = vectors - self.centroids[assign(vectors, self.centroids)]
+
+        dsub = self.dim // self.m
+        ksub = min(self.ksub, len(vectors))
+        self.codebooks = np.stack(
+            [
+                kmeans(residuals[:, j * dsub : (j + 1) * dsub], ksub, iterations, self.seed)
+                for j in range(self.m)
+            ]
+        )
+        self._dirty = True
+        return self
+
+    def encode(self, vectors, lists):
+        """PQ codes of the residuals of `vectors` from their cells."""
+        residuals = vectors - self.centroids[lists]
+        dsub = self.dim // self.m
+        codes = np.empty((len(vectors), self.m), dtype=np.uint8)
+        for j in range(self.m):
+            codes[:, j] = assign(residuals[:, j * dsub : (j + 1) * dsub], self.codebooks[j])
+        return codes
+
+    def add(self, vectors, ids=None):
+        """Add vectors under `ids` (default: consecutive after the last add)."""
+        if not self.is_trained:
+            raise RuntimeError("Index must be trained before vectors are added")
+
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if ids is None:
+            first = int(self.ids.max()) + 1 if len(self.ids) else 0
+            ids = np.arange(first, first + len(vectors))
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(vectors) == 0:
+            return self
+
+        lists = assign(vectors, self.centroids).astype(np.int32)
+        codes = self.encode(vectors, lists)
+
+        lists = np.concatenate([self.lists, lists])
+        order = np.argsort(lists, kind="stable")
+        self.lists = lists[order]
+        self.codes = np.concatenate([self.codes, codes])[order]
+        self.ids = np.concatenate([self.ids, ids])[order]
+        self.offsets = np.searchsorted(self.lists, np.arange(self.nlist + 1))
+        self._dirty = True
+        return self
+
+    def _search_one(self, query, nprobe, candidates):
+        coarse = _squared_distances(query[None, :], self.centroids)[0]
+        nprobe = min(nprobe, self.nlist)
+        probes = np.argpartition(coarse, nprobe - 1)[:nprobe]
+
+        starts = self.offsets[probes]
+        lengths = self.offsets[probes + 1] - starts
+        total = int(lengths.sum())
+        if total == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        # One lookup table per probed cell: distance from the query residual
+        # to every codeword of every subspace, shape (nprobe, m, ksub)
+        dsub = self.dim // self.m
+        residuals = (query[None, :] - self.centroids[probes]).reshape(nprobe, self.m, 1, dsub)
+        tables = ((residuals - self.codebooks[None]) ** 2).sum(-1)
+
+        positions = np.arange(total) + np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        probe_of = np.repeat(np.arange(nprobe), lengths)
+        codes = self.codes[positions]
+        dists = tables[probe_of[:, None], np.arange(self.m), codes].sum(1)
+
+        if len(dists) > candidates:
+            top = np.argpartition(dists, candidates - 1)[:candidates]
+        else:
+            top = np.arange(len(dists))
+        return self.ids[positions[top]], dists[top]
+
+    def search(self, queries, k=10, nprobe=None, vectors=None, refine=1):
+        """
+        The `k` nearest stored ids for each query.
+
+        Args:
+            queries: Array of shape (num_queries, dim) or (dim,).
+            nprobe (int, optional): Cells visited per query; more is slower
+                and more accurate.
+            vectors: Exact vectors indexable by id (e.g. the embedding
+                cache memmap). With `refine` > 1, the best `k * refine`
+                PQ candidates are re-ranked with these.
+
+        Returns:
+            (ids, distances), each of shape (num_queries, k), nearest first.
+            Missing results have id -1 and distance inf.
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        single = queries.ndim == 1
+        queries = np.atleast_2d(queries)
+        nprobe = nprobe or self.nprobe
+        candidates = k * refine if vectors is not None else k
+
+        out_ids = np.full((len(queries), k), -1, dtype=np.int64)
+        out_dists = np.full((len(queries), k), np.inf, dtype=np.float32)
+        for row, query in enumerate(queries):
+            ids, dists = self._search_one(query, nprobe, candidates)
+            if vectors is not None and len(ids):
+                ids = np.sort(ids)
+                exact = np.asarray(vectors[ids], dtype=np.float32)
+                dists = ((exact - query) ** 2).sum(1)
+            order = np.argsort(dists, kind="stable")[:k]
+            out_ids[row, : len(order)] = ids[order]
+            out_dists[row, : len(order)] = dists[order]
+
+        if single:
+            return out_ids[0], out_dists[0]
+        return out_ids, out_dists
+
+    def save(self, directory):
+        """Write the index as `.npy` files plus `meta.json` under `directory`."""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+
+        for name in ARRAYS:
+            fd, tmp_name = tempfile.mkstemp(dir=directory, suffix=".npy.tmp")
+            with os.fdopen(fd, "wb") as f_out:
+                np.save(f_out, getattr(self, name))
+            os.replace(tmp_name, directory / f"{name}.npy")
+
+        meta = {
+            "dim": self.dim,
+            "nlist": self.nlist,
+            "m": self.m,
+            "nprobe": self.nprobe,
+            "seed": self.seed,
+        }
+        (directory / "meta.json").write_text(json.dumps(meta))
+        self.path = directory
+        self._dirty = False
+        return directory
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """Load a saved index; with `mmap` the arrays are memory-mapped."""
+        directory = Path(directory)
+        meta = json.loads((directory / "meta.json").read_text())
+        index = cls(**meta)
+        mmap_mode = "r" if mmap else None
+        for name in ARRAYS:
+            setattr(index, name, np.load(directory / f"{name}.npy", mmap_mode=mmap_mode))
+        index.offsets = np.searchsorted(index.lists, np.arange(index.nlist + 1))
+        index.path = directory
+        return index
+
+    def __getstate__(self):
+        # A saved, unchanged index is pickled as a reference to its files
+        if self.path is not None and not self._dirty:
+            return {"path": self.path}
+        return self.__dict__.copy()
+
+    def __setstate__(self, state):
+        if set(state) == {"path"}:
+            state = IVFPQIndex.load(state["path"]).__dict__
+        self.__dict__.update(state)
@@ -0,0 +1,304 @@
+"""
+Semantic cache of agent answers.
+
+FAQ questions repeat a lot, often with different wording. `AnswerCache`
+embeds each answered question and returns the stored answer for a new
+question whose embedding is at least `threshold` cosine-similar to a
+cached one. Answers are only reused within the same scope: the system
+prompt, the model and the indexed documents (`scope_key`), so changing
+any of them never serves an old answer.
+
+The cache is kept in memory, saved to `ANSWER_CACHE_DIRECTORY` after every
+change, and bounded by `max_size` (least recently used entries go first)
+and `ttl` seconds.
+"""
+
+import os
+import re
+import json
+import time
+import zlib
+import hashlib
+import weakref
+import threading
+from pathlib import Path
+
+import numpy as np
+
+
+ANSWER_CACHE_DIR = Path(os.getenv("ANSWER_CACHE_DIRECTORY", "answer_cache"))
+
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1000"))
+
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", str(7 * 24 * 3600)))
+
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.9"))
+
+# "hashing" for the dependency-free embedder, or a sentence-transformers model
+ANSWER_CACHE_EMBEDDING_MODEL = os.getenv("ANSWER_CACHE_EMBEDDING_MODEL", "hashing")
+
+# Misses whose best match was this close below the threshold are counted
+# as near misses, to help tune the threshold
+NEAR_MISS_MARGIN = 0.05
+
+
+STOP_WORDS = frozenset(
+    "a an and are as at be but by can could did do does for from had has have how "
+    "i if in into is it its me my of on or our should so that the their them then "
+    "there these this to was we what when where which who why will with would you "
+    "your".split()
+)
+
+
+class HashingEmbedder:
+    """
+    Hashed bag of words and character trigrams, as unit vectors.
+
+    Needs no model download, and matches questions that share most of their
+    content words regardless of case, punctuation, order, stop words or
+    small spelling changes. Trigrams count half as much as whole words.
+    """
+
+    def __init__(self, dim=1024):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def features(self, text):
+        words = [w for w in re.findall(r"\w+", text.lower()) if w not in STOP_WORDS]
+        grams = [f"#{w[i:i + 3]}" for w in words for i in range(max(len(w) - 2, 1))]
+        return [(word, 1.0) for word in words] + [(gram, 0.5) for gram in grams]
+
+    def encode(self, texts, batch_size=64):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, weight in self.features(text):
+                h = zlib.crc32(feature.encode("utf-8"))
+                vectors[row, h % self.dim] += weight if h & 2**31 else -weight
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+def make_embedder(model_name=ANSWER_CACHE_EMBEDDING_MODEL):
+    if model_name == "hashing":
+        return HashingEmbedder()
+    from embeddings import SentenceTransformerEmbedder
+
+    return SentenceTransformerEmbedder(model_name)
+
+
+_fingerprints = weakref.WeakKeyDictionary()
+_fingerprints_lock = threading.Lock()
+
+
+def corpus_fingerprint(index):
+    """
+    Digest of the documents in `index`, stable across restarts.
+
+    Computed once per index and `version`, so patched indexes get a new one.
+    """
+    version = getattr(index, "version", None)
+    with _fingerprints_lock:
+        cached = _fingerprints.get(index)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    digest = hashlib.sha256()
+    for doc in index.docs:
+        digest.update(json.dumps(dict(doc), sort_keys=True, default=str).encode("utf-8"))
+    fingerprint = digest.hexdigest()[:16]
+    with _fingerprints_lock:
+        _fingerprints[index] = (version, fingerprint)
+    return fingerprint
+
+
+def scope_key(system_prompt, corpus, model_name=None):
+    """Key under which answers may be shared: prompt, corpus and model."""
+    payload = json.dumps([system_prompt, corpus, model_name])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class AnswerCache:
+    """
+    Thread-safe, persistent cache of answers looked up by question similarity.
+
+    Args:
+        directory (str or Path, optional): Where the cache is saved; None
+            keeps it in memory only.
+        embedder (optional): Object with `name` and `encode(texts)` returning
+            unit vectors; defaults to `make_embedder()`.
+        threshold (float): Minimum cosine similarity for a hit.
+        max_size (int): Entries kept; 0 disables the cache.
+        ttl (float): Seconds an answer stays valid.
+    """
+
+    def __init__(
+        self,
+        directory=ANSWER_CACHE_DIR,
+        embedder=None,
+        threshold=ANSWER_CACHE_THRESHOLD,
+        max_size=ANSWER_CACHE_SIZE,
+        ttl=ANSWER_CACHE_TTL,
+    ):
+        self.directory = Path(directory) if directory is not None else None
+        self.embedder = embedder or make_embedder()
+        self.threshold = threshold
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = []
+        self._vectors = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.near_misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._load()
+
+    def _embed(self, question):
+        return np.asarray(self.embedder.encode([question]), dtype=np.float32)[0]
+
+    def get(self, question, scope=None):
+        """
+        Stored answer for the most similar cached question in `scope`, or
+        None if none reaches the threshold. Returns (answer, similarity).
+        """
+        if self.max_size <= 0:
+            return None
+        vector = self._embed(question)
+
+        with self._lock:
+            self._expire()
+            best, similarity = None, -1.0
+            if self._entries:
+                sims = self._vectors @ vector
+                for row in np.argsort(-sims):
+                    if self._entries[row]["scope"] == scope:
+                        best, similarity = row, float(sims[row])
+                        break
+
+            if best is None or similarity < self.threshold:
+                self.misses += 1
+                if similarity >= self.threshold - NEAR_MISS_MARGIN:
+                    self.near_misses += 1
+                return None
+
+            # Recency is saved with the next put; losing it on a crash only
+            # affects which entry is evicted first
+            entry = self._entries[best]
+            entry["last_used"] = time.time()
+            entry["hits"] += 1
+            self.hits += 1
+            return entry["answer"], similarity
+
+    def put(self, question, answer, scope=None):
+        """Store `answer` for `question`, replacing an identical question."""
+        if self.max_size <= 0:
+            return
+        vector = self._embed(question)
+        now = time.time()
+
+        with self._lock:
+            self._expire()
+            for row, entry in enumerate(self._entries):
+                if entry["question"] == question and entry["scope"] == scope:
+                    self._delete([row])
+                    break
+
+            self._entries.append(
+                {
+                    "question": question,
+                    "answer": answer,
+                    "scope": scope,
+                    "created": now,
+                    "last_used": now,
+                    "hits": 0,
+                }
+            )
+            rows = [vector] if self._vectors is None else [self._vectors, vector[None]]
+            self._vectors = np.vstack(rows).astype(np.float32)
+
+            excess = len(self._entries) - self.max_size
+            if excess > 0:
+                lru = sorted(
+                    range(len(self._entries)), key=lambda r: self._entries[r]["last_used"]
+                )
+                self._delete(lru[:excess])
+                self.evictions += excess
+            self._save()
+
+    def _delete(self, rows):
+        keep = sorted(set(range(len(self._entries))) - set(rows))
+        self._entries = [self._entries[row] for row in keep]
+        self._vectors = self._vectors[keep] if keep else None
+
+    def _expire(self):
+        now = time.time()
+        expired = [
+            row
+            for row, entry in enumerate(self._entries)
+            if now - entry["created"] > self.ttl
+        ]
+        if expired:
+            self._delete(expired)
+            self.expirations += len(expired)
+
+    def clear(self):
+        with self._lock:
+            self._entries = []
+            self._vectors = None
+            self._save()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "near_misses": self.near_misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _save(self):
+        if self.directory is None:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        meta = {"embedder": self.embedder.name, "entries": self._entries}
+        vectors = self._vectors if self._vectors is not None else np.zeros((0, 0))
+
+        # Each file is replaced atomically; if a crash leaves them out of
+        # step, the row counts differ and the cache starts empty
+        tmp_path = self.directory / "vectors.tmp.npy"
+        np.save(tmp_path, vectors)
+        os.replace(tmp_path, self.directory / "vectors.npy")
+        tmp_path = self.directory / "entries.json.tmp"
+        tmp_path.write_text(json.dumps(meta), encoding="utf-8")
+        os.replace(tmp_path, self.directory / "entries.json")
+
+    def _load(self):
+        if self.directory is None:
+            return
+        meta_path = self.directory / "entries.json"
+        vectors_path = self.directory / "vectors.npy"
+        if not meta_path.exists() or not vectors_path.exists():
+            return
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            vectors = np.load(vectors_path)
+        except (OSError, ValueError):
+            return
+        # Vectors from another embedder are not comparable
+        if meta.get("embedder") != self.embedder.name:
+            return
+        if len(meta["entries"]) != len(vectors):
+            return
+        self._entries = meta["entries"]
+        self._vectors = vectors.astype(np.float32) if len(vectors) else None
+        self._expire()
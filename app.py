@@ -7,65 +7,116 @@ including chat functionality, search demonstrations, and evaluation dashboards.
 """
 
 import streamlit as st
-import asyncio
-import concurrent.futures
+import time
+import functools
 from dotenv import load_dotenv
+import answer_cache
+import async_runner
 import ingest
 import search_agent
+import scheduler
+import shards
+import single_flight
 import logs
+import profiling
+import streaming
+import tracing
 from datetime import datetime
 
 # Load environment variables
 load_dotenv()
 
-# Repository configuration
-REPO_OWNER = "DataTalksClub"
-REPO_NAME = "faq"
+# Repository configuration: comma-separated "owner/name" list in GITSENSEI_REPOS
+REPOS = shards.parse_repos(shards.REPOS)
+REPO_OWNER, REPO_NAME = REPOS[0].split("/")
+
+
+def run_agent(agent, prompt, flight=None, key=None, profile=None):
+    """
+    Run the agent on the shared background loop and wait for the result.
+    With `flight`, concurrent identical questions (same `key`) share a run.
+    `profile=True` profiles the run; None samples at `PROFILE_SAMPLE_RATE`.
+    """
+    if flight is None:
+        coro = agent.run(user_prompt=prompt)
+    else:
+        coro = flight.run(key, lambda _: agent.run(user_prompt=prompt))
+    coro = profiling.profile_coro(coro, enabled=profile)
+    return async_runner.shared_runner().run(coro)
+
+
+def show_trace(request):
+    """Where the time of an answer went, from its trace."""
+    summary = request.summary()
+    with st.expander("Diagnostics"):
+        cols = st.columns(4)
+        cols[0].metric("Total", f"{summary['total_s']:.2f} s")
+        cols[1].metric("Model", f"{summary['model_s']:.2f} s", f"{summary['model_calls']} calls")
+        cols[2].metric("Queue wait", f"{summary['queue_wait_s']:.2f} s")
+        cols[3].metric("Tools", f"{summary['tool_s']:.2f} s", f"{summary['tool_calls']} calls")
+        if "profile" in request.attributes:
+            st.caption(f"Profile: {request.attributes['profile']}")
+        st.dataframe(
+            [
+                {
+                    "span": s.name,
+                    "ms": round(s.duration * 1000, 1),
+                    "attributes": ", ".join(f"{k}={v}" for k, v in s.attributes.items()),
+                    "error": s.error or "",
+                }
+                for s in sorted(request.spans(), key=lambda s: s.start_time_ns)
+            ],
+            use_container_width=True,
+        )
 
 
-def run_agent_in_thread(agent, prompt):
-    """Run the agent in a separate thread to avoid event loop conflicts."""
+@st.cache_resource
+def init_single_flight():
+    """In-flight runs shared by all sessions; used on the background loop only."""
+    return single_flight.SingleFlight()
 
-    def run_async():
-        try:
-            # Try to get the current event loop
-            loop = asyncio.get_event_loop()
-            if loop.is_running():
-                # If loop is already running, create a new one
-                new_loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(new_loop)
-                try:
-                    return new_loop.run_until_complete(agent.run(user_prompt=prompt))
-                finally:
-                    new_loop.close()
-            else:
-                return loop.run_until_complete(agent.run(user_prompt=prompt))
-        except RuntimeError:
-            # No event loop exists, create one
-            return asyncio.run(agent.run(user_prompt=prompt))
 
-    # Run in thread pool to avoid blocking Streamlit
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        future = executor.submit(run_async)
-        return future.result()
+@st.cache_resource
+def init_answer_cache():
+    """Answer cache shared by all sessions."""
+    return answer_cache.AnswerCache()
 
 
 @st.cache_resource
 def init_agent():
-    """Initialize the GitSensei agent with cached resources."""
+    """
+    Initialize the GitSensei agent with cached resources.
+
+    Returns the agent and a function returning its current answer cache
+    scope, or (None, None).
+    """
     try:
+        # Model calls share one connection pool on the shared background loop,
+        # and one request quota
+        model = scheduler.ScheduledModel(
+            search_agent.google_model(async_runner.shared_runner().http_client())
+        )
+
+        if len(REPOS) > 1:
+            # Shards are indexed on first use and shared by all sessions
+            st.write("🤖 Initializing GitSensei agent...")
+            manager = shards.ShardManager(REPOS)
+            agent = search_agent.init_sharded_agent(manager, model=model)
+            st.write("✅ Agent initialized successfully!")
+            return agent, functools.partial(search_agent.answer_scope, REPOS, manager=manager)
+
         st.write("🔄 Indexing repository...")
         index = ingest.index_data(REPO_OWNER, REPO_NAME)
         st.write("✅ Data indexed successfully!")
 
         st.write("🤖 Initializing GitSensei agent...")
-        agent = search_agent.init_agent(index, REPO_OWNER, REPO_NAME)
+        agent = search_agent.init_agent(index, REPO_OWNER, REPO_NAME, model=model)
         st.write("✅ Agent initialized successfully!")
 
-        return agent
+        return agent, functools.partial(search_agent.answer_scope, REPOS, index)
     except Exception as e:
         st.error(f"Failed to initialize agent: {e}")
-        return None
+        return None, None
 
 
 def main():
@@ -77,12 +128,33 @@ def main():
     st.caption("Ask me anything about GitHub repositories and development practices")
 
     # Initialize agent
-    agent = init_agent()
+    agent, scope = init_agent()
+    cache = init_answer_cache()
+    flight = init_single_flight()
 
     if agent is None:
         st.error("Failed to initialize the agent. Please check your configuration.")
         return
 
+    # Requests beyond the per-minute quota wait in the scheduler's queue
+    quota = scheduler.shared_scheduler().stats()
+    with st.sidebar.expander("Model quota"):
+        st.metric("Queued requests", quota["queued"])
+        st.metric("Queue wait (p95)", f"{quota['wait_p95_s']:.1f} s")
+        st.caption(
+            f"{scheduler.MODEL_RPM:g} requests/min · "
+            f"{quota['rate_limited']} rate-limit responses · {quota['retries']} retries"
+        )
+
+    show_diagnostics = st.sidebar.checkbox(
+        "Show diagnostics", help="Per-stage timings of each answer"
+    )
+    # Unchecked, requests are still sampled at PROFILE_SAMPLE_RATE
+    profile = st.sidebar.checkbox(
+        "Profile requests",
+        help=f"Save a cProfile and allocation report of each answer to {profiling.PROFILE_DIRECTORY}",
+    ) or None
+
     # Chat interface
     if "messages" not in st.session_state:
         st.session_state.messages = []
@@ -105,28 +177,74 @@ def main():
         with st.chat_message("assistant"):
             with st.spinner("Thinking..."):
                 try:
-                    # Run agent synchronously (handles async internally)
-                    response = run_agent_in_thread(agent, prompt)
-
-                    # Log interaction
-                    logs.log_interaction_to_file(
-                        agent_name="gitsensei_web",
-                        user_prompt=prompt,
-                        agent_response=str(response.output),
-                        timestamp=datetime.now().isoformat(),
-                    )
+                    with tracing.span("request", source="web") as request:
+                        start = time.perf_counter()
+                        # Shards load and reload at new commits, so the
+                        # scope is taken per request
+                        request_scope = scope()
+                        cached = cache.get(prompt, request_scope)
+                        source = "user"
+                        if cached is not None:
+                            # Same or near-identical question answered before
+                            output, similarity = cached
+                            st.markdown(output)
+                            st.caption(f"Cached answer (similarity {similarity:.2f})")
+                            latency, ttft, source = time.perf_counter() - start, None, "cache"
+                        elif streaming.STREAM_RESPONSES:
+                            # Render chunks as the background loop produces them
+                            chunks, future = streaming.stream_in_background(
+                                async_runner.shared_runner(),
+                                agent,
+                                prompt,
+                                flight=flight,
+                                key=single_flight.request_key(prompt, request_scope),
+                                profile=profile,
+                            )
+                            st.write_stream(chunks)
+                            answer = future.result()
+                            output, latency, ttft = answer.output, answer.latency, answer.ttft
+                        else:
+                            # Run agent on the background loop and wait for the answer
+                            key = single_flight.request_key(prompt, request_scope)
+                            output = run_agent(agent, prompt, flight, key, profile).output
+                            latency = time.perf_counter() - start
+                            ttft = None
+
+                            # Display response
+                            st.markdown(output)
+
+                        if cached is None:
+                            cache.put(prompt, str(output), scope())
+
+                        # Log interaction
+                        logs.log_interaction_to_file(
+                            agent_name="gitsensei_web",
+                            user_prompt=prompt,
+                            agent_response=str(output),
+                            timestamp=datetime.now().isoformat(),
+                            source=source,
+                            latency=latency,
+                            ttft=ttft,
+                            trace=request.summary(),
+                        )
 
-                    # Display response
-                    st.markdown(response.output)
+                    if show_diagnostics:
+                        show_trace(request)
 
                     # Add assistant response to chat history
                     st.session_state.messages.append(
-                        {"role": "assistant", "content": response.output}
+                        {"role": "assistant", "content": output}
                     )
 
                 except Exception as e:
                     error_msg = str(e)
-                    if "429" in error_msg and "RESOURCE_EXHAUSTED" in error_msg:
+                    if isinstance(e, TimeoutError):
+                        error_msg = (
+                            "The request took longer than "
+                            f"{async_runner.AGENT_TIMEOUT:.0f} seconds. Please try again."
+                        )
+                        st.error(f"⏱️ {error_msg}")
+                    elif scheduler.is_rate_limit(e):
                         st.error("🚫 **Gemini API Quota Exceeded!**")
                         st.warning("""
                         You've reached the free tier limit of 200 requests per day.
@@ -0,0 +1,179 @@
+"""
+One long-lived event loop for running agent coroutines from sync code.
+
+Streamlit runs every session in its own thread without an event loop.
+`AsyncRunner` keeps a single asyncio loop running in a daemon thread, so
+sessions hand it coroutines with `run_coroutine_threadsafe` instead of
+creating a thread pool and a loop per prompt. At most `max_concurrency`
+coroutines run at once, each within `timeout` seconds (waiting for a
+slot included), and the loop owns one pooled `httpx.AsyncClient` that
+model providers can share, so connections survive between requests.
+"""
+
+import os
+import atexit
+import asyncio
+import threading
+
+import httpx
+
+import tracing
+
+
+AGENT_CONCURRENCY = int(os.getenv("AGENT_CONCURRENCY", "8"))
+
+AGENT_TIMEOUT = float(os.getenv("AGENT_TIMEOUT_SECONDS", "120"))
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+
+
+class AsyncRunner:
+    """
+    Runs coroutines on a persistent background event loop.
+
+    Args:
+        max_concurrency (int): Coroutines allowed to run at the same time;
+            later ones wait for a free slot.
+        timeout (float): Default seconds per coroutine, waiting included.
+            None disables the timeout.
+        max_connections (int): Connection pool size of `http_client()`.
+    """
+
+    def __init__(
+        self,
+        max_concurrency=AGENT_CONCURRENCY,
+        timeout=AGENT_TIMEOUT,
+        max_connections=HTTP_MAX_CONNECTIONS,
+    ):
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._loop = None
+        self._thread = None
+        self._semaphore = None
+        self._http_client = None
+        self._lock = threading.Lock()
+        self._closed = False
+        self.running = 0
+        self.waiting = 0
+        self.completed = 0
+        self.timeouts = 0
+        self.errors = 0
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("AsyncRunner is closed")
+            if self._thread is not None:
+                return
+            self._loop = asyncio.new_event_loop()
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._thread = threading.Thread(
+                target=self._loop.run_forever, name="async-runner", daemon=True
+            )
+            self._thread.start()
+
+    @property
+    def loop(self):
+        """The background event loop, started on first use."""
+        self._ensure_started()
+        return self._loop
+
+    def http_client(self):
+        """Pooled `httpx.AsyncClient` to be used on this runner's loop only."""
+        self._ensure_started()
+        with self._lock:
+            if self._http_client is None:
+                self._http_client = httpx.AsyncClient(
+                    limits=httpx.Limits(max_connections=self.max_connections),
+                    timeout=httpx.Timeout(self.timeout or 600, connect=10),
+                )
+            return self._http_client
+
+    async def _guarded(self, coro, timeout):
+        self.waiting += 1
+        acquired = False
+        try:
+            async with asyncio.timeout(timeout):
+                async with self._semaphore:
+                    acquired = True
+                    self.waiting -= 1
+                    self.running += 1
+                    try:
+                        return await coro
+                    finally:
+                        self.running -= 1
+        except TimeoutError:
+            self.timeouts += 1
+            raise
+        except BaseException:
+            self.errors += 1
+            raise
+        finally:
+            if not acquired:
+                self.waiting -= 1
+                coro.close()
+            self.completed += 1
+
+    def submit(self, coro, timeout=None):
+        """
+        Schedule `coro` on the loop and return a `concurrent.futures.Future`.
+
+        Safe to call from any thread, including ones running their own loop.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            self._ensure_started()
+        except RuntimeError:
+            coro.close()
+            raise
+        # Keep the caller's trace: the loop thread has its own context
+        coro = tracing.bind(coro)
+        return asyncio.run_coroutine_threadsafe(self._guarded(coro, timeout), self._loop)
+
+    def run(self, coro, timeout=None):
+        """Run `coro` on the loop and block until its result (or exception)."""
+        return self.submit(coro, timeout).result()
+
+    def stats(self):
+        return {
+            "running": self.running,
+            "waiting": self.waiting,
+            "completed": self.completed,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "max_concurrency": self.max_concurrency,
+        }
+
+    def close(self):
+        """Close the HTTP client and stop the loop thread."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+        if thread is None:
+            return
+
+        if self._http_client is not None:
+            future = asyncio.run_coroutine_threadsafe(
+                self._http_client.aclose(), self._loop
+            )
+            future.result(timeout=10)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        thread.join()
+        self._loop.close()
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def shared_runner():
+    """The process-wide `AsyncRunner`, closed at exit."""
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = AsyncRunner()
+            atexit.register(_runner.close)
+        return _runner
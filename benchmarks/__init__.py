@@ -0,0 +1,5 @@
+"""
+GitSensei - Benchmarks
+
+Standalone performance benchmarks for ingestion and retrieval.
+"""
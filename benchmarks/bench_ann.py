@@ -0,0 +1,99 @@
+"""
+Recall@k and queries per second: IVF-PQ (`ann_index.IVFPQIndex`) vs exact search.
+
+Vectors are unit-normalized draws from a Gaussian mixture, so neighbours
+cluster the way sentence embeddings of related chunks do. Exact search is
+the float32 matrix-vector product `embeddings.VectorIndex` uses without an
+ANN index.
+
+    python benchmarks/bench_ann.py --size 200000 --dim 384
+"""
+
+import sys
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from ann_index import IVFPQIndex  # noqa: E402
+
+
+def make_vectors(num_vectors, dim, num_clusters=1000, spread=0.6, seed=1):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(num_clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, num_clusters, size=num_vectors)
+    vectors = centers[labels]
+    vectors += spread * rng.normal(size=vectors.shape).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def exact_search(vectors, queries, k):
+    ids = np.empty((len(queries), k), dtype=np.int64)
+    for row, query in enumerate(queries):
+        sims = vectors @ query
+        top = np.argpartition(-sims, k - 1)[:k]
+        ids[row] = top[np.argsort(-sims[top])]
+    return ids
+
+
+def recall_at_k(found, expected):
+    hits = [len(set(f) & set(e)) for f, e in zip(found, expected)]
+    return np.sum(hits) / expected.size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--size", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=None)
+    parser.add_argument("--m", type=int, default=48)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--refine", type=int, nargs="+", default=[1, 10])
+    args = parser.parse_args()
+
+    vectors = make_vectors(args.size, args.dim)
+    rng = np.random.default_rng(2)
+    queries = vectors[rng.choice(args.size, args.queries, replace=False)]
+    queries = queries + 0.1 * rng.normal(size=queries.shape).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    start = time.perf_counter()
+    expected = exact_search(vectors, queries, args.k)
+    exact_qps = len(queries) / (time.perf_counter() - start)
+
+    nlist = args.nlist or 4 * int(np.sqrt(args.size))
+    start = time.perf_counter()
+    index = IVFPQIndex(args.dim, nlist=nlist, m=args.m).train(vectors)
+    index.add(vectors)
+    build_s = time.perf_counter() - start
+
+    print(f"{args.size} vectors, dim {args.dim}, nlist {nlist}, m {args.m}")
+    print(f"IVF-PQ build: {build_s:.1f} s, {index.codes.nbytes / 2**20:.1f} MB codes "
+          f"vs {vectors.nbytes / 2**20:.1f} MB float32")
+    print(f"{'method':<24} {'recall@' + str(args.k):>10} {'QPS':>10}")
+    print(f"{'exact':<24} {1.0:>10.3f} {exact_qps:>10.0f}")
+
+    for nprobe in args.nprobe:
+        for refine in args.refine:
+            start = time.perf_counter()
+            found, _ = index.search(
+                queries,
+                k=args.k,
+                nprobe=nprobe,
+                vectors=vectors if refine > 1 else None,
+                refine=refine,
+            )
+            qps = len(queries) / (time.perf_counter() - start)
+            label = f"nprobe={nprobe} refine={refine}"
+            print(f"{label:<24} {recall_at_k(found, expected):>10.3f} {qps:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
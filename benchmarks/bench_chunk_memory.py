@@ -0,0 +1,61 @@
+"""
+Retained memory of chunked documents: dict chunks vs `ChunkStore`.
+
+    python benchmarks/bench_chunk_memory.py --pages 2000
+"""
+
+import gc
+import sys
+import random
+import argparse
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import ingest  # noqa: E402
+from benchmarks.synthetic import markdown_page  # noqa: E402
+
+
+def make_docs(pages):
+    rng = random.Random(1)
+    return [
+        ingest.parse_markdown(markdown_page(rng, i, paragraphs=40), f"docs/page-{i}.md")
+        for i in range(pages)
+    ]
+
+
+def retained(build, pages, params):
+    gc.collect()
+    tracemalloc.start()
+    chunks = build(make_docs(pages), params)
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(chunks), current / (1024 * 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--size", type=int, default=2000)
+    parser.add_argument("--step", type=int, default=1000)
+    args = parser.parse_args()
+
+    params = {"size": args.size, "step": args.step}
+    builds = {
+        "dict chunks": lambda docs, p: ingest.chunk_documents(docs, **p),
+        "ChunkStore": lambda docs, p: ingest.prepare_documents(
+            docs, chunk=True, chunking_params={**p, "compact": True}
+        ),
+    }
+
+    print(f"{'layout':>12} {'chunks':>8} {'MB':>8}")
+    for name, build in builds.items():
+        count, mb = retained(build, args.pages, params)
+        print(f"{name:>12} {count:>8} {mb:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
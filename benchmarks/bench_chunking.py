@@ -0,0 +1,75 @@
+"""
+Sliding-window vs markdown-aware chunking: index size, fit time and
+search latency on a synthetic corpus.
+
+    python benchmarks/bench_chunking.py --pages 1000
+"""
+
+import sys
+import time
+import random
+import argparse
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import ingest  # noqa: E402
+from benchmarks.synthetic import WORDS, markdown_page  # noqa: E402
+
+
+STRATEGIES = {
+    "sliding 2000/1000": {"size": 2000, "step": 1000},
+    "markdown 2000": {"method": "markdown", "max_size": 2000},
+}
+
+
+def make_docs(pages):
+    rng = random.Random(1)
+    return [
+        ingest.parse_markdown(markdown_page(rng, i, paragraphs=24), f"docs/page-{i}.md")
+        for i in range(pages)
+    ]
+
+
+def make_queries(count):
+    rng = random.Random(2)
+    return [" ".join(rng.sample(WORDS, 3)) for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    docs = make_docs(args.pages)
+    queries = make_queries(args.queries)
+
+    print(
+        f"{'strategy':>18} {'chunks':>8} {'indexed MB':>11} "
+        f"{'fit s':>7} {'search ms':>10} {'result chars':>13}"
+    )
+    for name, params in STRATEGIES.items():
+        chunks = list(ingest.prepare_documents(docs, chunk=True, chunking_params=params))
+        indexed_mb = sum(len(chunk["content"]) for chunk in chunks) / (1024 * 1024)
+
+        start = time.perf_counter()
+        index = ingest.fit_index(chunks)
+        fit_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        result_chars = 0
+        for query in queries:
+            results = index.search(query, num_results=5)
+            result_chars += sum(len(r["content"]) for r in results)
+        search_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+        print(
+            f"{name:>18} {len(chunks):>8} {indexed_mb:>11.1f} {fit_s:>7.2f} "
+            f"{search_ms:>10.2f} {result_chars / len(queries):>13.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
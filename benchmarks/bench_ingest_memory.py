@@ -0,0 +1,117 @@
+"""
+Peak RSS of repository ingestion as the archive grows.
+
+Compares the previous buffered reader (whole archive in memory, full list
+of documents) with `ingest.read_repo_data(..., stream=True)`. Each
+measurement runs in a fresh interpreter so peak RSS is not shared.
+
+    python benchmarks/bench_ingest_memory.py --pages 500 2000 8000
+"""
+
+import io
+import os
+import sys
+import json
+import argparse
+import resource
+import tempfile
+import subprocess
+import zipfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from benchmarks.synthetic import ArchiveServer, publish_archive  # noqa: E402
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    if sys.platform == "darwin":
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+def buffered_read(url):
+    import requests
+    import frontmatter
+
+    resp = requests.get(url)
+    repository_data = []
+    zf = zipfile.ZipFile(io.BytesIO(resp.content))
+    for file_info in zf.infolist():
+        filename = file_info.filename.lower()
+        if not (filename.endswith(".md") or filename.endswith(".mdx")):
+            continue
+        with zf.open(file_info) as f_in:
+            data = frontmatter.loads(f_in.read()).to_dict()
+            data["filename"] = file_info.filename.split("/", maxsplit=1)[1]
+            repository_data.append(data)
+    zf.close()
+    return len(repository_data)
+
+
+def streaming_read():
+    import ingest
+
+    count = 0
+    for _ in ingest.read_repo_data("bench", "repo", stream=True):
+        count += 1
+    return count
+
+
+def child(mode):
+    import ingest
+    import frontmatter  # noqa: F401
+
+    baseline = peak_rss_mb()
+    if mode == "buffered":
+        count = buffered_read(ingest.archive_url("bench", "repo"))
+    else:
+        count = streaming_read()
+    print(json.dumps({"docs": count, "baseline_mb": baseline, "peak_mb": peak_rss_mb()}))
+
+
+def measure(mode, url):
+    env = {**os.environ, "GITHUB_CODELOAD_URL": url}
+    out = subprocess.run(
+        [sys.executable, __file__, "--child", mode],
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+        cwd=ROOT,
+    )
+    return json.loads(out.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--pages", type=int, nargs="+", default=[500, 2000, 8000])
+    parser.add_argument("--child", choices=["buffered", "streaming"])
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child)
+        return
+
+    print(f"{'pages':>8} {'archive MB':>11} {'buffered MB':>12} {'streaming MB':>13}")
+    for pages in args.pages:
+        with tempfile.TemporaryDirectory() as root:
+            path = publish_archive(root, "bench", "repo", pages)
+            size_mb = path.stat().st_size / (1024 * 1024)
+            with ArchiveServer(root) as server:
+                results = {mode: measure(mode, server.url) for mode in ("buffered", "streaming")}
+
+        growth = {
+            mode: r["peak_mb"] - r["baseline_mb"] for mode, r in results.items()
+        }
+        print(
+            f"{pages:>8} {size_mb:>11.1f} {growth['buffered']:>12.1f} "
+            f"{growth['streaming']:>13.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Compaction throughput and query latency of the columnar log store (`log_store`).
+
+Raw JSONL segments with synthetic agent interactions are compacted once;
+the resulting part is then copied until the store holds `--rows` rows, and
+the `LogStore` aggregations are timed against scanning the raw JSON logs
+in Python, which is what answering the same questions took before.
+
+    python benchmarks/bench_log_store.py --raw 100000 --rows 1000000
+"""
+
+import sys
+import json
+import time
+import shutil
+import random
+import argparse
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import log_store  # noqa: E402
+
+
+QUESTIONS = [
+    "How do I install Kafka?",
+    "Spark setup on Windows",
+    "Can I join the course late?",
+    "Docker compose networking error",
+    "How are homework scores computed?",
+]
+
+
+def make_entry(rng, i):
+    start = 1735689600 + i * 7
+    end = start + rng.expovariate(1 / 3)
+    tools = ["search"] * rng.randint(0, 3)
+    return {
+        "agent_name": "gitsensei",
+        "provider": "google-gla",
+        "model": "gemini-2.0-flash",
+        "source": "user",
+        "messages": [
+            {
+                "kind": "request",
+                "parts": [
+                    {
+                        "part_kind": "user-prompt",
+                        "content": rng.choice(QUESTIONS),
+                        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(start)),
+                    }
+                ],
+            },
+            {
+                "kind": "response",
+                "parts": [{"part_kind": "tool-call", "tool_name": t} for t in tools]
+                + [{"part_kind": "text", "content": "Answer " * 40}],
+                "usage": {"input_tokens": rng.randint(500, 3000), "output_tokens": 200},
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime(end)),
+            },
+        ],
+    }
+
+
+def scan_raw(log_dir):
+    """p95 latency per day and top queries straight from the raw logs."""
+    latencies = {}
+    counts = {}
+    for path in sorted(Path(log_dir).glob("*.jsonl")):
+        with path.open(encoding="utf-8") as f_in:
+            for line in f_in:
+                record = log_store.extract_record(json.loads(line))
+                day = record["timestamp"].date()
+                latencies.setdefault(day, []).append(record["latency_s"])
+                prompt = " ".join(record["user_prompt"].lower().split())
+                counts[prompt] = counts.get(prompt, 0) + 1
+    p95 = {day: np.quantile(values, 0.95) for day, values in latencies.items()}
+    return p95, sorted(counts.items(), key=lambda item: -item[1])[:10]
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--raw", type=int, default=100000)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--format", choices=sorted(log_store.SUFFIXES), default=None)
+    args = parser.parse_args()
+
+    fmt = args.format or log_store.available_format()
+    rng = random.Random(0)
+
+    with (
+        tempfile.TemporaryDirectory() as log_dir,
+        tempfile.TemporaryDirectory() as store_dir,
+    ):
+        segment = Path(log_dir) / "interactions_0.jsonl"
+        with segment.open("w", encoding="utf-8") as f_out:
+            for i in range(args.raw):
+                f_out.write(json.dumps(make_entry(rng, i)) + "\n")
+        raw_mb = segment.stat().st_size / 2**20
+
+        part, compact_s = timed(log_store.compact, log_dir, store_dir, fmt)
+        print(f"{args.raw} raw interactions ({raw_mb:.0f} MB JSONL), format {fmt}")
+        print(f"compact: {compact_s:.2f} s ({args.raw / compact_s:.0f} rows/s), "
+              f"part {part.stat().st_size / 2**20:.1f} MB")
+
+        _, scan_s = timed(scan_raw, log_dir)
+        store = log_store.LogStore(store_dir)
+        _, p95_s = timed(store.latency_percentile, 0.95)
+        _, top_s = timed(store.top_queries, 10)
+        print(f"\n{args.raw} rows: raw JSON scan {scan_s:.2f} s, "
+              f"store p95 {p95_s * 1000:.0f} ms + top queries {top_s * 1000:.0f} ms")
+
+        for copy in range(1, -(-args.rows // args.raw)):
+            shutil.copy(part, part.with_name(f"part_copy{copy:04d}{part.suffix}"))
+
+        store = log_store.LogStore(store_dir)
+        _, load_s = timed(store.load, ["timestamp", "latency_s", "user_prompt"])
+        rows = len(store.load(["timestamp"]))
+        print(f"\n{rows} rows: load {load_s:.2f} s (3 columns, cold)")
+        for name, fn in [
+            ("p95 latency per day", lambda: store.latency_percentile(0.95)),
+            ("top queries", lambda: store.top_queries(10)),
+            ("token usage per day", store.token_usage),
+            ("tool usage", store.tool_usage),
+        ]:
+            _, seconds = timed(fn)
+            print(f"{name:<22} {seconds * 1000:>8.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
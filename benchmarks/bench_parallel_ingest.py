@@ -0,0 +1,66 @@
+"""
+Ingestion throughput of `ingest.load_archive_docs` from 1 to N workers.
+
+Parses and chunks a synthetic archive read from local disk, so only
+decoding, frontmatter parsing and chunking are timed.
+
+    python benchmarks/bench_parallel_ingest.py --pages 4000 --workers 1 2 4 8
+"""
+
+import os
+import sys
+import time
+import zipfile
+import argparse
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import ingest  # noqa: E402
+from benchmarks.synthetic import build_archive  # noqa: E402
+
+
+def run(path, workers, repeat):
+    timings = []
+    for _ in range(repeat):
+        with zipfile.ZipFile(path) as zf:
+            start = time.perf_counter()
+            count = sum(
+                1
+                for _ in ingest.load_archive_docs(
+                    zf,
+                    chunk=True,
+                    chunking_params={"size": 2000, "step": 1000},
+                    workers=workers,
+                )
+            )
+            timings.append(time.perf_counter() - start)
+    return count, min(timings)
+
+
+def main():
+    cpus = os.cpu_count() or 1
+    default_workers = sorted({1, 2, 4, cpus})
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--pages", type=int, default=4000)
+    parser.add_argument("--workers", type=int, nargs="+", default=default_workers)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = build_archive(Path(tmp) / "repo.zip", args.pages)
+
+        print(f"{args.pages} pages, {cpus} CPUs available")
+        print(f"{'workers':>8} {'chunks':>8} {'seconds':>9} {'speedup':>8}")
+        base = None
+        for workers in args.workers:
+            count, seconds = run(path, workers, args.repeat)
+            base = base or seconds
+            print(f"{workers:>8} {count:>8} {seconds:>9.3f} {base / seconds:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
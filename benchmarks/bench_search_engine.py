@@ -0,0 +1,75 @@
+"""
+Fit time and query latency: `minsearch.Index` vs `search_engine.SearchIndex`.
+
+Documents are short chunks drawn from a Zipf-distributed vocabulary, so
+postings lists have a realistic long-tail length distribution.
+
+    python benchmarks/bench_search_engine.py --sizes 10000 100000 1000000
+"""
+
+import sys
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import ingest  # noqa: E402
+
+
+def make_corpus(num_docs, vocab_size=50000, doc_len=60, seed=1):
+    rng = np.random.default_rng(seed)
+    words = np.array([f"w{i}" for i in range(vocab_size)])
+    ranks = rng.zipf(1.1, size=num_docs * doc_len) % vocab_size
+    tokens = words[ranks].reshape(num_docs, doc_len)
+    return [
+        {"content": " ".join(row), "filename": f"docs/section-{i % 100}/page-{i}.md"}
+        for i, row in enumerate(tokens)
+    ]
+
+
+def make_queries(count, vocab_size=50000, seed=2):
+    rng = np.random.default_rng(seed)
+    # Mix frequent head terms with rarer ones, like real questions
+    head = rng.integers(1, 50, size=count)
+    tail = rng.integers(50, 5000, size=(count, 2))
+    return [f"w{h} w{t[0]} w{t[1]}" for h, t in zip(head, tail)]
+
+
+def bench(engine, docs, queries):
+    start = time.perf_counter()
+    index = ingest.fit_index(docs, engine=engine)
+    fit_s = time.perf_counter() - start
+
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        index.search(query, num_results=5)
+        latencies.append(time.perf_counter() - start)
+
+    latencies = np.array(latencies) * 1000
+    return fit_s, latencies.mean(), np.percentile(latencies, 95)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--engines", nargs="+", default=["minsearch", "native"])
+    args = parser.parse_args()
+
+    queries = make_queries(args.queries)
+
+    print(f"{'docs':>9} {'engine':>10} {'fit s':>8} {'mean ms':>9} {'p95 ms':>8}")
+    for size in args.sizes:
+        docs = make_corpus(size)
+        for engine in args.engines:
+            fit_s, mean_ms, p95_ms = bench(engine, docs, queries)
+            print(f"{size:>9} {engine:>10} {fit_s:>8.2f} {mean_ms:>9.2f} {p95_ms:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Search tool output with and without merging overlapping chunks and
+trimming results to query-centred snippets: tokens sent to the model and
+search latency on a fixed question set.
+
+    python benchmarks/bench_snippets.py --pages 500
+
+With `--model gemini-2.0-flash` (and GOOGLE_API_KEY set) every question
+is also answered by the agent, reporting the input tokens the API billed
+and the end-to-end latency.
+"""
+
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import ingest  # noqa: E402
+import search_agent  # noqa: E402
+from search_tools import QueryCache, SearchTool  # noqa: E402
+from benchmarks.synthetic import WORDS, markdown_page  # noqa: E402
+
+
+CONFIGS = {
+    "whole chunks": {"snippet_chars": 0, "merge_overlaps": False},
+    "merged": {"snippet_chars": 0, "merge_overlaps": True},
+    "merged + 1500 chars": {"snippet_chars": 1500, "merge_overlaps": True},
+    "merged + 800 chars": {"snippet_chars": 800, "merge_overlaps": True},
+}
+
+
+def make_docs(pages):
+    """Synthetic pages that each mention their own topic, like FAQ pages do."""
+    rng = random.Random(1)
+    docs = []
+    for i in range(pages):
+        page = markdown_page(rng, i, paragraphs=24).replace(" docker ", f" topic{i} ")
+        docs.append(ingest.parse_markdown(page, f"docs/page-{i}.md"))
+    return docs
+
+
+def make_questions(pages, count):
+    rng = random.Random(2)
+    return [
+        f"How do I fix topic{rng.randrange(pages)} {' '.join(rng.sample(WORDS, 2))}?"
+        for _ in range(count)
+    ]
+
+
+def tokens(results):
+    """Approximate tokens of a tool result as the model receives it (JSON)."""
+    return len(json.dumps(results)) // 4
+
+
+def measure_tool(index, questions, config):
+    tool = SearchTool(index, cache=QueryCache(max_size=0), **config)
+    total_tokens = 0
+    start = time.perf_counter()
+    for question in questions:
+        total_tokens += tokens(tool.search(question))
+    elapsed = time.perf_counter() - start
+    return total_tokens / len(questions), elapsed * 1000 / len(questions)
+
+
+def measure_agent(index, questions, config, model):
+    from pydantic_ai import Agent
+
+    tool = SearchTool(index, cache=QueryCache(max_size=0), **config)
+    agent = Agent(
+        model,
+        instructions=search_agent.system_prompt_for("owner", "repo"),
+        tools=[tool.search, tool.search_many],
+    )
+
+    async def answer_all():
+        input_tokens, latency = 0, 0.0
+        for question in questions:
+            start = time.perf_counter()
+            result = await agent.run(question)
+            latency += time.perf_counter() - start
+            input_tokens += result.usage().input_tokens or 0
+        return input_tokens / len(questions), latency / len(questions)
+
+    return asyncio.run(answer_all())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--questions", type=int, default=50)
+    parser.add_argument("--model", help="also answer each question with this model")
+    args = parser.parse_args()
+
+    docs = make_docs(args.pages)
+    chunks = ingest.chunk_documents(docs, size=2000, step=1000)
+    index = ingest.fit_index(chunks)
+    questions = make_questions(args.pages, args.questions)
+
+    header = f"{'results':>20} {'tool tokens':>12} {'search ms':>10}"
+    if args.model:
+        header += f" {'input tokens':>13} {'answer s':>9}"
+    print(header)
+
+    baseline = None
+    for name, config in CONFIGS.items():
+        tool_tokens, search_ms = measure_tool(index, questions, config)
+        baseline = baseline or tool_tokens
+        line = (
+            f"{name:>20} {tool_tokens:>12.0f} {search_ms:>10.2f}"
+            f"   ({1 - tool_tokens / baseline:.0%} fewer tokens)"
+        )
+        if args.model:
+            input_tokens, answer_s = measure_agent(index, questions, config, args.model)
+            line = (
+                f"{name:>20} {tool_tokens:>12.0f} {search_ms:>10.2f}"
+                f" {input_tokens:>13.0f} {answer_s:>9.2f}"
+            )
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Startup cost of the entry points: import time measured with
+`python -X importtime`, the modules that dominate it, and the time from
+launching the CLI to its first prompt.
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --entry main src.evaluation --top 15
+
+Every measurement runs in a fresh interpreter and the fastest of
+`--repeat` runs is reported. With `--max-ms`, exits with status 1 when
+importing an entry point or reaching the CLI prompt takes longer.
+"""
+
+import os
+import sys
+import time
+import argparse
+import subprocess
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+ENTRY_POINTS = ["main", "app"]
+
+
+def parse_importtime(stderr):
+    """
+    (module, self µs, cumulative µs, depth) for every line of
+    `-X importtime` output, in its order: a module comes after the modules
+    it imported, and depth 0 is a module imported by the script itself.
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def import_profile(module):
+    """Import `module` in a fresh interpreter; returns the parsed timings."""
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if out.returncode != 0:
+        error = out.stderr.strip().splitlines()[-1] if out.stderr.strip() else "failed"
+        raise RuntimeError(error)
+    return parse_importtime(out.stderr)
+
+
+def entry_rows(rows, module):
+    """The rows of importing `module`: its own (last) and its dependencies'."""
+    end = next(i for i, row in enumerate(rows) if row[0] == module and row[3] == 0)
+    start = end
+    while start > 0 and rows[start - 1][3] > 0:
+        start -= 1
+    return rows[start : end + 1]
+
+
+def heaviest(rows, top):
+    """The modules an entry point imports directly, by cumulative time."""
+    children = [row for row in rows if row[3] == 1]
+    return sorted(children, key=lambda row: row[2], reverse=True)[:top]
+
+
+def time_to_prompt(prompt="Your question:"):
+    """Seconds from launching main.py until it asks for the first question."""
+    env = {**os.environ, "PYTHONUNBUFFERED": "1"}
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "main.py"],
+        cwd=ROOT,
+        env=env,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True,
+    )
+    seen = ""
+    try:
+        while prompt not in seen:
+            char = process.stdout.read(1)
+            if not char:
+                raise RuntimeError("main.py exited before prompting")
+            seen += char
+        elapsed = time.perf_counter() - start
+        process.communicate("stop\n", timeout=30)
+    finally:
+        if process.poll() is None:
+            process.kill()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--entry", nargs="+", default=ENTRY_POINTS)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=8)
+    parser.add_argument("--max-ms", type=float, help="fail above this many milliseconds")
+    args = parser.parse_args()
+
+    slow = []
+    for module in args.entry:
+        try:
+            runs = [import_profile(module) for _ in range(args.repeat)]
+        except RuntimeError as e:
+            print(f"{module}: cannot be imported here ({e})\n")
+            continue
+        rows = min((entry_rows(rows, module) for rows in runs), key=lambda rows: rows[-1][2])
+        total = rows[-1][2] / 1000
+        print(f"import {module}: {total:.0f} ms")
+        for name, _, cumulative, _ in heaviest(rows, args.top):
+            print(f"  {cumulative / 1000:8.1f} ms  {name}")
+        print()
+        if args.max_ms is not None and total > args.max_ms:
+            slow.append(f"import {module}")
+
+    if "main" in args.entry:
+        prompt_ms = min(time_to_prompt() for _ in range(args.repeat)) * 1000
+        print(f"main.py to first prompt: {prompt_ms:.0f} ms")
+        if args.max_ms is not None and prompt_ms > args.max_ms:
+            slow.append("main.py to first prompt")
+
+    for name in slow:
+        print(f"TOO SLOW: {name} took more than {args.max_ms:.0f} ms")
+    return 1 if slow else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,228 @@
+"""
+Ingestion and retrieval benchmark suite with regression thresholds.
+
+For synthetic repositories of several sizes, served by a local stand-in
+for codeload.github.com, measures the time and peak traced memory of each
+stage separately: `read_repo_data`, `chunk_documents`, index `fit` and
+`SearchTool.search` over a fixed query set. Results are written as JSON;
+`compare` fails when a stage got slower or bigger than a baseline by more
+than a threshold.
+
+    python benchmarks/suite.py run --output results.json
+    python benchmarks/suite.py compare results.json --threshold 0.5
+
+Timings of the same code vary by up to about 25% between runs, so the
+default time threshold is 50%; traced memory is deterministic and has its
+own, tighter threshold (10%).
+
+Refresh the stored baseline after an intended change (on the machine the
+comparisons run on) with `run --output benchmarks/baseline.json`.
+"""
+
+import sys
+import json
+import time
+import random
+import platform
+import argparse
+import tempfile
+import subprocess
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import ingest  # noqa: E402
+from search_tools import QueryCache, SearchTool  # noqa: E402
+from benchmarks.synthetic import WORDS, ArchiveServer, publish_archive  # noqa: E402
+
+
+BASELINE = Path(__file__).resolve().parent / "baseline.json"
+
+def make_queries(count=100):
+    rng = random.Random(2)
+    return [" ".join(rng.sample(WORDS, 3)) for _ in range(count)]
+
+
+def stage_functions(queries):
+    """Stage name -> function of the previous stage's output."""
+
+    def search(index):
+        tool = SearchTool(index, cache=QueryCache(max_size=0))
+        return [tool.search(query) for query in queries]
+
+    return {
+        "read_repo_data": lambda _: ingest.read_repo_data("bench", "repo"),
+        "chunk_documents": lambda docs: ingest.chunk_documents(docs, size=2000, step=1000),
+        "fit": lambda chunks: ingest.fit_index(chunks),
+        "search": search,
+    }
+
+
+def measure(func, arg, repeat):
+    """
+    Fastest of `repeat` calls of `func(arg)` in seconds (the least noisy
+    estimate), the peak memory traced during one more call (tracing slows
+    the code down, so it is not timed), and that call's result.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(arg)
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        result = func(arg)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return min(times), peak / (1024 * 1024), result
+
+
+def run_size(pages, queries, repeat):
+    results = []
+    with tempfile.TemporaryDirectory() as root:
+        publish_archive(root, "bench", "repo", pages)
+        with ArchiveServer(root) as server:
+            codeload_url, ingest.CODELOAD_URL = ingest.CODELOAD_URL, server.url
+            try:
+                output = None
+                for stage, func in stage_functions(queries).items():
+                    seconds, peak_mb, output = measure(func, output, repeat)
+                    results.append(
+                        {
+                            "pages": pages,
+                            "stage": stage,
+                            "seconds": seconds,
+                            "peak_mb": peak_mb,
+                            "items": len(output) if hasattr(output, "__len__") else None,
+                        }
+                    )
+            finally:
+                ingest.CODELOAD_URL = codeload_url
+    return results
+
+
+def git_commit():
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(sizes, repeat=5, num_queries=100):
+    """Benchmark every stage at every size; returns the JSON report."""
+    queries = make_queries(num_queries)
+    results = []
+    for pages in sizes:
+        results.extend(run_size(pages, queries, repeat))
+    return {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "repeat": repeat,
+            "queries": num_queries,
+        },
+        "results": results,
+    }
+
+
+def compare(current, baseline, threshold=0.5, memory_threshold=0.1, min_seconds=0.05):
+    """
+    Regressions of `current` against `baseline` reports, as a list of
+    (pages, stage, metric, baseline value, current value) tuples. A stage
+    regresses when its time grew by more than `threshold` or its peak
+    memory by more than `memory_threshold` (fractions). Times below
+    `min_seconds` in both reports are too noisy to compare.
+    """
+    old = {(r["pages"], r["stage"]): r for r in baseline["results"]}
+
+    regressions = []
+    for new in current["results"]:
+        before = old.get((new["pages"], new["stage"]))
+        if before is None:
+            continue
+        for metric, limit in (("seconds", threshold), ("peak_mb", memory_threshold)):
+            if metric == "seconds" and max(before[metric], new[metric]) < min_seconds:
+                continue
+            if new[metric] > before[metric] * (1 + limit):
+                regressions.append(
+                    (new["pages"], new["stage"], metric, before[metric], new[metric])
+                )
+    return regressions
+
+
+def print_report(report, baseline=None):
+    old = {}
+    if baseline is not None:
+        old = {(r["pages"], r["stage"]): r for r in baseline["results"]}
+
+    print(f"{'pages':>7} {'stage':>16} {'seconds':>9} {'peak MB':>8} {'vs baseline':>18}")
+    for r in report["results"]:
+        change = ""
+        before = old.get((r["pages"], r["stage"]))
+        if before is not None:
+            change = (
+                f"{r['seconds'] / max(before['seconds'], 1e-9) - 1:+.0%} time "
+                f"{r['peak_mb'] / max(before['peak_mb'], 1e-9) - 1:+.0%} mem"
+            )
+        print(
+            f"{r['pages']:>7} {r['stage']:>16} {r['seconds']:>9.3f} "
+            f"{r['peak_mb']:>8.1f} {change:>18}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the benchmarks")
+    run_parser.add_argument("--sizes", type=int, nargs="+", default=[200, 1000])
+    run_parser.add_argument("--repeat", type=int, default=5)
+    run_parser.add_argument("--queries", type=int, default=100)
+    run_parser.add_argument("--output", type=Path, default=Path("benchmark_results.json"))
+
+    compare_parser = commands.add_parser("compare", help="check results against a baseline")
+    compare_parser.add_argument("results", type=Path)
+    compare_parser.add_argument("--baseline", type=Path, default=BASELINE)
+    compare_parser.add_argument("--threshold", type=float, default=0.5)
+    compare_parser.add_argument("--memory-threshold", type=float, default=0.1)
+    compare_parser.add_argument("--min-seconds", type=float, default=0.05)
+
+    args = parser.parse_args()
+
+    if args.command == "run":
+        report = run(args.sizes, repeat=args.repeat, num_queries=args.queries)
+        args.output.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+        print_report(report)
+        print(f"\nResults written to {args.output}")
+        return 0
+
+    current = json.loads(args.results.read_text(encoding="utf-8"))
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+    print_report(current, baseline)
+    regressions = compare(
+        current, baseline, args.threshold, args.memory_threshold, args.min_seconds
+    )
+    for pages, stage, metric, before, after in regressions:
+        print(f"REGRESSION {stage} at {pages} pages: {metric} {before:.3f} -> {after:.3f}")
+    if regressions:
+        return 1
+    print("\nNo regressions.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""
+Synthetic repository archives and a local stand-in for codeload.github.com.
+"""
+
+import random
+import zipfile
+import threading
+from pathlib import Path
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+
+WORDS = (
+    "kafka spark docker python install error setup cluster module homework "
+    "bigquery terraform airflow pipeline stream batch dataset warehouse query "
+    "container image volume network port credentials environment variable "
+    "schema table partition notebook deploy course week answer question"
+).split()
+
+
+def markdown_page(rng, page_id, paragraphs=12):
+    lines = [
+        "---",
+        f"id: page-{page_id}",
+        f"question: How do I fix {rng.choice(WORDS)} {rng.choice(WORDS)}?",
+        f"sort_order: {page_id}",
+        "---",
+        "",
+        f"# Page {page_id}",
+        "",
+    ]
+    for p in range(paragraphs):
+        if p % 4 == 0:
+            lines.append(f"## Section {p // 4} {rng.choice(WORDS)}")
+            lines.append("")
+        sentence = " ".join(rng.choice(WORDS) for _ in range(rng.randint(40, 90)))
+        lines.append(sentence.capitalize() + ".")
+        lines.append("")
+    return "\n".join(lines)
+
+
+def build_archive(target, num_pages, seed=1, prefix="repo-main"):
+    """
+    Write a codeload-style zip with `num_pages` markdown files.
+
+    `target` is a path or a writable binary file object.
+    """
+    rng = random.Random(seed)
+    if isinstance(target, (str, Path)):
+        target = Path(target)
+        target.parent.mkdir(parents=True, exist_ok=True)
+
+    with zipfile.ZipFile(target, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr(f"{prefix}/README.md", "# Synthetic repository\n")
+        for page_id in range(num_pages):
+            section = f"section-{page_id % 20}"
+            name = f"{prefix}/docs/{section}/page-{page_id}.md"
+            zf.writestr(name, markdown_page(rng, page_id))
+        zf.writestr(f"{prefix}/src/main.py", "print('not markdown')\n")
+
+    return target
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class ArchiveServer:
+    """
+    Serve a directory over HTTP on localhost in a background thread.
+
+    Archives laid out as `<root>/<owner>/<repo>/zip/refs/heads/<branch>`
+    can be fetched by `ingest` with `GITHUB_CODELOAD_URL` pointed at `url`.
+    """
+
+    def __init__(self, root):
+        handler = partial(_QuietHandler, directory=str(root))
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def publish_archive(root, repo_owner, repo_name, num_pages, branch="main", seed=1):
+    path = Path(root) / repo_owner / repo_name / "zip" / "refs" / "heads" / branch
+    return build_archive(path, num_pages, seed=seed, prefix=f"{repo_name}-{branch}")
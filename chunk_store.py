@@ -0,0 +1,157 @@
+"""
+Compact storage for chunked documents.
+
+`chunk_documents` gives every chunk its own copy of the window text and of
+the document frontmatter. A `ChunkStore` keeps each document text and its
+metadata once and represents a chunk as a (doc_id, start, end) row in
+three integer arrays, plus an optional interned section (header path) per
+chunk. Chunk text is sliced out only when a chunk is read.
+"""
+
+import sys
+from array import array
+from collections.abc import Mapping, Sequence
+
+
+def _intern(value):
+    if isinstance(value, str):
+        return sys.intern(value)
+    return value
+
+
+class Chunk(Mapping):
+    """Read-only dict-like view of one chunk row in a `ChunkStore`."""
+
+    __slots__ = ("store", "row")
+
+    def __init__(self, store, row):
+        self.store = store
+        self.row = row
+
+    def __getitem__(self, key):
+        store = self.store
+        if key == "content":
+            return store.text(self.row)
+        if key == "start":
+            return store.starts[self.row]
+        if key == "section" and store.sections[self.row] is not None:
+            return store.sections[self.row]
+        return store.metadata[store.doc_ids[self.row]][key]
+
+    def __iter__(self):
+        yield "start"
+        yield "content"
+        if self.store.sections[self.row] is not None:
+            yield "section"
+        yield from self.store.metadata[self.store.doc_ids[self.row]]
+
+    def __len__(self):
+        extra = 3 if self.store.sections[self.row] is not None else 2
+        return extra + len(self.store.metadata[self.store.doc_ids[self.row]])
+
+    def __repr__(self):
+        return f"Chunk({dict(self)!r})"
+
+
+class ChunkStore(Sequence):
+    """
+    Sequence of `Chunk` views backed by shared document text.
+
+    Can be passed directly to `Index.fit`; search results are `Chunk`
+    views that can be turned into plain dicts with `dict(chunk)`.
+    """
+
+    def __init__(self):
+        self.texts = []
+        self.metadata = []
+        self.doc_ids = array("I")
+        self.starts = array("I")
+        self.ends = array("I")
+        self.sections = []
+
+    @classmethod
+    def from_documents(cls, docs, size=2000, step=1000):
+        """Sliding-window chunks of `docs`, matching `ingest.sliding_window`."""
+        store = cls()
+        for doc in docs:
+            store.add_document(doc, size=size, step=step)
+        return store
+
+    def add_document(self, doc, size=2000, step=1000):
+        if size <= 0 or step <= 0:
+            raise ValueError("size and step must be positive")
+
+        text = doc["content"]
+        n = len(text)
+        spans = []
+        for i in range(0, n, step):
+            spans.append((i, min(i + size, n)))
+            if i + size > n:
+                break
+
+        self.add_spans(doc, spans)
+
+    def add_spans(self, doc, spans):
+        """
+        Add a document and its chunks given as (start, end) or
+        (start, end, section) tuples.
+        """
+        doc_id = len(self.texts)
+        self.texts.append(doc["content"])
+        self.metadata.append(
+            {
+                _intern(key): _intern(value)
+                for key, value in doc.items()
+                if key != "content"
+            }
+        )
+
+        for start, end, *section in spans:
+            self.doc_ids.append(doc_id)
+            self.starts.append(start)
+            self.ends.append(end)
+            self.sections.append(_intern(section[0]) if section else None)
+
+    def text(self, row):
+        return self.texts[self.doc_ids[row]][self.starts[row] : self.ends[row]]
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [Chunk(self, i) for i in range(*row.indices(len(self)))]
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError("chunk index out of range")
+        return Chunk(self, row)
+
+    def take(self, rows):
+        """New store with only the given rows, dropping unreferenced documents."""
+        result = ChunkStore()
+        remap = {}
+
+        for row in rows:
+            doc_id = self.doc_ids[row]
+            if doc_id not in remap:
+                remap[doc_id] = len(result.texts)
+                result.texts.append(self.texts[doc_id])
+                result.metadata.append(self.metadata[doc_id])
+            result.doc_ids.append(remap[doc_id])
+            result.starts.append(self.starts[row])
+            result.ends.append(self.ends[row])
+            result.sections.append(self.sections[row])
+
+        return result
+
+    def extend(self, other):
+        """Append the rows of another `ChunkStore` and return self."""
+        offset = len(self.texts)
+        self.texts.extend(other.texts)
+        self.metadata.extend(other.metadata)
+        self.doc_ids.extend(doc_id + offset for doc_id in other.doc_ids)
+        self.starts.extend(other.starts)
+        self.ends.extend(other.ends)
+        self.sections.extend(other.sections)
+        return self
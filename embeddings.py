@@ -0,0 +1,357 @@
+"""
+Dense embeddings for hybrid search.
+
+Embeddings are cached on disk per model as an append-only float16 matrix
+(`vectors.f16`) with one content hash per row (`keys.txt`), and read back
+through `numpy.memmap`. Re-indexing only embeds chunks whose content hash
+is not in the cache yet.
+"""
+
+import os
+import hashlib
+import contextlib
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are not locked
+    fcntl = None
+
+from ann_index import IVFPQIndex
+
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+
+EMBEDDING_CACHE_DIR = Path(os.getenv("EMBEDDING_CACHE_DIRECTORY", "embedding_cache"))
+
+# Rows converted to float32 at a time while scoring
+SCORE_BLOCK_ROWS = 65536
+
+# Build an approximate nearest-neighbour index once the cache holds this
+# many vectors; 0 keeps exact scoring
+ANN_THRESHOLD = int(os.getenv("ANN_THRESHOLD", "0"))
+
+
+def content_hash(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class SentenceTransformerEmbedder:
+    """Lazily loaded `sentence_transformers` model producing unit vectors."""
+
+    def __init__(self, model_name=EMBEDDING_MODEL):
+        self.name = model_name
+        self._model = None
+
+    @property
+    def model(self):
+        if self._model is None:
+            try:
+                from sentence_transformers import SentenceTransformer
+            except ImportError as e:
+                raise ImportError(
+                    "Hybrid search needs sentence-transformers: "
+                    "pip install sentence-transformers"
+                ) from e
+            self._model = SentenceTransformer(self.name)
+        return self._model
+
+    def encode(self, texts, batch_size=64):
+        return self.model.encode(
+            list(texts),
+            batch_size=batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+        )
+
+    def __getstate__(self):
+        return {"name": self.name, "_model": None}
+
+
+class EmbeddingCache:
+    """
+    Append-only, memory-mapped float16 store of embeddings by content hash.
+
+    Appends hold an exclusive lock on `directory/lock`, so several processes
+    (or indexes) can share one cache directory. Rows are taken from the end
+    of `vectors.f16`, and keys written by other writers are picked up before
+    each append.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.vectors_path = self.directory / "vectors.f16"
+        self.keys_path = self.directory / "keys.txt"
+        self.dim = None
+        self.rows = {}
+        self._count = 0
+        self._keys_offset = 0
+        self._matrix = None
+        self._load()
+
+    def _load(self):
+        dim_path = self.directory / "dim"
+        if not (dim_path.exists() and self.keys_path.exists() and self.vectors_path.exists()):
+            return
+
+        self.dim = int(dim_path.read_text())
+        with self._locked():
+            self._sync()
+            self._truncate()
+
+    @contextlib.contextmanager
+    def _locked(self):
+        with (self.directory / "lock").open("a") as f_lock:
+            if fcntl is not None:
+                fcntl.flock(f_lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f_lock, fcntl.LOCK_UN)
+
+    def _sync(self):
+        """Read the keys appended since the last sync, by any writer."""
+        if not self.keys_path.exists():
+            return
+        stored = self.vectors_path.stat().st_size // (2 * self.dim)
+        with self.keys_path.open("rb") as f_in:
+            f_in.seek(self._keys_offset)
+            data = f_in.read()
+
+        # A row counts once both its vector and its complete key line are on disk
+        pos = 0
+        while self._count < stored:
+            end = data.find(b"\n", pos)
+            if end < 0:
+                break
+            key = data[pos:end].decode("utf-8")
+            self.rows.setdefault(key, self._count)
+            self._count += 1
+            pos = end + 1
+        self._keys_offset += pos
+        self._matrix = None
+
+    def _truncate(self):
+        """Drop vectors without a key and a torn last key line (caller holds the lock)."""
+        with self.vectors_path.open("r+b") as f_out:
+            f_out.truncate(self._count * 2 * self.dim)
+        with self.keys_path.open("r+b") as f_out:
+            f_out.truncate(self._keys_offset)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, key):
+        return key in self.rows
+
+    def add(self, keys, vectors):
+        vectors = np.asarray(vectors, dtype=np.float16)
+        if len(keys) == 0:
+            return
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with self._locked():
+            dim_path = self.directory / "dim"
+            if self.dim is None and dim_path.exists():
+                self.dim = int(dim_path.read_text())
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                dim_path.write_text(str(self.dim))
+                self.vectors_path.touch()
+                self.keys_path.touch()
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Expected {self.dim}-dimensional vectors")
+
+            self._sync()
+            self._truncate()
+            fresh = {}
+            for i, key in enumerate(keys):
+                if key not in self.rows:
+                    fresh.setdefault(key, i)
+            if not fresh:
+                return
+
+            with self.vectors_path.open("ab") as f_out:
+                f_out.seek(0, os.SEEK_END)
+                row = f_out.tell() // (2 * self.dim)
+                f_out.write(np.ascontiguousarray(vectors[list(fresh.values())]).tobytes())
+            with self.keys_path.open("ab") as f_out:
+                f_out.write("".join(f"{key}\n" for key in fresh).encode("utf-8"))
+                self._keys_offset = f_out.tell()
+
+            for key in fresh:
+                self.rows[key] = row
+                row += 1
+            self._count = row
+        self._matrix = None
+
+    def lookup(self, keys):
+        return np.fromiter((self.rows[key] for key in keys), dtype=np.int64, count=len(keys))
+
+    def matrix(self):
+        if self._matrix is None:
+            self._matrix = np.memmap(
+                self.vectors_path,
+                dtype=np.float16,
+                mode="r",
+                shape=(self._count, self.dim),
+            )
+        return self._matrix
+
+    def __getstate__(self):
+        return {"directory": self.directory}
+
+    def __setstate__(self, state):
+        self.__init__(state["directory"])
+
+
+class VectorIndex:
+    """
+    Dense vectors for the documents of a text index.
+
+    Args:
+        embedder: Object with `name` and `encode(texts, batch_size)`
+            returning unit-length vectors. Defaults to a sentence-transformers
+            model named by `EMBEDDING_MODEL`.
+        cache_dir: Root of the embedding cache; one subdirectory per model.
+        field (str): Document field to embed.
+        batch_size (int): Texts per `encode` call at index time.
+    """
+
+    def __init__(self, embedder=None, cache_dir=None, field="content", batch_size=64):
+        self.embedder = embedder or SentenceTransformerEmbedder()
+        cache_dir = Path(cache_dir or EMBEDDING_CACHE_DIR)
+        safe_name = "".join(c if c.isalnum() or c in "-_." else "_" for c in self.embedder.name)
+        self.cache = EmbeddingCache(cache_dir / safe_name)
+        self.field = field
+        self.batch_size = batch_size
+        self.doc_rows = np.zeros(0, dtype=np.int64)
+        self.ann = None
+        self.ann_candidates = 200
+        self.ann_refine = 4
+
+    def update(self, docs):
+        """Point at the embeddings of `docs`, embedding only uncached content."""
+        texts = {}
+        hashes = []
+        for doc in docs:
+            text = doc.get(self.field, "") or ""
+            key = content_hash(text)
+            hashes.append(key)
+            if key not in self.cache and key not in texts:
+                texts[key] = text
+
+        missing = list(texts)
+        for i in range(0, len(missing), self.batch_size):
+            keys = missing[i : i + self.batch_size]
+            vectors = self.embedder.encode(
+                [texts[key] for key in keys], batch_size=self.batch_size
+            )
+            self.cache.add(keys, vectors)
+
+        self.doc_rows = self.cache.lookup(hashes)
+        if self.ann is not None:
+            self._update_ann()
+        elif 0 < ANN_THRESHOLD <= len(np.unique(self.doc_rows)):
+            self.build_ann()
+        return len(missing)
+
+    def build_ann(self, nlist=None, m=None, nprobe=8, candidates=200, refine=4, path=None):
+        """
+        Index this index's documents with an `ann_index.IVFPQIndex` and use
+        it for scoring. Other rows of a shared cache are left out. With
+        `path` the index is saved there and kept up to date as documents
+        change; otherwise it is pickled along with the index.
+
+        `candidates` nearest vectors get a dense score, re-ranked exactly
+        from the best `candidates * refine` PQ matches; all other
+        documents get 0.
+        """
+        matrix = self.cache.matrix()
+        dim = self.cache.dim
+        rows = np.unique(self.doc_rows)
+        if nlist is None:
+            nlist = max(1, min(4 * int(np.sqrt(len(rows))), len(rows) // 39))
+        if m is None:
+            m = dim // 8 if dim % 8 == 0 else dim
+
+        ann = IVFPQIndex(dim, nlist=nlist, m=m, nprobe=nprobe).train(matrix[rows])
+        self._add_to_ann(ann, rows)
+        if path is not None:
+            ann.save(path)
+
+        self.ann = ann
+        self.ann_candidates = candidates
+        self.ann_refine = refine
+        return ann
+
+    def _add_to_ann(self, ann, rows):
+        # Ids are cache rows, so refinement reads the cache memmap directly
+        matrix = self.cache.matrix()
+        for start in range(0, len(rows), SCORE_BLOCK_ROWS):
+            block = rows[start : start + SCORE_BLOCK_ROWS]
+            ann.add(matrix[block], ids=block)
+
+    def _update_ann(self):
+        """Add new documents to the ANN index, or rebuild it once documents were removed."""
+        rows = np.unique(self.doc_rows)
+        if len(np.setdiff1d(self.ann.ids, rows, assume_unique=True)):
+            self.build_ann(
+                m=self.ann.m,
+                nprobe=self.ann.nprobe,
+                candidates=self.ann_candidates,
+                refine=self.ann_refine,
+                path=self.ann.path,
+            )
+            return
+
+        new_rows = np.setdiff1d(rows, self.ann.ids, assume_unique=True)
+        if len(new_rows):
+            self._add_to_ann(self.ann, new_rows)
+            if self.ann.path is not None:
+                self.ann.save(self.ann.path)
+
+    def score(self, query):
+        """Cosine similarity of the query to every document."""
+        return self.score_many([query])[0]
+
+    def score_many(self, queries):
+        """
+        Cosine similarity of each query to every document, as a
+        (queries x documents) array. All queries are embedded in one call.
+        """
+        if len(self.doc_rows) == 0:
+            return np.zeros((len(queries), 0), dtype=np.float32)
+
+        query_vecs = np.asarray(
+            self.embedder.encode(list(queries), batch_size=self.batch_size),
+            dtype=np.float32,
+        )
+
+        matrix = self.cache.matrix()
+        if self.ann is not None:
+            return np.stack([self._ann_score(vec, matrix) for vec in query_vecs])
+
+        # Only this index's rows are read, even when the cache is shared
+        sims = np.empty((len(query_vecs), len(self.doc_rows)), dtype=np.float32)
+        for start in range(0, len(self.doc_rows), SCORE_BLOCK_ROWS):
+            rows = self.doc_rows[start : start + SCORE_BLOCK_ROWS]
+            sims[:, start : start + len(rows)] = query_vecs @ matrix[rows].astype(np.float32).T
+
+        return sims
+
+    def _ann_score(self, query_vec, matrix):
+        ids, dists = self.ann.search(
+            query_vec,
+            k=self.ann_candidates,
+            vectors=matrix,
+            refine=self.ann_refine,
+        )
+        found = ids >= 0
+        sims = np.zeros(len(matrix), dtype=np.float32)
+        # Unit vectors: cosine = 1 - squared L2 distance / 2
+        sims[ids[found]] = 1 - dists[found] / 2
+        return sims[self.doc_rows]
@@ -0,0 +1,176 @@
+"""
+On-disk snapshots of fitted search indexes.
+
+A snapshot holds the fitted index (documents plus the index structures)
+for one repository at one commit, built with one set of ingestion
+parameters. Loading a snapshot skips the archive download, the markdown
+parsing and the index fit entirely.
+"""
+
+import os
+import json
+import time
+import pickle
+import hashlib
+import inspect
+import tempfile
+import textwrap
+from pathlib import Path
+
+from lazy_import import lazy_import
+
+requests = lazy_import("requests")
+minsearch = lazy_import("minsearch")
+
+
+SNAPSHOT_VERSION = 2
+
+CACHE_DIR = Path(os.getenv("INDEX_CACHE_DIRECTORY", "index_cache"))
+
+# Snapshots younger than this many seconds are used without asking GitHub
+# whether the branch moved.
+CACHE_TTL = float(os.getenv("INDEX_CACHE_TTL", "600"))
+
+
+def resolve_commit(repo_owner, repo_name, branch="main", timeout=5):
+    """
+    Return the commit SHA the branch currently points to, or None when
+    GitHub cannot be reached.
+    """
+    url = f"https://api.github.com/repos/{repo_owner}/{repo_name}/commits/{branch}"
+    headers = {"Accept": "application/vnd.github.sha"}
+
+    try:
+        resp = requests.get(url, headers=headers, timeout=timeout)
+        resp.raise_for_status()
+    except requests.RequestException:
+        return None
+
+    sha = resp.text.strip()
+    return sha or None
+
+
+def callable_fingerprint(func):
+    if func is None:
+        return None
+
+    try:
+        source = textwrap.dedent(inspect.getsource(func))
+    except (OSError, TypeError):
+        source = getattr(func, "__qualname__", repr(func))
+
+    closure = getattr(func, "__closure__", None) or ()
+    captured = [repr(cell.cell_contents) for cell in closure]
+
+    return hashlib.sha256(json.dumps([source, captured]).encode()).hexdigest()
+
+
+def params_digest(
+    filter=None,
+    chunk=False,
+    chunking_params=None,
+    engine="minsearch",
+    embedding_model=None,
+):
+    """Stable digest of everything besides the commit that shapes the index."""
+    params = {
+        "snapshot_version": SNAPSHOT_VERSION,
+        "engine": engine,
+        "minsearch_version": getattr(minsearch, "__version__", None),
+        "filter": callable_fingerprint(filter),
+        "chunk": bool(chunk),
+        "chunking_params": chunking_params if chunk else None,
+        "embedding_model": embedding_model,
+    }
+    payload = json.dumps(params, sort_keys=True, default=repr)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def _safe(part):
+    return "".join(c if c.isalnum() or c in "-_." else "_" for c in part)
+
+
+def snapshot_dir(cache_dir, repo_owner, repo_name, branch):
+    return Path(cache_dir) / _safe(repo_owner) / _safe(repo_name) / _safe(branch)
+
+
+def snapshot_path(cache_dir, repo_owner, repo_name, branch, params, commit):
+    directory = snapshot_dir(cache_dir, repo_owner, repo_name, branch)
+    return directory / f"{params}-{commit}.pkl"
+
+
+def latest_snapshot(cache_dir, repo_owner, repo_name, branch, params):
+    """Most recently written or verified snapshot for these parameters."""
+    directory = snapshot_dir(cache_dir, repo_owner, repo_name, branch)
+    if not directory.exists():
+        return None
+
+    candidates = list(directory.glob(f"{params}-*.pkl"))
+    if not candidates:
+        return None
+
+    return max(candidates, key=lambda p: p.stat().st_mtime)
+
+
+def is_fresh(path, ttl=CACHE_TTL):
+    if ttl is None or ttl <= 0:
+        return False
+    return time.time() - path.stat().st_mtime < ttl
+
+
+def touch(path):
+    """Mark a snapshot as verified against the current branch head."""
+    os.utime(path)
+
+
+def load_snapshot(path):
+    """
+    Load a snapshot written by `save_snapshot`.
+
+    Returns None if the file is missing, unreadable or was written by a
+    different snapshot format version.
+    """
+    try:
+        with Path(path).open("rb") as f_in:
+            snapshot = pickle.load(f_in)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+        return None
+
+    if not isinstance(snapshot, dict):
+        return None
+    if snapshot.get("version") != SNAPSHOT_VERSION:
+        return None
+
+    return snapshot
+
+
+def save_snapshot(path, index, commit, **metadata):
+    """Atomically write the fitted index and its metadata to `path`."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    snapshot = {
+        "version": SNAPSHOT_VERSION,
+        "commit": commit,
+        "created_at": time.time(),
+        "index": index,
+        **metadata,
+    }
+
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f_out:
+            pickle.dump(snapshot, f_out, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_name, path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+    return path
+
+
+def prune_snapshots(directory, params, keep):
+    """Remove older snapshots for `params`, keeping only the one at `keep`."""
+    for path in Path(directory).glob(f"{params}-*.pkl"):
+        if path != keep:
+            path.unlink(missing_ok=True)
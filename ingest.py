@@ -1,37 +1,156 @@
-import io
+import os
+import re
+import time
+import pickle
 import zipfile
-import requests
-import frontmatter
+import tempfile
+from collections import deque
+from collections.abc import Sequence
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
 
-from minsearch import Index
+from lazy_import import lazy_import
 
+# Loaded on first use: together they take over a second to import
+requests = lazy_import("requests")
+frontmatter = lazy_import("frontmatter")
+pd = lazy_import("pandas")
+sparse = lazy_import("scipy.sparse")
+minsearch = lazy_import("minsearch")
 
-def read_repo_data(repo_owner, repo_name):
-    url = f"https://codeload.github.com/{repo_owner}/{repo_name}/zip/refs/heads/main"
-    resp = requests.get(url)
+import index_cache
+import tracing
+from chunk_store import ChunkStore
+from search_engine import SearchIndex
+from search_tools import HybridIndex
+from embeddings import VectorIndex, SentenceTransformerEmbedder
 
-    repository_data = []
 
-    zf = zipfile.ZipFile(io.BytesIO(resp.content))
+CODELOAD_URL = os.getenv("GITHUB_CODELOAD_URL", "https://codeload.github.com")
 
-    for file_info in zf.infolist():
-        filename = file_info.filename.lower()
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
 
-        if not (filename.endswith(".md") or filename.endswith(".mdx")):
-            continue
+# Fraction of files that may be patched in since the last full fit before
+# an incremental update refits the index.
+REFIT_RATIO = 0.25
+
+SEARCH_ENGINE = os.getenv("SEARCH_ENGINE", "minsearch")
+
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "false").lower() in ("1", "true", "yes")
+
+# Zip entries sent to a worker at a time when ingesting with `workers`.
+PARALLEL_BATCH_SIZE = 64
+
+
+def archive_url(repo_owner, repo_name, branch="main", commit=None):
+    prefix = f"{CODELOAD_URL}/{repo_owner}/{repo_name}/zip"
+    if commit is not None:
+        return f"{prefix}/{commit}"
+    return f"{prefix}/refs/heads/{branch}"
+
+
+def is_markdown(filename):
+    filename = filename.lower()
+    return filename.endswith(".md") or filename.endswith(".mdx")
+
+
+def repo_path(file_info):
+    # Strip the "<repo>-<ref>/" directory codeload puts around every entry
+    return file_info.filename.split("/", maxsplit=1)[-1]
+
+
+def parse_markdown(content, filename):
+    post = frontmatter.loads(content)
+    data = post.to_dict()
+    data["filename"] = filename
+    return data
+
+
+def parse_zip_entry(zf, file_info):
+    if not is_markdown(file_info.filename):
+        return None
+
+    with zf.open(file_info) as f_in:
+        content = f_in.read()
+
+    return parse_markdown(content, repo_path(file_info))
+
+
+@contextmanager
+def open_repo_archive(repo_owner, repo_name, branch="main", commit=None):
+    """
+    Download the repository archive and open it as a `zipfile.ZipFile`.
+
+    The download is spooled to a temporary file in fixed-size chunks, so
+    memory use does not grow with the size of the archive.
+    """
+    url = archive_url(repo_owner, repo_name, branch=branch, commit=commit)
+
+    with tempfile.TemporaryFile() as archive:
+        with tracing.span("ingest.download", url=url) as download:
+            with requests.get(url, stream=True) as resp:
+                resp.raise_for_status()
+                for block in resp.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    archive.write(block)
+            download.set(bytes=archive.tell())
 
-        with zf.open(file_info) as f_in:
-            content = f_in.read()
-            post = frontmatter.loads(content)
-            data = post.to_dict()
+        archive.seek(0)
 
-            _, filename_repo = file_info.filename.split("/", maxsplit=1)
-            data["filename"] = filename_repo
-            repository_data.append(data)
+        with zipfile.ZipFile(archive) as zf:
+            yield zf
 
-    zf.close()
 
-    return repository_data
+def iter_archive_docs(zf, only=None):
+    """Parse markdown entries of an open archive, optionally only the given paths."""
+    # One span for all files: the time spent parsing, not waiting for the consumer
+    parse_time, parsed = 0.0, 0
+    try:
+        for file_info in zf.infolist():
+            if only is not None and repo_path(file_info) not in only:
+                continue
+            start = time.perf_counter()
+            data = parse_zip_entry(zf, file_info)
+            parse_time += time.perf_counter() - start
+            if data is not None:
+                parsed += 1
+                yield data
+    finally:
+        tracing.record("ingest.parse", parse_time, files=parsed)
+
+
+def archive_manifest(zf):
+    """
+    Map every markdown file in the archive to a content hash.
+
+    The hash is the CRC-32 and size recorded in the zip central directory,
+    so building the manifest does not decompress anything.
+    """
+    return {
+        repo_path(file_info): f"{file_info.CRC:08x}:{file_info.file_size}"
+        for file_info in zf.infolist()
+        if is_markdown(file_info.filename)
+    }
+
+
+def diff_manifests(old, new):
+    """Return the (added, modified, deleted) sets of paths between two manifests."""
+    added = new.keys() - old.keys()
+    deleted = old.keys() - new.keys()
+    modified = {path for path in new.keys() & old.keys() if new[path] != old[path]}
+    return added, modified, deleted
+
+
+def iter_repo_data(repo_owner, repo_name, branch="main", commit=None):
+    """Yield parsed markdown documents from the repository archive one at a time."""
+    with open_repo_archive(repo_owner, repo_name, branch=branch, commit=commit) as zf:
+        yield from iter_archive_docs(zf)
+
+
+def read_repo_data(repo_owner, repo_name, branch="main", commit=None, stream=False):
+    docs = iter_repo_data(repo_owner, repo_name, branch=branch, commit=commit)
+    if stream:
+        return docs
+    return list(docs)
 
 
 def sliding_window(seq, size, step):
@@ -49,18 +168,424 @@ def sliding_window(seq, size, step):
     return result
 
 
-def chunk_documents(docs, size=2000, step=1000):
-    chunks = []
-
+def iter_chunks(docs, size=2000, step=1000):
     for doc in docs:
         doc_copy = doc.copy()
         doc_content = doc_copy.pop("content")
         doc_chunks = sliding_window(doc_content, size=size, step=step)
         for chunk in doc_chunks:
             chunk.update(doc_copy)
-        chunks.extend(doc_chunks)
+            yield chunk
+
+
+def chunk_documents(docs, size=2000, step=1000):
+    return list(iter_chunks(docs, size=size, step=step))
+
+
+MARKDOWN_BOUNDARY = re.compile(
+    r"(?P<fence>^(?:```|~~~).*?^(?:```|~~~)[^\n]*$)"
+    r"|(?P<header>^(?P<level>#{1,6})[ \t]+(?P<title>[^\n]*?)[ \t#]*$)"
+    r"|(?P<paragraph>\n[ \t]*\n)",
+    re.MULTILINE | re.DOTALL,
+)
+
+
+def markdown_spans(text, max_size=2000):
+    """
+    Split markdown into chunks that follow its structure.
+
+    Every header starts a new chunk, paragraphs of one section are packed
+    together up to `max_size` characters, and a paragraph longer than that
+    is cut at `max_size`. Fenced code blocks are never split on headers or
+    blank lines inside them. The text is scanned once with a single regex.
+
+    Yields (start, end, section) where section is the header path, e.g.
+    "Setup > Docker".
+    """
+    if max_size <= 0:
+        raise ValueError("max_size must be positive")
+
+    headers = []
+    section = ""
+    chunk_start = 0
+    cut = None
+
+    def emit(start, end):
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        if start < end:
+            yield start, end, section
+
+    def fit(pos):
+        # Flush everything before `pos` that no longer fits in one chunk
+        nonlocal chunk_start, cut
+        while pos - chunk_start > max_size:
+            if cut is not None:
+                yield from emit(chunk_start, cut[0])
+                chunk_start, cut = cut[1], None
+            else:
+                yield from emit(chunk_start, chunk_start + max_size)
+                chunk_start += max_size
+
+    for match in MARKDOWN_BOUNDARY.finditer(text):
+        if match.group("fence") is not None:
+            continue
+
+        yield from fit(match.start())
+
+        if match.group("paragraph") is not None:
+            cut = (match.start(), match.end())
+            continue
+
+        yield from emit(chunk_start, match.start())
+
+        level = len(match.group("level"))
+        while headers and headers[-1][0] >= level:
+            headers.pop()
+        headers.append((level, match.group("title").strip()))
+        section = " > ".join(title for _, title in headers)
+
+        chunk_start, cut = match.start(), None
+
+    yield from fit(len(text))
+    yield from emit(chunk_start, len(text))
+
+
+def iter_markdown_chunks(docs, max_size=2000):
+    for doc in docs:
+        doc_copy = doc.copy()
+        doc_content = doc_copy.pop("content")
+        for start, end, section in markdown_spans(doc_content, max_size=max_size):
+            chunk = {
+                "start": start,
+                "content": doc_content[start:end],
+                "section": section,
+            }
+            chunk.update(doc_copy)
+            yield chunk
+
+
+# Sliding windows used when chunking without explicit parameters
+DEFAULT_CHUNKING_PARAMS = {"size": 2000, "step": 1000}
+
+
+def prepare_documents(docs, filter=None, chunk=False, chunking_params=None):
+    """
+    Apply the filter and chunking to an iterable of documents.
+
+    `chunking_params` (default `DEFAULT_CHUNKING_PARAMS`) selects the
+    chunker with `method`:
+
+    - "sliding_window" (default): fixed `size`/`step` character windows
+    - "markdown": header and paragraph aware chunks of at most `max_size`
+      characters, each with its header path in "section"
+
+    With `compact` set, the chunks come back as a `ChunkStore` that keeps
+    every document text and metadata once instead of a copy per chunk.
+    """
+    if filter is not None:
+        docs = (doc for doc in docs if filter(doc))
+
+    if not chunk:
+        return docs
+
+    params = dict(chunking_params or DEFAULT_CHUNKING_PARAMS)
+    method = params.pop("method", "sliding_window")
+    compact = params.pop("compact", False)
+
+    if method == "sliding_window":
+        if compact:
+            return ChunkStore.from_documents(docs, **params)
+        return iter_chunks(docs, **params)
+
+    if method == "markdown":
+        if compact:
+            store = ChunkStore()
+            for doc in docs:
+                store.add_spans(doc, markdown_spans(doc["content"], **params))
+            return store
+        return iter_markdown_chunks(docs, **params)
+
+    raise ValueError(f"Unknown chunking method: {method}")
+
+
+def materialize(docs):
+    if isinstance(docs, Sequence):
+        return docs
+    return list(docs)
+
+
+def fit_index(docs, engine=None, hybrid=False, embedder=None):
+    """
+    Fit a search index over `docs`.
+
+    `engine` is "minsearch" for `minsearch.Index` or "native" for the
+    sparse `search_engine.SearchIndex`; it defaults to `SEARCH_ENGINE`.
+
+    With `hybrid` the text index is wrapped in a `search_tools.HybridIndex`
+    that also embeds the documents with `embedder` (default: the
+    sentence-transformers model named by `EMBEDDING_MODEL`).
+    """
+    engine = engine or SEARCH_ENGINE
+    text_fields = ["content", "filename"]
+
+    if engine == "minsearch":
+        index = minsearch.Index(text_fields=text_fields)
+    elif engine == "native":
+        index = SearchIndex(text_fields=text_fields)
+    else:
+        raise ValueError(f"Unknown search engine: {engine}")
+
+    if hybrid:
+        index = HybridIndex(index, VectorIndex(embedder))
+
+    with tracing.span("ingest.fit", engine=engine, hybrid=hybrid) as fit:
+        index.fit(materialize(docs))
+        fit.set(docs=len(index.docs))
+    return index
+
+
+def build_index(
+    docs,
+    filter=None,
+    chunk=False,
+    chunking_params=None,
+    engine=None,
+    hybrid=False,
+    embedder=None,
+):
+    """Fit an index from an iterable of documents, consuming it lazily."""
+    docs = prepare_documents(docs, filter, chunk, chunking_params)
+    return fit_index(docs, engine=engine, hybrid=hybrid, embedder=embedder)
+
+
+def _prepare_batch(entries, filter, chunk, chunking_params):
+    docs = (parse_markdown(content, filename) for filename, content in entries)
+    return list(prepare_documents(docs, filter, chunk, chunking_params))
+
+
+def _iter_entry_batches(zf, only, batch_size):
+    batch = []
+    for file_info in zf.infolist():
+        if not is_markdown(file_info.filename):
+            continue
+        filename = repo_path(file_info)
+        if only is not None and filename not in only:
+            continue
+        batch.append((filename, zf.read(file_info)))
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _is_picklable(obj):
+    try:
+        pickle.dumps(obj)
+    except (pickle.PicklingError, AttributeError, TypeError):
+        return False
+    return True
+
+
+def _iter_parallel_docs(zf, only, filter, chunk, chunking_params, workers, batch_size):
+    # Filtering has to happen before chunking. A filter the workers cannot
+    # receive (e.g. a closure) is applied here, after parallel parsing.
+    local_filter = None
+    if filter is not None and not _is_picklable(filter):
+        local_filter, filter = filter, None
+    local_chunking = local_filter is not None and chunk
+    if local_chunking:
+        chunk = False
+
+    batches = _iter_entry_batches(zf, only, batch_size)
+    pending = deque()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Keep a bounded number of batches in flight and yield them in
+        # archive order, so output is deterministic and memory stays flat.
+        for batch in batches:
+            pending.append(
+                executor.submit(_prepare_batch, batch, filter, chunk, chunking_params)
+            )
+            if len(pending) >= 2 * workers:
+                docs = pending.popleft().result()
+                yield from prepare_documents(
+                    docs, local_filter, local_chunking, chunking_params
+                )
+
+        while pending:
+            docs = pending.popleft().result()
+            yield from prepare_documents(
+                docs, local_filter, local_chunking, chunking_params
+            )
+
+
+def load_archive_docs(
+    zf,
+    only=None,
+    filter=None,
+    chunk=False,
+    chunking_params=None,
+    workers=None,
+    batch_size=PARALLEL_BATCH_SIZE,
+):
+    """
+    Parse, filter and chunk the markdown entries of an open archive.
+
+    With `workers` > 1 the entries are sent in batches of `batch_size` to a
+    process pool that decodes them, parses the frontmatter and chunks
+    them. Documents come back in archive order either way.
+    """
+    if chunk and chunking_params is None:
+        chunking_params = DEFAULT_CHUNKING_PARAMS
+    if workers is None or workers <= 1:
+        docs = iter_archive_docs(zf, only=only)
+        return prepare_documents(docs, filter, chunk, chunking_params)
+
+    if chunk and chunking_params.get("compact"):
+        # Compact chunks are only offsets, so there is nothing to gain from
+        # chunking in the workers; parse there and build the store here.
+        docs = _iter_parallel_docs(zf, only, filter, False, None, workers, batch_size)
+        return prepare_documents(docs, None, chunk, chunking_params)
+
+    return _iter_parallel_docs(
+        zf, only, filter, chunk, chunking_params, workers, batch_size
+    )
+
+
+# Internals of `minsearch.Index` (0.2.x) that `patch_index` updates in place
+MINSEARCH_INTERNALS = ("text_matrices", "vectorizers", "keyword_df", "numeric_df", "date_df")
+
+
+def _patchable(index):
+    if not all(hasattr(index, attr) for attr in MINSEARCH_INTERNALS):
+        return False
+    index_filter = getattr(index, "_filter", None)
+    return index_filter is None or hasattr(index_filter, "refresh")
+
+
+def patch_index(index, remove_filenames, new_docs):
+    """
+    Drop every document of `remove_filenames` from a fitted index and add
+    `new_docs`, without refitting.
+
+    New documents are vectorized with the vocabulary and IDF weights of the
+    last full fit, so terms that first appear in them only become
+    searchable after the next fit. A hybrid index embeds only the chunks
+    whose content is not in the embedding cache yet. A `minsearch.Index`
+    without the internals this relies on is refitted instead.
+    """
+    if isinstance(index, HybridIndex):
+        patch_index(index.text_index, remove_filenames, new_docs)
+        index.vectors.update(index.docs)
+        index.version += 1
+        return index
+
+    if not index.docs:
+        index.fit(materialize(new_docs))
+        index.version = getattr(index, "version", 0) + 1
+        return index
+
+    keep = [
+        i for i, doc in enumerate(index.docs)
+        if doc.get("filename") not in remove_filenames
+    ]
+
+    if isinstance(index.docs, ChunkStore):
+        docs = index.docs.take(keep).extend(new_docs)
+    else:
+        docs = [index.docs[i] for i in keep] + list(new_docs)
 
-    return chunks
+    if isinstance(index, SearchIndex):
+        return index.patch(keep, new_docs, docs)
+
+    if not _patchable(index):
+        # A minsearch release with different internals: refit instead
+        index.fit(docs)
+        index.version = getattr(index, "version", 0) + 1
+        return index
+
+    for field in index.text_fields:
+        matrix = index.text_matrices[field][keep]
+        if new_docs:
+            texts = [doc.get(field, "") or "" for doc in new_docs]
+            added = index.vectorizers[field].transform(texts)
+            matrix = sparse.vstack([matrix, added], format="csr")
+        index.text_matrices[field] = matrix
+
+    for attr, fields in (
+        ("keyword_df", index.keyword_fields),
+        ("numeric_df", index.numeric_fields),
+        ("date_df", index.date_fields),
+    ):
+        if not fields:
+            continue
+        df = getattr(index, attr)
+        added = pd.DataFrame(
+            {field: [doc.get(field) for doc in new_docs] for field in fields},
+            index=range(len(new_docs)),
+        )
+        if attr == "date_df":
+            added = added.apply(pd.to_datetime)
+        setattr(index, attr, pd.concat([df.iloc[keep], added], ignore_index=True))
+
+    index.docs = docs
+    # Lets search result caches tell the patched index from the old one
+    index.version = getattr(index, "version", 0) + 1
+
+    if getattr(index, "_filter", None) is not None:
+        index._filter.refresh(
+            keyword_data=index.keyword_df,
+            numeric_data=index.numeric_df,
+            date_data=index.date_df,
+            num_docs=len(index.docs),
+        )
+
+    return index
+
+
+def update_index(
+    index,
+    zf,
+    manifest,
+    previous_manifest,
+    filter=None,
+    chunk=False,
+    chunking_params=None,
+    workers=None,
+):
+    """
+    Bring an index built from `previous_manifest` up to date with the open
+    archive `zf`, re-parsing and re-chunking only the files that changed.
+
+    Returns the number of changed files.
+    """
+    added, modified, deleted = diff_manifests(previous_manifest, manifest)
+    if not (added or modified or deleted):
+        return 0
+
+    docs = load_archive_docs(
+        zf,
+        only=added | modified,
+        filter=filter,
+        chunk=chunk,
+        chunking_params=chunking_params,
+        workers=workers,
+    )
+    patch_index(index, modified | deleted, materialize(docs))
+
+    return len(added) + len(modified) + len(deleted)
+
+
+@tracing.traced("ingest.index_data")
+def snapshot_index(snapshot):
+    """The index of a snapshot, with the commit it was built from as `commit`."""
+    index = snapshot["index"]
+    index.commit = snapshot.get("commit")
+    return index
 
 
 def index_data(
@@ -69,20 +594,126 @@ def index_data(
     filter=None,
     chunk=False,
     chunking_params=None,
+    branch="main",
+    use_cache=True,
+    cache_dir=None,
+    cache_ttl=None,
+    incremental=True,
+    workers=None,
+    engine=None,
+    hybrid=None,
+    embedder=None,
 ):
-    docs = read_repo_data(repo_owner, repo_name)
+    """
+    Download, parse and index the markdown files of a GitHub repository.
 
-    if filter is not None:
-        docs = [doc for doc in docs if filter(doc)]
+    With `use_cache` the fitted index is saved as a snapshot under
+    `cache_dir` (default `INDEX_CACHE_DIRECTORY`), keyed by repository,
+    branch, commit SHA and the filter/chunking parameters. A snapshot
+    younger than `cache_ttl` seconds is reused without any network call;
+    an older one is reused after checking that the branch head has not
+    moved. If GitHub cannot be reached, the newest snapshot is used.
+
+    When the branch has moved and `incremental` is set, the previous
+    snapshot is patched with only the files whose content hash changed.
+
+    `workers` > 1 parses and chunks the archive on a process pool of that
+    size; `filter` should then be a module-level function so the workers
+    can apply it too.
+
+    `engine` picks the index implementation and `hybrid` adds dense
+    embeddings from `embedder`, see `fit_index`. They default to
+    `SEARCH_ENGINE` and `HYBRID_SEARCH`.
+
+    An index built from or loaded for a known commit has it as `commit`.
+    """
+    if chunk and chunking_params is None:
+        chunking_params = DEFAULT_CHUNKING_PARAMS
+    engine = engine or SEARCH_ENGINE
+    if hybrid is None:
+        hybrid = HYBRID_SEARCH
+    fit_params = {"engine": engine, "hybrid": hybrid, "embedder": embedder}
+
+    prepare_params = {
+        "filter": filter,
+        "chunk": chunk,
+        "chunking_params": chunking_params,
+        "workers": workers,
+    }
+
+    if not use_cache:
+        with open_repo_archive(repo_owner, repo_name, branch=branch) as zf:
+            return fit_index(load_archive_docs(zf, **prepare_params), **fit_params)
+
+    if cache_dir is None:
+        cache_dir = index_cache.CACHE_DIR
+    if cache_ttl is None:
+        cache_ttl = index_cache.CACHE_TTL
+
+    if hybrid and embedder is None:
+        embedder = fit_params["embedder"] = SentenceTransformerEmbedder()
 
-    if chunk:
-        if chunking_params is None:
-            chunking_params = {"size": 2000, "step": 1000}
-        docs = chunk_documents(docs, **chunking_params)
+    params = index_cache.params_digest(
+        filter=filter,
+        chunk=chunk,
+        chunking_params=chunking_params,
+        engine=engine,
+        embedding_model=embedder.name if hybrid else None,
+    )
+
+    latest = index_cache.latest_snapshot(
+        cache_dir, repo_owner, repo_name, branch, params
+    )
+    if latest is not None and index_cache.is_fresh(latest, cache_ttl):
+        snapshot = index_cache.load_snapshot(latest)
+        if snapshot is not None:
+            return snapshot_index(snapshot)
+
+    commit = index_cache.resolve_commit(repo_owner, repo_name, branch)
+
+    if commit is None:
+        # Offline: any snapshot is better than failing to start
+        if latest is not None:
+            snapshot = index_cache.load_snapshot(latest)
+            if snapshot is not None:
+                return snapshot_index(snapshot)
+        with open_repo_archive(repo_owner, repo_name, branch=branch) as zf:
+            return fit_index(load_archive_docs(zf, **prepare_params), **fit_params)
 
-    index = Index(
-        text_fields=["content", "filename"],
+    path = index_cache.snapshot_path(
+        cache_dir, repo_owner, repo_name, branch, params, commit
     )
+    snapshot = index_cache.load_snapshot(path)
+    if snapshot is not None:
+        index_cache.touch(path)
+        return snapshot_index(snapshot)
 
-    index.fit(docs)
+    previous = None
+    if incremental and latest is not None:
+        previous = index_cache.load_snapshot(latest)
+
+    with open_repo_archive(repo_owner, repo_name, commit=commit) as zf:
+        manifest = archive_manifest(zf)
+
+        if previous is not None and previous.get("manifest") is not None:
+            index = previous["index"]
+            changed = update_index(
+                index, zf, manifest, previous["manifest"], **prepare_params
+            )
+            stale_files = previous.get("stale_files", 0) + changed
+
+            # Patched documents use the IDF weights of the last full fit;
+            # refit once enough of the corpus has drifted from them.
+            if stale_files > REFIT_RATIO * len(manifest):
+                index.fit(index.docs)
+                stale_files = 0
+        else:
+            index = fit_index(load_archive_docs(zf, **prepare_params), **fit_params)
+            stale_files = 0
+
+    index.commit = commit
+    index_cache.save_snapshot(
+        path, index, commit=commit, manifest=manifest, stale_files=stale_files
+    )
+    index_cache.prune_snapshots(path.parent, params, keep=path)
     return index
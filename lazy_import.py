@@ -0,0 +1,34 @@
+"""
+Deferred imports of heavy dependencies.
+
+    pd = lazy_import("pandas")
+
+binds the module right away but only executes it on first attribute
+access, so importing a module of this project does not pay for pandas,
+scikit-learn (through minsearch), scipy or pydantic-ai until they are
+used. A module that is already imported is returned as is.
+"""
+
+import sys
+import importlib.util
+
+
+def lazy_import(name):
+    """The module `name`, loaded when one of its attributes is first used."""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+
+    parent, _, child = name.rpartition(".")
+    if parent:
+        setattr(sys.modules[parent], child, module)
+    return module
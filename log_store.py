@@ -0,0 +1,479 @@
+"""
+Columnar store and analytics for interaction logs.
+
+`compact` reads the raw logs written by `logs` (JSONL segments, gzipped
+segments and legacy one-file-per-interaction JSON), extracts one flat
+record per interaction and appends them to `LOG_STORE_DIRECTORY` as a new
+part file: Parquet when a Parquet engine is installed, otherwise Arrow IPC
+when pyarrow is, otherwise CSV. Already compacted input is remembered, so
+the job can be run repeatedly, even while segments are still growing.
+
+`LogStore` loads the part files into one pandas DataFrame and answers
+aggregate questions over it, e.g. `LogStore().latency_percentile(0.95)`.
+
+    python log_store.py compact
+    python log_store.py report
+"""
+
+import os
+import gzip
+import json
+import time
+import zlib
+import secrets
+import argparse
+from pathlib import Path
+from datetime import datetime, timezone
+
+import pandas as pd
+
+import logs
+
+
+LOG_STORE_DIR = Path(os.getenv("LOG_STORE_DIRECTORY", "log_store"))
+
+LOG_STORE_FORMAT = os.getenv("LOG_STORE_FORMAT")
+
+MANIFEST_NAME = "compacted.json"
+
+COLUMNS = [
+    "timestamp",
+    "agent_name",
+    "provider",
+    "model",
+    "source",
+    "user_prompt",
+    "response",
+    "tools_called",
+    "num_tool_calls",
+    "num_messages",
+    "input_tokens",
+    "output_tokens",
+    "latency_s",
+    "ttft_s",
+    "model_s",
+    "tool_s",
+]
+
+SUFFIXES = {"parquet": ".parquet", "arrow": ".arrow", "csv": ".csv"}
+
+
+def available_format():
+    """Best storage format the installed libraries can write."""
+    try:
+        import pyarrow.parquet  # noqa: F401
+
+        return "parquet"
+    except ImportError:
+        pass
+    try:
+        import fastparquet  # noqa: F401
+
+        return "parquet"
+    except ImportError:
+        pass
+    try:
+        import pyarrow.feather  # noqa: F401
+
+        return "arrow"
+    except ImportError:
+        return "csv"
+
+
+def _parse_time(value):
+    """Naive UTC timestamp, or None if `value` is missing or malformed."""
+    if value is None:
+        return None
+    try:
+        ts = datetime.fromisoformat(value) if isinstance(value, str) else value
+    except ValueError:
+        return None
+    if not isinstance(ts, datetime):
+        return None
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+def extract_record(entry):
+    """Flatten one logged interaction into a row of `COLUMNS`."""
+    messages = entry.get("messages") or []
+
+    user_prompt = None
+    response = None
+    tools = []
+    input_tokens = 0
+    output_tokens = 0
+    times = []
+
+    for message in messages:
+        if "role" in message:
+            # Minimal entries logged by app.py
+            if message["role"] == "user" and user_prompt is None:
+                user_prompt = message.get("content")
+            elif message["role"] == "assistant":
+                response = message.get("content")
+            times.append(message.get("timestamp"))
+            continue
+
+        usage = message.get("usage") or {}
+        input_tokens += usage.get("input_tokens") or 0
+        output_tokens += usage.get("output_tokens") or 0
+        times.append(message.get("timestamp"))
+
+        for part in message.get("parts") or []:
+            kind = part.get("part_kind")
+            times.append(part.get("timestamp"))
+            if kind == "user-prompt" and user_prompt is None:
+                content = part.get("content")
+                user_prompt = content if isinstance(content, str) else json.dumps(content)
+            elif kind == "tool-call":
+                tools.append(part.get("tool_name"))
+            elif kind == "text":
+                response = part.get("content")
+
+    parsed = [t for t in (_parse_time(t) for t in times) if t is not None]
+    timestamp = _parse_time(entry.get("timestamp")) or (max(parsed) if parsed else None)
+
+    trace = entry.get("trace") or {}
+    latency = entry.get("latency_s")
+    if latency is None and len(parsed) > 1:
+        latency = (max(parsed) - min(parsed)).total_seconds()
+
+    return {
+        "timestamp": timestamp,
+        "agent_name": entry.get("agent_name"),
+        "provider": entry.get("provider"),
+        "model": entry.get("model"),
+        "source": entry.get("source"),
+        "user_prompt": user_prompt,
+        "response": response,
+        "tools_called": ";".join(tool for tool in tools if tool),
+        "num_tool_calls": len(tools),
+        "num_messages": len(messages),
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "latency_s": latency,
+        "ttft_s": entry.get("ttft_s"),
+        "model_s": trace.get("model_s"),
+        "tool_s": trace.get("tool_s"),
+    }
+
+
+def _read_new_entries(path, offset):
+    """
+    Entries of a raw log file past `offset`, the offset to resume from, the
+    number of skipped lines and whether the file is damaged.
+
+    Plain JSONL segments may still be appended to, so only complete lines
+    are consumed. Compressed segments are finished and read to the end; of
+    a truncated one, the complete lines before the damage are kept. Lines
+    that are not JSON objects are skipped.
+    """
+    if path.suffix == ".json":
+        try:
+            with path.open(encoding="utf-8") as f_in:
+                entry = json.load(f_in)
+        except (ValueError, UnicodeDecodeError):
+            return [], None, 0, True
+        if not isinstance(entry, dict):
+            return [], None, 0, True
+        return [entry], None, 0, False
+
+    damaged = False
+    data = bytearray()
+    opener = gzip.open if path.suffix == ".gz" else open
+    with opener(path, "rb") as f_in:
+        try:
+            f_in.seek(offset)
+            # read1 keeps what was decompressed before a truncated end
+            while chunk := f_in.read1(2**20):
+                data += chunk
+        except (EOFError, gzip.BadGzipFile, zlib.error):
+            damaged = True
+    end = data.rfind(b"\n") + 1
+
+    entries = []
+    bad_lines = 0
+    for line in bytes(data[:end]).splitlines():
+        if not line.strip():
+            continue
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            entry = None
+        if isinstance(entry, dict):
+            entries.append(entry)
+        else:
+            bad_lines += 1
+    return entries, None if path.suffix == ".gz" else offset + end, bad_lines, damaged
+
+
+def _load_manifest(store_dir):
+    path = Path(store_dir) / MANIFEST_NAME
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text())
+
+
+def _save_manifest(store_dir, manifest):
+    path = Path(store_dir) / MANIFEST_NAME
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(manifest))
+    os.replace(tmp_path, path)
+
+
+def to_frame(records):
+    """DataFrame with the store's columns and dtypes, built column-wise."""
+    columns = {name: [record[name] for record in records] for name in COLUMNS}
+    df = pd.DataFrame(columns, columns=COLUMNS)
+    df["timestamp"] = pd.to_datetime(df["timestamp"])
+    for name in ["num_tool_calls", "num_messages", "input_tokens", "output_tokens"]:
+        df[name] = df[name].astype("int64")
+    for name in ["latency_s", "ttft_s", "model_s", "tool_s"]:
+        df[name] = df[name].astype("float64")
+    return df
+
+
+def write_part(df, store_dir, format=None):
+    """Write `df` as a new part file and return its path."""
+    format = format or LOG_STORE_FORMAT or available_format()
+    if format not in SUFFIXES:
+        raise ValueError(f"Unknown log store format: {format}")
+    store_dir = Path(store_dir)
+    store_dir.mkdir(parents=True, exist_ok=True)
+
+    ts_str = time.strftime("%Y%m%d_%H%M%S")
+    path = store_dir / f"part_{ts_str}_{secrets.token_hex(3)}{SUFFIXES[format]}"
+    tmp_path = path.with_name(path.name + ".tmp")
+
+    if format == "parquet":
+        df.to_parquet(tmp_path, index=False)
+    elif format == "arrow":
+        df.to_feather(tmp_path)
+    else:
+        df.to_csv(tmp_path, index=False)
+
+    os.replace(tmp_path, path)
+    return path
+
+
+def compact(log_dir=None, store_dir=None, format=None, stats=None):
+    """
+    Append every interaction logged since the last run to the store.
+
+    Malformed lines and damaged files (e.g. a torn last line or a truncated
+    `.gz` segment after a crash) are skipped rather than failing the run.
+    When a `stats` dict is given, it receives the number of "records"
+    stored and of "bad_lines" and "bad_files" skipped.
+
+    Returns the path of the new part file, or None if nothing was new.
+    """
+    log_dir = Path(log_dir or logs.LOG_DIR)
+    store_dir = Path(store_dir or LOG_STORE_DIR)
+    manifest = _load_manifest(store_dir)
+
+    records = []
+    updates = {}
+    bad_lines = bad_files = 0
+    paths = sorted(log_dir.glob("*.jsonl")) + sorted(log_dir.glob("*.jsonl.gz"))
+    paths += sorted(log_dir.glob("*.json"))
+
+    for path in paths:
+        done = manifest.get(path.name)
+        if done is True:
+            continue
+        plain = None
+        if path.suffix == ".gz":
+            # A rotated segment is gzipped under its old name plus ".gz";
+            # resume where the plain file was left, once it is gone.
+            plain = path.with_suffix("")
+            if plain.exists():
+                continue
+            done = updates.get(plain.name, manifest.get(plain.name, 0))
+        try:
+            entries, offset, bad, damaged = _read_new_entries(path, done or 0)
+        except OSError:
+            # Unreadable for now; retried by the next run
+            bad_files += 1
+            continue
+
+        for entry in entries:
+            try:
+                records.append(extract_record(entry))
+            except (KeyError, TypeError, ValueError, AttributeError):
+                bad += 1
+        bad_lines += bad
+        bad_files += damaged
+        if plain is not None:
+            updates.pop(plain.name, None)
+            manifest.pop(plain.name, None)
+        updates[path.name] = True if offset is None else offset
+
+    part = write_part(to_frame(records), store_dir, format) if records else None
+
+    # Written after the part, so a crash re-reads input instead of losing it
+    if updates:
+        manifest.update(updates)
+        store_dir.mkdir(parents=True, exist_ok=True)
+        _save_manifest(store_dir, manifest)
+    if stats is not None:
+        stats.update(records=len(records), bad_lines=bad_lines, bad_files=bad_files)
+    return part
+
+
+def _part_columns(path):
+    if path.suffix == ".parquet":
+        import pyarrow.parquet
+
+        return pyarrow.parquet.read_schema(path).names
+    if path.suffix == ".arrow":
+        import pyarrow.feather
+
+        return pyarrow.feather.read_table(path, memory_map=True).column_names
+    return pd.read_csv(path, nrows=0).columns.tolist()
+
+
+def _read_part(path, columns=None):
+    """
+    The requested columns of one part file. Columns added to `COLUMNS`
+    after the part was written come back empty.
+    """
+    columns = list(columns or COLUMNS)
+    present = set(_part_columns(path))
+    df = _read_present(path, [name for name in columns if name in present])
+    for name in columns:
+        if name not in df:
+            df[name] = to_frame([])[name].reindex(df.index)
+    return df[columns]
+
+
+def _read_present(path, columns):
+    if path.suffix == ".parquet":
+        return pd.read_parquet(path, columns=columns)
+    if path.suffix == ".arrow":
+        return pd.read_feather(path, columns=columns)
+    df = pd.read_csv(
+        path,
+        usecols=columns,
+        parse_dates=["timestamp"] if "timestamp" in columns else None,
+        # Only empty fields are missing; a prompt of "NA" stays a string
+        keep_default_na=False,
+        na_values=[""],
+    )
+    for name in ["agent_name", "provider", "model", "source", "user_prompt", "response"]:
+        if name in df:
+            df[name] = df[name].astype("object")
+    if "tools_called" in df:
+        df["tools_called"] = df["tools_called"].fillna("").astype("object")
+    return df
+
+
+class LogStore:
+    """
+    Query API over the compacted part files in `store_dir`.
+
+    Loaded columns are cached until the set of part files changes.
+    """
+
+    def __init__(self, store_dir=None):
+        self.store_dir = Path(store_dir or LOG_STORE_DIR)
+        self._cache_key = None
+        self._cache = {}
+
+    def parts(self):
+        return sorted(
+            path
+            for suffix in SUFFIXES.values()
+            for path in self.store_dir.glob(f"part_*{suffix}")
+        )
+
+    def load(self, columns=None):
+        """All compacted interactions, optionally only some columns."""
+        parts = self.parts()
+        key = tuple((path.name, path.stat().st_mtime) for path in parts)
+        if key != self._cache_key:
+            self._cache_key = key
+            self._cache = {}
+
+        wanted = list(columns or COLUMNS)
+        missing = [name for name in wanted if name not in self._cache]
+        if missing:
+            if parts:
+                frames = [_read_part(path, missing) for path in parts]
+                loaded = pd.concat(frames, ignore_index=True)
+            else:
+                loaded = to_frame([])[missing]
+            for name in missing:
+                self._cache[name] = loaded[name]
+
+        return pd.DataFrame({name: self._cache[name] for name in wanted})
+
+    def latency_percentile(self, q=0.95, freq="D", column="latency_s"):
+        """
+        Latency quantile in seconds per period (default: per day). Pass
+        `column="ttft_s"` for time to first token of streamed answers.
+        """
+        df = self.load(["timestamp", column]).dropna()
+        return df.groupby(df["timestamp"].dt.floor(freq))[column].quantile(q)
+
+    def top_queries(self, n=10):
+        """Most frequent user prompts, compared case- and space-insensitively."""
+        # Normalize the distinct prompts only, then add up their counts
+        counts = self.load(["user_prompt"])["user_prompt"].value_counts()
+        normalized = counts.index.astype(str).str.lower().str.split().str.join(" ")
+        counts = counts.groupby(normalized).sum()
+        counts = counts[counts.index != ""]
+        return counts.sort_values(ascending=False, kind="stable").head(n)
+
+    def token_usage(self, freq="D"):
+        """Input and output tokens per period."""
+        df = self.load(["timestamp", "input_tokens", "output_tokens"])
+        grouped = df.groupby(df["timestamp"].dt.floor(freq))
+        return grouped[["input_tokens", "output_tokens"]].sum()
+
+    def tool_usage(self):
+        """Number of calls per tool."""
+        combos = self.load(["tools_called"])["tools_called"].fillna("").value_counts()
+        counts = {}
+        for combo, count in combos.items():
+            for tool in filter(None, combo.split(";")):
+                counts[tool] = counts.get(tool, 0) + count
+        return pd.Series(counts, dtype="int64").sort_values(ascending=False, kind="stable")
+
+    def model_usage(self):
+        """Interactions per model."""
+        return self.load(["model"])["model"].value_counts()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("command", choices=["compact", "report"])
+    parser.add_argument("--log-dir", default=None)
+    parser.add_argument("--store-dir", default=None)
+    parser.add_argument("--format", choices=sorted(SUFFIXES), default=None)
+    args = parser.parse_args()
+
+    if args.command == "compact":
+        stats = {}
+        part = compact(args.log_dir, args.store_dir, args.format, stats=stats)
+        print(f"Wrote {part}" if part else "No new interactions")
+        if stats["bad_lines"] or stats["bad_files"]:
+            print(f"Skipped {stats['bad_lines']} malformed lines and {stats['bad_files']} damaged files")
+        return
+
+    store = LogStore(args.store_dir)
+    print("p95 latency per day (s):")
+    print(store.latency_percentile(0.95).to_string())
+    print("\np95 time to first token per day (s):")
+    print(store.latency_percentile(0.95, column="ttft_s").to_string())
+    print("\nTop queries:")
+    print(store.top_queries(10).to_string())
+    print("\nTokens per day:")
+    print(store.token_usage().to_string())
+    print("\nTool calls:")
+    print(store.tool_usage().to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,31 @@
 import os
+import gzip
 import json
+import time
+import queue
+import atexit
+import shutil
 import secrets
+import threading
 from pathlib import Path
 from datetime import datetime
 
 from pydantic_ai.messages import ModelMessagesTypeAdapter
 
+import tracing
 
+
+# Created when the first interaction is written
 LOG_DIR = Path(os.getenv("LOGS_DIRECTORY", "logs"))
-LOG_DIR.mkdir(exist_ok=True)
+
+# "jsonl" appends to rotated segments from a background thread; "json"
+# writes one pretty-printed file per interaction on the calling thread
+LOG_FORMAT = os.getenv("LOG_FORMAT", "jsonl")
+
+LOG_ROTATE_BYTES = int(float(os.getenv("LOG_ROTATE_MB", "64")) * 2**20)
+LOG_ROTATE_SECONDS = float(os.getenv("LOG_ROTATE_SECONDS", "3600"))
+LOG_COMPRESS = os.getenv("LOG_COMPRESS", "false").lower() in ("1", "true", "yes")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
 
 
 def log_entry(agent, messages, source="user"):
@@ -36,6 +53,217 @@ def serializer(obj):
     raise TypeError(f"Type {type(obj)} not serializable")
 
 
+# Queued by `BackgroundLogger.close` to stop the writer thread
+_STOP = object()
+
+
+class BackgroundLogger:
+    """
+    Writes log entries from a background thread to JSONL segments.
+
+    `log` never blocks: entries go on a bounded queue and are dropped (and
+    counted) when it is full. The writer thread takes up to `batch_size`
+    entries at a time and appends them to the current segment with one
+    write. A segment is closed once it holds `max_bytes` or is older than
+    `max_age` seconds, and is then gzipped if `compress` is set.
+
+    Args:
+        directory: Where segments are written.
+        prefix (str): Segment file name prefix.
+        flush_interval (float): Seconds the writer waits for more entries.
+    """
+
+    def __init__(
+        self,
+        directory=LOG_DIR,
+        prefix="interactions",
+        max_bytes=LOG_ROTATE_BYTES,
+        max_age=LOG_ROTATE_SECONDS,
+        compress=LOG_COMPRESS,
+        queue_size=LOG_QUEUE_SIZE,
+        batch_size=256,
+        flush_interval=1.0,
+    ):
+        self.directory = Path(directory)
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.compress = compress
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.segments = 0
+        self.errors = 0
+
+        self._segment = None
+        self._segment_path = None
+        self._segment_started = 0.0
+        self._lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+
+    def log(self, entry):
+        """Queue an entry; returns False if it was dropped."""
+        if not self._closed:
+            self._ensure_started()
+            try:
+                self.queue.put_nowait(entry)
+            except queue.Full:
+                pass
+            else:
+                with self._lock:
+                    self.enqueued += 1
+                return True
+
+        with self._lock:
+            self.dropped += 1
+        return False
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="gitsensei-logger", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        stop = False
+        while not stop:
+            try:
+                batch = [self.queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                # Close (and compress) an old segment even when idle
+                self._rotate_if_due()
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            entries = [entry for entry in batch if entry is not _STOP]
+            stop = len(entries) < len(batch)
+            try:
+                self._write(entries)
+            except Exception:
+                self.errors += 1
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+        # Entries queued while closing
+        leftover = []
+        while True:
+            try:
+                leftover.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        self._write(leftover)
+        for _ in leftover:
+            self.queue.task_done()
+        self._close_segment()
+
+    def _write(self, batch):
+        if not batch:
+            return
+        self._rotate_if_due()
+        if self._segment is None:
+            self._open_segment()
+
+        # An unserializable entry is counted and skipped; the rest are written
+        lines = []
+        for entry in batch:
+            try:
+                lines.append(json.dumps(entry, default=serializer) + "\n")
+            except (TypeError, ValueError):
+                self.errors += 1
+        if not lines:
+            return
+        self._segment.write("".join(lines))
+        self._segment.flush()
+        self.written += len(lines)
+        self.batches += 1
+
+    def _rotate_if_due(self):
+        if self._segment is not None and (
+            self._segment.tell() >= self.max_bytes
+            or time.monotonic() - self._segment_started >= self.max_age
+        ):
+            self._close_segment()
+
+    def _open_segment(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        ts_str = datetime.now().strftime("%Y%m%d_%H%M%S")
+        # The sequence number keeps names in write order within a second
+        name = f"{self.prefix}_{ts_str}_{self.segments:05d}_{secrets.token_hex(3)}.jsonl"
+        self._segment_path = self.directory / name
+        self._segment = self._segment_path.open("a", encoding="utf-8")
+        self._segment_started = time.monotonic()
+        self.segments += 1
+
+    def _close_segment(self):
+        if self._segment is None:
+            return
+        self._segment.close()
+        self._segment = None
+        if self.compress:
+            with self._segment_path.open("rb") as f_in:
+                with gzip.open(f"{self._segment_path}.gz", "wb") as f_out:
+                    shutil.copyfileobj(f_in, f_out)
+            self._segment_path.unlink()
+
+    def flush(self):
+        """Block until every queued entry has been written."""
+        if self._thread is not None:
+            self.queue.join()
+
+    def close(self):
+        """Write everything still queued, close the segment and stop."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is None:
+            return
+        # The sentinel must not be dropped, so wait for room if needed
+        self.queue.put(_STOP)
+        self._thread.join()
+
+    def stats(self):
+        return {
+            "queue_depth": self.queue.qsize(),
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "segments": self.segments,
+            "errors": self.errors,
+        }
+
+
+_interaction_logger = None
+_interaction_logger_lock = threading.Lock()
+
+
+def interaction_logger():
+    """Process-wide `BackgroundLogger` for interactions, flushed at exit."""
+    global _interaction_logger
+    if _interaction_logger is None:
+        with _interaction_logger_lock:
+            if _interaction_logger is None:
+                _interaction_logger = BackgroundLogger(LOG_DIR)
+                atexit.register(_interaction_logger.close)
+    return _interaction_logger
+
+
+@tracing.traced("log_interaction")
 def log_interaction_to_file(
     agent=None,
     messages=None,
@@ -44,13 +272,26 @@ def log_interaction_to_file(
     user_prompt=None,
     agent_response=None,
     timestamp=None,
+    latency=None,
+    ttft=None,
+    trace=None,
 ):
     """
-    Log an agent interaction to a JSON file.
+    Log an agent interaction.
 
     Can be called in two ways:
     1. With agent and messages (from main.py)
     2. With individual parameters (from app.py)
+
+    Returns the path of the file the entry was written to, or None when
+    there is no such file yet: with `LOG_FORMAT=jsonl` (the default) the
+    entry is queued for the background `interaction_logger()`, which
+    writes it to a segment later and counts entries dropped on a full
+    queue in `stats()["dropped"]`. With `LOG_FORMAT=json` it is written
+    to its own file right away. `latency` (seconds from the
+    question to the full answer) and `ttft` (seconds to the first streamed
+    token) are stored as "latency_s" and "ttft_s" when given, and `trace`
+    (a request's `tracing` summary) as "trace".
     """
     if agent is not None and messages is not None:
         # Called from main.py style
@@ -89,8 +330,15 @@ def log_interaction_to_file(
             "Invalid parameters. Provide either (agent, messages) or (agent_name, user_prompt, agent_response)"
         )
 
+    if latency is not None:
+        entry["latency_s"] = latency
+    if ttft is not None:
+        entry["ttft_s"] = ttft
+    if trace is not None:
+        entry["trace"] = trace
+
     # Use timestamp from messages or current time
-    if messages and entry["messages"]:
+    if entry["messages"]:
         ts = entry["messages"][-1].get("timestamp", datetime.now())
     else:
         ts = datetime.now()
@@ -102,10 +350,15 @@ def log_interaction_to_file(
         except Exception:
             ts = datetime.now()
 
+    if LOG_FORMAT == "jsonl":
+        interaction_logger().log({**entry, "timestamp": ts.isoformat()})
+        return None
+
     ts_str = ts.strftime("%Y%m%d_%H%M%S")
     rand_hex = secrets.token_hex(3)
 
     filename = f"{agent_name_for_file}_{ts_str}_{rand_hex}.json"
+    LOG_DIR.mkdir(parents=True, exist_ok=True)
     filepath = LOG_DIR / filename
 
     with filepath.open("w", encoding="utf-8") as f_out:
@@ -1,40 +1,165 @@
+import answer_cache
 import ingest
-import search_agent
-import logs
+import profiling
+import shards
+import streaming
+import tracing
+from lazy_import import lazy_import
 
+import time
 import asyncio
+import argparse
+import functools
+import threading
+from concurrent.futures import Future
 from dotenv import load_dotenv
 
+# pydantic-ai takes about half a second to import; these load on the
+# background thread that builds the agent while the first question is typed
+logs = lazy_import("logs")
+scheduler = lazy_import("scheduler")
+search_agent = lazy_import("search_agent")
+
 # Load environment variables
 load_dotenv()
 
 
-REPO_OWNER = "DataTalksClub"
-REPO_NAME = "faq"
+# Comma-separated "owner/name" list; more than one serves them all as shards
+REPOS = shards.parse_repos(shards.REPOS)
+REPO_OWNER, REPO_NAME = REPOS[0].split("/")
 
 
-def initialize_index():
-    print(f"Starting GitSensei for {REPO_OWNER}/{REPO_NAME}")
-    print("Initializing data ingestion...")
+def filter(doc):
+    return "data-engineering" in doc["filename"]
+
 
-    def filter(doc):
-        return "data-engineering" in doc["filename"]
+def load_repo_index(repo_owner, repo_name):
+    if (repo_owner, repo_name) == ("DataTalksClub", "faq"):
+        return ingest.index_data(repo_owner, repo_name, filter=filter)
+    return ingest.index_data(repo_owner, repo_name)
 
-    index = ingest.index_data(REPO_OWNER, REPO_NAME, filter=filter)
-    print("Data indexing completed successfully!")
-    return index
+
+def initialize_index():
+    return load_repo_index(REPO_OWNER, REPO_NAME)
 
 
 def initialize_agent(index):
-    print("Initializing GitSensei agent...")
-    agent = search_agent.init_agent(index, REPO_OWNER, REPO_NAME)
-    print("Agent initialized successfully!")
-    return agent
+    model = scheduler.ScheduledModel(search_agent.MODEL_NAME)
+    return search_agent.init_agent(index, REPO_OWNER, REPO_NAME, model=model)
+
+
+def initialize_sharded_agent(manager):
+    model = scheduler.ScheduledModel(search_agent.MODEL_NAME)
+    return search_agent.init_sharded_agent(manager, model=model)
+
+
+def load_agent(profile=None):
+    """
+    Index the repository and build the agent. Returns the agent and a
+    function returning its current answer cache scope.
+    """
+    if len(REPOS) > 1:
+        # Shards are indexed on first use, so the scope changes as they load
+        manager = shards.ShardManager(REPOS, loader=load_repo_index)
+        scope = functools.partial(search_agent.answer_scope, REPOS, manager=manager)
+        return initialize_sharded_agent(manager), scope
+    with profiling.profiled("ingest", profile) as ingest_profile:
+        index = initialize_index()
+    report_profile(ingest_profile)
+    return initialize_agent(index), functools.partial(search_agent.answer_scope, REPOS, index)
+
+
+def in_background(func, *args):
+    """
+    Run `func(*args)` on a daemon thread, so that typing "stop" exits
+    without waiting for it. Returns a `Future` of its result.
+    """
+    future = Future()
+
+    def run():
+        try:
+            future.set_result(func(*args))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name="gitsensei-setup", daemon=True).start()
+    return future
+
+
+def answer_question(agent, cache, scope, question, request, profile=None):
+    """
+    Print the answer to `question` and log it with the trace summary of
+    `request`. `scope()` is the current answer cache scope. Returns the
+    answer to cache, or None for a cache hit.
+    `profile=True` profiles the agent run; None samples at
+    `PROFILE_SAMPLE_RATE`.
+    """
+    start = time.perf_counter()
+    cached = cache.get(question, scope())
+    if cached is not None:
+        output, similarity = cached
+        print(f"\nResponse (cached, similarity {similarity:.2f}):\n", output)
+        request.set(cached=True)
+        logs.log_interaction_to_file(
+            agent_name=agent.name,
+            user_prompt=question,
+            agent_response=output,
+            source="cache",
+            latency=time.perf_counter() - start,
+            trace=request.summary(),
+        )
+        return None
+
+    if streaming.STREAM_RESPONSES:
+        print("\nResponse:\n")
+        with profiling.profiled("agent.run", profile) as run_profile:
+            answer = asyncio.run(
+                streaming.stream_answer(
+                    agent, question, on_delta=lambda d: print(d, end="", flush=True)
+                )
+            )
+        print()
+        report_profile(run_profile)
+        logs.log_interaction_to_file(
+            agent,
+            answer.messages,
+            latency=answer.latency,
+            ttft=answer.ttft,
+            trace=request.summary(),
+        )
+        return answer.output
+
+    print("Processing your question...")
+    with profiling.profiled("agent.run", profile) as run_profile:
+        response = asyncio.run(agent.run(user_prompt=question))
+    latency = time.perf_counter() - start
+    report_profile(run_profile)
+    logs.log_interaction_to_file(
+        agent, response.new_messages(), latency=latency, trace=request.summary()
+    )
+    print("\nResponse:\n", response.output)
+    return response.output
+
+
+def report_profile(profile):
+    if profile.saved:
+        print(f"\nProfile of {profile.name} saved to {profile.stats_path}")
 
 
 def main():
-    index = initialize_index()
-    agent = initialize_agent(index)
+    parser = argparse.ArgumentParser(description="GitSensei command-line interface")
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="profile indexing and every question with cProfile and tracemalloc",
+    )
+    args = parser.parse_args()
+    profile = args.profile or None
+
+    print(f"Starting GitSensei for {', '.join(REPOS)}")
+    # The index builds while the first question is typed
+    loading = in_background(load_agent, profile)
+    cache = answer_cache.AnswerCache()
     print("\nReady to answer your questions!")
     print("Type 'stop' to exit the program.\n")
 
@@ -44,11 +169,15 @@ def main():
             print("Goodbye!")
             break
 
-        print("Processing your question...")
-        response = asyncio.run(agent.run(user_prompt=question))
-        logs.log_interaction_to_file(agent, response.new_messages())
+        if not loading.done():
+            print("Waiting for the index to finish building...")
+        agent, scope = loading.result()
 
-        print("\nResponse:\n", response.output)
+        with tracing.span("request", source="cli") as request:
+            output = answer_question(agent, cache, scope, question, request, profile)
+        if output is not None:
+            # Scoped by the shards the answer was built from
+            cache.put(question, output, scope())
         print("\n" + "=" * 50 + "\n")
 
 
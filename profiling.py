@@ -0,0 +1,170 @@
+"""
+On-demand profiling of live requests.
+
+A sampled request runs under cProfile and tracemalloc. Its pstats file and
+a text report (top functions by cumulative time, top allocation sites) are
+saved to `PROFILE_DIRECTORY`, next to the interaction logs by default:
+
+    with profiling.profiled("agent.run") as profile:
+        ...
+    profile.saved  # False when the request was not sampled
+
+Set `PROFILE_SAMPLE_RATE` (0 to 1, default 0) to profile that fraction of
+requests; the CLI's `--profile` flag and the web app's "Profile requests"
+option profile every request. Open a pstats file with
+`python -m pstats <file>` or a viewer such as snakeviz.
+
+Only one profile runs at a time (cProfile allows a single active profiler),
+so a request sampled while another is being profiled runs unprofiled. From
+Python 3.12 on cProfile sees every thread: tool calls run on worker threads
+are included, and so is other work running at the same time.
+"""
+
+import os
+import io
+import time
+import pstats
+import random
+import secrets
+import cProfile
+import threading
+import contextlib
+import tracemalloc
+from pathlib import Path
+from datetime import datetime
+
+import tracing
+
+
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+
+PROFILE_DIRECTORY = Path(
+    os.getenv("PROFILE_DIRECTORY", Path(os.getenv("LOGS_DIRECTORY", "logs")) / "profiles")
+)
+
+# Functions and allocation sites listed in each report
+PROFILE_TOP = int(os.getenv("PROFILE_TOP", "30"))
+
+_active = threading.Lock()
+
+
+def sampled(rate=None):
+    """Whether to profile the next request, with probability `rate`."""
+    rate = PROFILE_SAMPLE_RATE if rate is None else rate
+    return rate > 0 and random.random() < rate
+
+
+class Profile:
+    """
+    Outcome of a `profiled` block: the saved files and what they measured,
+    all None when the block was not profiled.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.stats_path = None
+        self.report_path = None
+        self.seconds = None
+        self.peak_mb = None
+
+    @property
+    def saved(self):
+        return self.stats_path is not None
+
+    def __repr__(self):
+        return f"Profile({self.name!r}, {str(self.stats_path)!r})"
+
+
+def _report(profile, trace_id, profiler, snapshot, top):
+    out = io.StringIO()
+    out.write(
+        f"{profile.name}: {profile.seconds:.3f} s, "
+        f"peak traced memory {profile.peak_mb:.1f} MB\n"
+    )
+    if trace_id:
+        out.write(f"trace_id: {trace_id}\n")
+
+    out.write("\nTop functions by cumulative time\n\n")
+    pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(top)
+
+    out.write("Top allocation sites (memory still allocated at the end)\n\n")
+    for stat in snapshot.statistics("lineno")[:top]:
+        frame = stat.traceback[0]
+        out.write(
+            f"{stat.size / 1024:10.1f} KiB {stat.count:8d} blocks  "
+            f"{frame.filename}:{frame.lineno}\n"
+        )
+    return out.getvalue()
+
+
+@contextlib.contextmanager
+def profiled(name, enabled=None, directory=None, top=PROFILE_TOP):
+    """
+    Profile the block when `enabled` (default: sampled at
+    `PROFILE_SAMPLE_RATE`). Yields a `Profile` that is filled in when the
+    block ends. The files are named after the current trace, and the
+    current span gets a "profile" attribute with the pstats path.
+    """
+    profile = Profile(name)
+    if enabled is None:
+        enabled = sampled()
+    if not enabled or not _active.acquire(blocking=False):
+        yield profile
+        return
+
+    try:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler (a debugger, coverage) is active
+            yield profile
+            return
+
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield profile
+        finally:
+            profiler.disable()
+            profile.seconds = time.perf_counter() - start
+            profile.peak_mb = tracemalloc.get_traced_memory()[1] / 2**20
+            snapshot = tracemalloc.take_snapshot().filter_traces(
+                [
+                    tracemalloc.Filter(False, tracemalloc.__file__),
+                    tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+                ]
+            )
+            if started_tracing:
+                tracemalloc.stop()
+            _save(profile, profiler, snapshot, directory, top)
+    finally:
+        _active.release()
+
+
+def _save(profile, profiler, snapshot, directory, top):
+    directory = Path(directory or PROFILE_DIRECTORY)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    span = tracing.current_span()
+    trace_id = span.trace.trace_id if span is not None else None
+    ts_str = datetime.now().strftime("%Y%m%d_%H%M%S")
+    base = f"{profile.name}_{ts_str}_{trace_id or secrets.token_hex(8)}"
+
+    profile.stats_path = directory / f"{base}.pstats"
+    profile.report_path = directory / f"{base}.txt"
+    profiler.dump_stats(profile.stats_path)
+    report = _report(profile, trace_id, profiler, snapshot, top)
+    profile.report_path.write_text(report, encoding="utf-8")
+    if span is not None:
+        span.set(profile=str(profile.stats_path))
+
+
+async def profile_coro(coro, name="agent.run", enabled=None):
+    """Await `coro` inside `profiled(name, enabled)`, e.g. on a background loop."""
+    with profiled(name, enabled):
+        return await coro
+
@@ -0,0 +1,342 @@
+"""
+Quota-aware scheduling of model requests.
+
+`ScheduledModel` wraps the agent's model so that every request, including
+each step of a run with tool calls, first gets a slot from a `Scheduler`.
+The scheduler enforces a requests-per-minute and a tokens-per-minute
+budget with token buckets. Requests beyond the budget are queued by
+priority: interactive questions go before batch work such as evaluation
+runs. A 429 / RESOURCE_EXHAUSTED response pauses all requests for a
+jittered, exponentially growing delay (or the delay the API asks for) and
+the request is retried.
+
+    with scheduler.request_priority(scheduler.BATCH):
+        await agent.run(question)
+"""
+
+import os
+import re
+import time
+import heapq
+import random
+import asyncio
+import itertools
+import threading
+import contextlib
+import contextvars
+from collections import deque
+from contextlib import asynccontextmanager
+
+from pydantic_ai.exceptions import ModelHTTPError
+from pydantic_ai.models.wrapper import WrapperModel
+
+import tracing
+
+
+# Gemini 2.0 Flash free tier limits; 0 disables a limit
+MODEL_RPM = float(os.getenv("MODEL_RPM", "15"))
+
+MODEL_TPM = float(os.getenv("MODEL_TPM", "1000000"))
+
+MODEL_MAX_RETRIES = int(os.getenv("MODEL_MAX_RETRIES", "5"))
+
+MODEL_BACKOFF_BASE = float(os.getenv("MODEL_BACKOFF_BASE_SECONDS", "2"))
+
+MODEL_BACKOFF_MAX = float(os.getenv("MODEL_BACKOFF_MAX_SECONDS", "60"))
+
+INTERACTIVE = 0
+BATCH = 10
+
+_priority = contextvars.ContextVar("request_priority", default=INTERACTIVE)
+
+
+@contextlib.contextmanager
+def request_priority(priority):
+    """Run model requests made inside the block at `priority` (lower first)."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def is_rate_limit(error):
+    """Whether `error` is a 429 / RESOURCE_EXHAUSTED response."""
+    if isinstance(error, ModelHTTPError):
+        return error.status_code == 429
+    if getattr(error, "code", None) == 429:
+        return True
+    message = str(error)
+    return "429" in message and "RESOURCE_EXHAUSTED" in message
+
+
+def retry_after(error):
+    """Seconds the API asked to wait (Gemini's "retryDelay"), or None."""
+    match = re.search(r"retryDelay['\"]?\s*[:=]\s*['\"]?(\d+(?:\.\d+)?)s", str(error))
+    return float(match.group(1)) if match else None
+
+
+class TokenBucket:
+    """
+    Holds up to `burst` units (default: one minute's worth) and refills at
+    `per_minute` units per minute. A `per_minute` of 0 means no limit.
+    """
+
+    def __init__(self, per_minute, burst=None, clock=time.monotonic):
+        self.rate = per_minute / 60
+        self.capacity = burst if burst is not None else per_minute
+        self.level = self.capacity
+        self.clock = clock
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        """Seconds until `amount` units (at most `capacity`) are available."""
+        if self.rate <= 0:
+            return 0.0
+        self._refill()
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing / self.rate)
+
+    def take(self, amount):
+        """Use `amount` units; a negative level is paid back before new work."""
+        if self.rate > 0:
+            self._refill()
+            self.level -= amount
+
+
+class Scheduler:
+    """
+    Priority queue of model requests in front of RPM and TPM token buckets.
+
+    All requests must be made from the same event loop at a time; `stats`
+    may be called from any thread.
+
+    Args:
+        rpm (float): Requests per minute; 0 for no limit.
+        tpm (float): Input plus output tokens per minute; 0 for no limit.
+        burst (int, optional): Requests allowed at once; defaults to `rpm`.
+        max_retries (int): Retries of a request after 429 responses.
+        backoff_base (float): Seconds of the first backoff, doubled on each
+            further retry up to `backoff_max`, with jitter.
+    """
+
+    def __init__(
+        self,
+        rpm=MODEL_RPM,
+        tpm=MODEL_TPM,
+        burst=None,
+        max_retries=MODEL_MAX_RETRIES,
+        backoff_base=MODEL_BACKOFF_BASE,
+        backoff_max=MODEL_BACKOFF_MAX,
+        clock=time.monotonic,
+    ):
+        self.requests = TokenBucket(rpm, burst, clock)
+        self.tokens = TokenBucket(tpm, clock=clock)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.clock = clock
+        self.paused_until = 0.0
+        self._queue = []
+        self._seq = itertools.count()
+        self._timer = None
+        self._waits = deque(maxlen=1000)
+        self._stats_lock = threading.Lock()
+        self.dispatched = 0
+        self.rate_limited = 0
+        self.retries = 0
+
+    async def acquire(self, tokens=0, priority=None):
+        """
+        Wait for a request slot with `tokens` estimated tokens. Returns the
+        seconds spent waiting.
+        """
+        if priority is None:
+            priority = _priority.get()
+        future = asyncio.get_running_loop().create_future()
+        entry = [priority, next(self._seq), tokens, future, self.clock()]
+        heapq.heappush(self._queue, entry)
+        self._dispatch()
+        try:
+            return await future
+        except asyncio.CancelledError:
+            # Left in the heap; _dispatch drops entries whose future is done
+            future.cancel()
+            self._dispatch()
+            raise
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        while self._queue:
+            priority, _, tokens, future, enqueued = self._queue[0]
+            if future.done():
+                heapq.heappop(self._queue)
+                continue
+
+            wait = max(
+                self.requests.wait_time(1),
+                self.tokens.wait_time(tokens),
+                self.paused_until - self.clock(),
+            )
+            if wait > 0:
+                self._timer = future.get_loop().call_later(wait, self._dispatch)
+                return
+
+            heapq.heappop(self._queue)
+            self.requests.take(1)
+            self.tokens.take(tokens)
+            waited = self.clock() - enqueued
+            with self._stats_lock:
+                self._waits.append(waited)
+            self.dispatched += 1
+            future.set_result(waited)
+
+    def record_usage(self, estimated, actual):
+        """Charge the difference between the estimated and actual tokens."""
+        if actual is not None:
+            self.tokens.take(actual - estimated)
+
+    def backoff(self, attempt, error=None):
+        """
+        Pause all requests after a 429 on retry `attempt` (0-based) and
+        return the delay: the API's retry delay if given, otherwise
+        `backoff_base * 2**attempt` (capped) with up to 50% jitter.
+        """
+        delay = retry_after(error) if error is not None else None
+        if delay is None:
+            delay = min(self.backoff_max, self.backoff_base * 2**attempt)
+            delay = delay / 2 + random.uniform(0, delay / 2)
+        self.paused_until = max(self.paused_until, self.clock() + delay)
+        self.rate_limited += 1
+        return delay
+
+    def queued(self):
+        return sum(1 for entry in self._queue if not entry[3].done())
+
+    def stats(self):
+        with self._stats_lock:
+            waits = sorted(self._waits)
+
+        def percentile(q):
+            return waits[min(len(waits) - 1, int(q * len(waits)))] if waits else 0.0
+
+        return {
+            "queued": self.queued(),
+            "dispatched": self.dispatched,
+            "rate_limited": self.rate_limited,
+            "retries": self.retries,
+            "wait_p50_s": percentile(0.5),
+            "wait_p95_s": percentile(0.95),
+            "wait_max_s": waits[-1] if waits else 0.0,
+            "paused_for_s": max(0.0, self.paused_until - self.clock()),
+        }
+
+
+def estimate_tokens(messages):
+    """Rough input size of `messages`: about four characters per token."""
+    chars = 0
+    for message in messages:
+        for part in getattr(message, "parts", []):
+            content = getattr(part, "content", None)
+            if content is None:
+                content = getattr(part, "args", None)
+            chars += len(str(content)) if content is not None else 0
+    return chars // 4 + 1
+
+
+def _used_tokens(usage):
+    if usage is None:
+        return None
+    return (usage.input_tokens or 0) + (usage.output_tokens or 0)
+
+
+class ScheduledModel(WrapperModel):
+    """Model whose requests go through a `Scheduler`, with retries on 429."""
+
+    def __init__(self, wrapped, scheduler=None):
+        super().__init__(wrapped)
+        self.scheduler = scheduler or shared_scheduler()
+
+    def _retry_rate_limited(self, attempt, error):
+        if not is_rate_limit(error) or attempt >= self.scheduler.max_retries:
+            return False
+        self.scheduler.backoff(attempt, error)
+        self.scheduler.retries += 1
+        return True
+
+    async def request(self, messages, *args, **kwargs):
+        estimated = estimate_tokens(messages)
+        with tracing.span(
+            tracing.MODEL_SPAN, model=self.model_name, estimated_tokens=estimated
+        ) as span:
+            waited = 0.0
+            for attempt in itertools.count():
+                waited += await self.scheduler.acquire(estimated)
+                span.set(queue_wait_s=waited, retries=attempt)
+                try:
+                    response = await self.wrapped.request(messages, *args, **kwargs)
+                except Exception as e:
+                    if self._retry_rate_limited(attempt, e):
+                        continue
+                    raise
+                used = _used_tokens(response.usage)
+                self.scheduler.record_usage(estimated, used)
+                if used is not None:
+                    span.set(tokens=used)
+                return response
+
+    @asynccontextmanager
+    async def request_stream(self, messages, *args, **kwargs):
+        estimated = estimate_tokens(messages)
+        # Not made current: the caller's code runs inside this context manager
+        span = tracing.start_span(
+            tracing.MODEL_SPAN, model=self.model_name, estimated_tokens=estimated, stream=True
+        )
+        error = None
+        try:
+            async with contextlib.AsyncExitStack() as stack:
+                # Only opening the stream is retried; a 429 arrives before any chunk
+                waited = 0.0
+                for attempt in itertools.count():
+                    waited += await self.scheduler.acquire(estimated)
+                    span.set(queue_wait_s=waited, retries=attempt)
+                    try:
+                        stream = await stack.enter_async_context(
+                            self.wrapped.request_stream(messages, *args, **kwargs)
+                        )
+                    except Exception as e:
+                        if self._retry_rate_limited(attempt, e):
+                            continue
+                        raise
+                    break
+                yield stream
+                used = _used_tokens(stream.usage())
+                self.scheduler.record_usage(estimated, used)
+                if used is not None:
+                    span.set(tokens=used)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            span.end(error=error)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def shared_scheduler():
+    """The process-wide `Scheduler`, configured from the environment."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = Scheduler()
+        return _scheduler
@@ -1,11 +1,19 @@
+import os
+
+import answer_cache
 import search_tools
+import shards
 from pydantic_ai import Agent
 
 
+MODEL_NAME = "gemini-2.0-flash"
+
+
 SYSTEM_PROMPT_TEMPLATE = """
 You are GitSensei, a helpful AI assistant that answers questions about GitHub repositories and documentation.
 
 Use the search tool to find relevant information from the repository materials before answering questions.
+When a question needs several searches, pass all the queries to search_many in a single call.
 
 If you can find specific information through search, use it to provide accurate answers.
 
@@ -17,19 +25,90 @@ Format: [LINK TITLE](FULL_GITHUB_LINK)
 If the search doesn't return relevant results, let the user know and provide general guidance about GitHub repositories and development practices.
 """
 
+MULTI_REPO_PROMPT_TEMPLATE = """
+You are GitSensei, a helpful AI assistant that answers questions about GitHub repositories and documentation.
 
-def init_agent(index, repo_owner, repo_name):
-    system_prompt = SYSTEM_PROMPT_TEMPLATE.format(
-        repo_owner=repo_owner, repo_name=repo_name
-    )
+You can search these repositories: {repos}.
+Use the search tool to find relevant information before answering questions. Pass `repo` when the
+question is about one repository; leave it out to search all of them.
+When a question needs several searches, pass all the queries to search_many in a single call.
+
+Always include references by citing the filename of the source material you used.
+Every search result has a "repo" field; link to it as
+"https://github.com/{{repo}}/blob/main/{{filename}}"
+Format: [LINK TITLE](FULL_GITHUB_LINK)
+
+If the search doesn't return relevant results, let the user know and provide general guidance about GitHub repositories and development practices.
+"""
+
+
+def google_model(http_client, model_name=MODEL_NAME):
+    """
+    Gemini model whose API calls go through `http_client`.
+
+    The client is reused by every run, so its connection pool is only
+    useful if all runs happen on the loop the client belongs to.
+    """
+    from google.genai import Client
+    from pydantic_ai.models.google import GoogleModel
+    from pydantic_ai.providers.google import GoogleProvider
+
+    api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
+    client = Client(api_key=api_key, http_options={"httpx_async_client": http_client})
+    return GoogleModel(model_name, provider=GoogleProvider(client=client))
+
+
+def system_prompt_for(repo_owner, repo_name):
+    return SYSTEM_PROMPT_TEMPLATE.format(repo_owner=repo_owner, repo_name=repo_name)
+
+
+def multi_repo_prompt_for(repos):
+    return MULTI_REPO_PROMPT_TEMPLATE.format(repos=", ".join(repos))
+
+
+def init_agent(index, repo_owner, repo_name, model=None):
+    system_prompt = system_prompt_for(repo_owner, repo_name)
 
     search_tool = search_tools.SearchTool(index=index)
 
     agent = Agent(
         name="gitsensei_agent",
         instructions=system_prompt,
-        tools=[search_tool.search],
-        model="gemini-2.0-flash",
+        tools=[search_tool.search, search_tool.search_many],
+        model=model or MODEL_NAME,
+    )
+
+    return agent
+
+
+def init_sharded_agent(manager, model=None):
+    """Agent answering questions about every repository of a `ShardManager`."""
+    system_prompt = multi_repo_prompt_for(manager.repos)
+
+    search_tool = shards.ShardedSearchTool(manager)
+
+    agent = Agent(
+        name="gitsensei_agent",
+        instructions=system_prompt,
+        tools=[search_tool.search, search_tool.search_many],
+        model=model or MODEL_NAME,
     )
 
     return agent
+
+
+def answer_scope(repos, index=None, manager=None):
+    """
+    `answer_cache` scope of the agent built for `repos`: by `init_agent`
+    over `index`, or by `init_sharded_agent` over `manager` when `index`
+    is None. The sharded scope covers the versions of the shards loaded
+    right now, so compute it per request: a shard reloaded at a new
+    commit gets a new scope.
+    """
+    if index is None:
+        prompt = multi_repo_prompt_for(repos)
+        versions = sorted(manager.versions().items())
+        return answer_cache.scope_key(prompt, versions, MODEL_NAME)
+    repo_owner, repo_name = repos[0].split("/")
+    prompt = system_prompt_for(repo_owner, repo_name)
+    return answer_cache.scope_key(prompt, answer_cache.corpus_fingerprint(index), MODEL_NAME)
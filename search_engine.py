@@ -0,0 +1,309 @@
+"""
+Sparse TF-IDF search engine with the `minsearch.Index` interface.
+
+Each text field is stored as an inverted index: a term x document CSR
+matrix whose rows are the postings of one term, holding the document's
+L2-normalized TF-IDF weight. Scoring a query touches only the postings of
+its terms, and top-k selection uses `argpartition` over the matched
+documents, so query cost grows with the postings touched rather than with
+the number of documents. Scores match `minsearch.Index` (scikit-learn
+`TfidfVectorizer` defaults and cosine similarity).
+"""
+
+import re
+from collections import Counter
+
+import numpy as np
+
+from lazy_import import lazy_import
+
+sparse = lazy_import("scipy.sparse")
+
+
+TOKEN_PATTERN = re.compile(r"(?u)\b\w\w+\b")
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def top_k_rows(scores, k):
+    """
+    Ids of the best `k` positive entries of each row of a sparse score
+    matrix, best first; ties go to the lower id.
+    """
+    scores = sparse.csr_matrix(scores)
+    results = []
+    for row in range(scores.shape[0]):
+        start, end = scores.indptr[row], scores.indptr[row + 1]
+        doc_ids = scores.indices[start:end]
+        row_scores = scores.data[start:end]
+        positive = row_scores > 0
+        doc_ids, row_scores = doc_ids[positive], row_scores[positive]
+
+        if len(row_scores) > k:
+            top = np.argpartition(-row_scores, k - 1)[:k]
+            doc_ids, row_scores = doc_ids[top], row_scores[top]
+
+        results.append(doc_ids[np.lexsort((doc_ids, -row_scores))])
+    return results
+
+
+class FieldIndex:
+    """Inverted index for one text field."""
+
+    def __init__(self):
+        self.vocabulary = {}
+        self.idf = np.zeros(0)
+        self.postings = sparse.csr_matrix((0, 0))
+
+    def fit(self, texts):
+        vocabulary = {}
+        doc_terms = self._count(texts, vocabulary, grow=True)
+
+        num_docs = doc_terms.shape[0]
+        df = np.bincount(doc_terms.indices, minlength=len(vocabulary))
+        self.vocabulary = vocabulary
+        self.idf = np.log((1 + num_docs) / (1 + df)) + 1
+        self.postings = self._weigh(doc_terms).T.tocsr()
+
+    def patch(self, keep, texts):
+        """
+        Keep the documents at positions `keep` and append `texts`.
+
+        New texts are weighted with the fitted vocabulary and IDF; terms
+        they introduce are ignored until the next `fit`.
+        """
+        doc_terms = self.postings.T.tocsr()[keep]
+        added = self.transform(texts)
+        self.postings = sparse.vstack([doc_terms, added], format="csr").T.tocsr()
+
+    def transform(self, texts):
+        """Document x term weights for `texts` using the fitted vocabulary."""
+        return self._weigh(self._count(texts, self.vocabulary, grow=False))
+
+    def _count(self, texts, vocabulary, grow):
+        indptr = [0]
+        indices = []
+        counts = []
+
+        for text in texts:
+            for token, count in Counter(tokenize(text)).items():
+                term = vocabulary.get(token)
+                if term is None:
+                    if not grow:
+                        continue
+                    term = vocabulary[token] = len(vocabulary)
+                indices.append(term)
+                counts.append(count)
+            indptr.append(len(indices))
+
+        return sparse.csr_matrix(
+            (
+                np.asarray(counts, dtype=np.float64),
+                np.asarray(indices, dtype=np.int32),
+                np.asarray(indptr, dtype=np.int64),
+            ),
+            shape=(len(indptr) - 1, len(vocabulary)),
+        )
+
+    def _weigh(self, doc_terms):
+        weights = doc_terms.multiply(self.idf).tocsr()
+        norms = np.sqrt(np.asarray(weights.multiply(weights).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        return (sparse.diags(1 / norms) @ weights).tocsr()
+
+    def query_vector(self, query):
+        """Term ids and L2-normalized weights of a query."""
+        counts = Counter(
+            self.vocabulary[token]
+            for token in tokenize(query)
+            if token in self.vocabulary
+        )
+        if not counts:
+            return None, None
+
+        terms = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        weights = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+        weights *= self.idf[terms]
+        weights /= np.linalg.norm(weights)
+        return terms, weights
+
+    def query_matrix(self, queries):
+        """Queries x terms matrix of L2-normalized query weights."""
+        indptr = [0]
+        indices = []
+        data = []
+        for query in queries:
+            terms, weights = self.query_vector(query)
+            if terms is not None:
+                indices.append(terms)
+                data.append(weights)
+                indptr.append(indptr[-1] + len(terms))
+            else:
+                indptr.append(indptr[-1])
+
+        return sparse.csr_matrix(
+            (
+                np.concatenate(data) if data else np.zeros(0),
+                np.concatenate(indices) if indices else np.zeros(0, dtype=np.int64),
+                np.asarray(indptr, dtype=np.int64),
+            ),
+            shape=(len(indptr) - 1, len(self.vocabulary)),
+        )
+
+    def gather(self, terms, weights):
+        """Document ids and partial scores from the postings of `terms`."""
+        indptr = self.postings.indptr
+        starts = indptr[terms]
+        lengths = indptr[terms + 1] - starts
+        total = int(lengths.sum())
+        if total == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        positions = np.arange(total) + offsets
+        doc_ids = self.postings.indices[positions]
+        scores = self.postings.data[positions] * np.repeat(weights, lengths)
+        return doc_ids, scores
+
+
+class SearchIndex:
+    """
+    Drop-in replacement for `minsearch.Index` backed by sparse postings.
+
+    Args:
+        text_fields (list): Text fields to index.
+        keyword_fields (list, optional): Fields for exact-match filters.
+        boosts (dict, optional): Default per-field boosts, overridden by
+            `boost_dict` in `search`.
+    """
+
+    def __init__(self, text_fields, keyword_fields=None, boosts=None):
+        self.text_fields = text_fields
+        self.keyword_fields = keyword_fields or []
+        self.boosts = boosts or {}
+        self.fields = {field: FieldIndex() for field in text_fields}
+        self.keywords = {}
+        self.docs = []
+        self.version = 0
+
+    def fit(self, docs):
+        self.docs = docs
+        for field, field_index in self.fields.items():
+            field_index.fit(doc.get(field, "") or "" for doc in docs)
+        self.keywords = {
+            field: np.array([doc.get(field) for doc in docs], dtype=object)
+            for field in self.keyword_fields
+        }
+        self.version += 1
+        return self
+
+    def patch(self, keep, new_docs, docs):
+        """
+        Keep the rows at positions `keep`, append `new_docs` and take `docs`
+        (the kept documents followed by `new_docs`) as the document list.
+        """
+        keep = np.asarray(keep, dtype=np.int64)
+        for field, field_index in self.fields.items():
+            field_index.patch(keep, (doc.get(field, "") or "" for doc in new_docs))
+        for field, values in self.keywords.items():
+            added = np.array([doc.get(field) for doc in new_docs], dtype=object)
+            self.keywords[field] = np.concatenate([values[keep], added])
+        self.docs = docs
+        self.version += 1
+        return self
+
+    def score(self, query, filter_dict=None, boost_dict=None):
+        """
+        Score every document that shares a term with the query.
+
+        Returns (doc_ids, scores) for the matched documents only.
+        """
+        boost_dict = {**self.boosts, **(boost_dict or {})}
+
+        doc_parts = []
+        score_parts = []
+        for field, field_index in self.fields.items():
+            boost = boost_dict.get(field, 1)
+            if boost == 0:
+                continue
+            terms, weights = field_index.query_vector(query)
+            if terms is None:
+                continue
+            doc_ids, scores = field_index.gather(terms, weights * boost)
+            doc_parts.append(doc_ids)
+            score_parts.append(scores)
+
+        if not doc_parts:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+
+        doc_ids, inverse = np.unique(np.concatenate(doc_parts), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(score_parts))
+
+        if filter_dict:
+            mask = self._filter_mask(doc_ids, filter_dict)
+            doc_ids, scores = doc_ids[mask], scores[mask]
+
+        positive = scores > 0
+        return doc_ids[positive], scores[positive]
+
+    def score_matrix(self, queries, filter_dict=None, boost_dict=None):
+        """
+        Scores of a batch of queries as a sparse (queries x documents)
+        matrix, from one sparse product per field.
+        """
+        boost_dict = {**self.boosts, **(boost_dict or {})}
+
+        scores = sparse.csr_matrix((len(queries), len(self.docs)))
+        for field, field_index in self.fields.items():
+            boost = boost_dict.get(field, 1)
+            if boost == 0:
+                continue
+            scores = scores + (field_index.query_matrix(queries) @ field_index.postings) * boost
+
+        if filter_dict:
+            mask = self._filter_mask(np.arange(len(self.docs)), filter_dict)
+            scores = scores @ sparse.diags(mask.astype(np.float64))
+
+        return sparse.csr_matrix(scores)
+
+    def _filter_mask(self, doc_ids, filter_dict):
+        mask = np.ones(len(doc_ids), dtype=bool)
+        for field, value in filter_dict.items():
+            if field not in self.keywords:
+                continue
+            values = self.keywords[field][doc_ids]
+            if isinstance(value, (list, tuple, set)):
+                mask &= np.isin(values, list(value))
+            else:
+                mask &= values == value
+        return mask
+
+    def top_k(self, query, num_results=10, filter_dict=None, boost_dict=None):
+        """Ids and scores of the best `num_results` documents, best first."""
+        doc_ids, scores = self.score(query, filter_dict, boost_dict)
+
+        if len(scores) > num_results:
+            top = np.argpartition(-scores, num_results - 1)[:num_results]
+            doc_ids, scores = doc_ids[top], scores[top]
+
+        order = np.lexsort((doc_ids, -scores))
+        return doc_ids[order], scores[order]
+
+    def search(
+        self, query, filter_dict=None, boost_dict=None, num_results=10, output_ids=False
+    ):
+        doc_ids, _ = self.top_k(query, num_results, filter_dict, boost_dict)
+
+        if output_ids:
+            return [{**self.docs[i], "_id": int(i)} for i in doc_ids]
+        return [self.docs[i] for i in doc_ids]
+
+    def search_many(self, queries, filter_dict=None, boost_dict=None, num_results=10):
+        """`search` for a batch of queries, scored in one pass per field."""
+        scores = self.score_matrix(queries, filter_dict, boost_dict)
+        return [
+            [self.docs[i] for i in doc_ids]
+            for doc_ids in top_k_rows(scores, num_results)
+        ]
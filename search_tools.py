@@ -1,9 +1,417 @@
+import os
+import time
+import weakref
+import itertools
+import threading
+from collections import OrderedDict
 from typing import List, Any
 
+import numpy as np
+
+from lazy_import import lazy_import
+
+sparse = lazy_import("scipy.sparse")
+
+import tracing
+from search_engine import TOKEN_PATTERN, tokenize, top_k_rows
+
+
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "1024"))
+
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "3600"))
+
+# Characters of each search result sent to the model (about four per
+# token); 0 sends whole chunks
+SNIPPET_CHARS = int(
+    os.getenv("SEARCH_SNIPPET_CHARS")
+    or 4 * int(os.getenv("SEARCH_SNIPPET_TOKENS", "375"))
+)
+
+# Merge overlapping chunks of the same file into one result
+MERGE_OVERLAPS = os.getenv("SEARCH_MERGE_OVERLAPS", "true").lower() in ("1", "true", "yes")
+
+
+def text_score_matrix(index, queries, filter_dict=None, boost_dict=None):
+    """
+    Lexical scores of a batch of queries against a text index, as a sparse
+    (queries x documents) matrix computed with one product per field.
+
+    Works for both `minsearch.Index` and `search_engine.SearchIndex`;
+    documents removed by `filter_dict` score 0.
+    """
+    if hasattr(index, "score_matrix"):
+        return index.score_matrix(queries, filter_dict, boost_dict)
+
+    scores = sparse.csr_matrix((len(queries), len(index.docs)))
+    if not index.docs:
+        return scores
+
+    boost_dict = boost_dict or {}
+    for field in index.text_fields:
+        boost = boost_dict.get(field, 1)
+        if boost == 0:
+            continue
+        query_vecs = index.vectorizers[field].transform(queries)
+        # TF-IDF rows are L2-normalized, so the dot product is the cosine
+        scores = scores + (query_vecs @ index.text_matrices[field].T) * boost
+
+    if filter_dict:
+        scores = scores @ sparse.diags(index._filter.apply(filter_dict))
+    return sparse.csr_matrix(scores)
+
+
+def batch_search(index, queries, num_results=10):
+    """`index.search` results for each query, scored as one batch."""
+    if hasattr(index, "search_many"):
+        return index.search_many(queries, num_results=num_results)
+
+    scores = text_score_matrix(index, queries)
+    return [
+        [index.docs[i] for i in doc_ids]
+        for doc_ids in top_k_rows(scores, num_results)
+    ]
+
+
+def scored_batch_search(index, queries, num_results=10):
+    """Like `batch_search`, but each result is a (score, doc) pair."""
+    if isinstance(index, HybridIndex):
+        scores = index.scores_many(queries) if index.docs else [[] for _ in queries]
+        return [
+            [(float(row[i]), index.docs[i]) for i in index._top(row, num_results)]
+            for row in np.asarray(scores)
+        ]
+
+    scores = text_score_matrix(index, queries)
+    return [
+        [(float(scores[row, i]), index.docs[i]) for i in doc_ids]
+        for row, doc_ids in enumerate(top_k_rows(scores, num_results))
+    ]
+
+
+def merge_results(per_query, num_results):
+    """
+    Merge result lists of several queries: the best remaining result of
+    each query in turn, skipping duplicates.
+    """
+    merged = []
+    seen = set()
+    for rank in range(num_results):
+        for results in per_query:
+            if rank >= len(results):
+                continue
+            result = results[rank]
+            key = (
+                result.get("repo"),
+                result.get("filename"),
+                result.get("start"),
+                result.get("content"),
+            )
+            if key not in seen:
+                seen.add(key)
+                merged.append(dict(result))
+    return merged
+
+
+def _span(result):
+    return result["start"], result["start"] + len(result["content"])
+
+
+def _join(first, second):
+    """`first` with its content extended to cover `second` as well."""
+    (a_start, a_end), (b_start, b_end) = _span(first), _span(second)
+    if b_start < a_start:
+        head, tail = second["content"], first["content"][b_end - a_start:]
+    else:
+        head, tail = first["content"], second["content"][a_end - b_start:]
+    return {**first, "start": min(a_start, b_start), "content": head + tail}
+
+
+def merge_overlapping(results):
+    """
+    Merge results that are overlapping or adjacent chunks of the same file
+    (e.g. sliding windows) into one result at the rank of the best of them.
+    Results without a "start" offset are kept as they are.
+    """
+    merged = []
+    by_file = {}
+    for result in results:
+        result = dict(result)
+        if result.get("start") is None or result.get("content") is None:
+            merged.append(result)
+            continue
+
+        start, end = _span(result)
+        positions = by_file.setdefault((result.get("repo"), result.get("filename")), [])
+        touching = [
+            pos for pos in positions
+            if _span(merged[pos])[0] <= end and start <= _span(merged[pos])[1]
+        ]
+        if not touching:
+            positions.append(len(merged))
+            merged.append(result)
+            continue
+
+        # The new chunk may bridge several earlier ones
+        target = touching[0]
+        for pos in touching[1:]:
+            merged[target] = _join(merged[target], merged[pos])
+            merged[pos] = None
+            positions.remove(pos)
+        merged[target] = _join(merged[target], result)
+    return [result for result in merged if result is not None]
+
+
+def query_snippet(content, query, max_chars=SNIPPET_CHARS):
+    """
+    Offset and text of the part of `content`, at most `max_chars` long
+    plus "…" markers, holding the most occurrences of the query terms.
+    Cuts fall on whitespace where possible.
+    """
+    if max_chars <= 0 or len(content) <= max_chars:
+        return 0, content
+
+    terms = set(tokenize(query))
+    hits = [
+        (match.start(), match.end())
+        for match in TOKEN_PATTERN.finditer(content)
+        if match.group().lower() in terms
+    ]
+
+    # Densest run of hits that fits, centred in the window
+    start = 0
+    best, last = 0, 0
+    for first in range(len(hits)):
+        last = max(last, first)
+        while last + 1 < len(hits) and hits[last + 1][1] - hits[first][0] <= max_chars:
+            last += 1
+        if last - first + 1 > best:
+            best = last - first + 1
+            slack = max_chars - (hits[last][1] - hits[first][0])
+            start = hits[first][0] - slack // 2
+    start = min(max(start, 0), len(content) - max_chars)
+    end = start + max_chars
+
+    if start > 0:
+        space = content.find(" ", start, start + max_chars // 10)
+        newline = content.find("\n", start, start + max_chars // 5)
+        cut = newline if newline != -1 else space
+        start = cut + 1 if cut != -1 else start
+    if end < len(content):
+        space = content.rfind(" ", end - max_chars // 10, end)
+        newline = content.rfind("\n", end - max_chars // 5, end)
+        cut = newline if newline != -1 else space
+        end = cut if cut > start else end
+
+    snippet = content[start:end].strip()
+    offset = content.find(snippet, start)
+    prefix = "…" if offset > 0 else ""
+    suffix = "…" if offset + len(snippet) < len(content) else ""
+    return offset, prefix + snippet + suffix
+
+
+def compact_results(results, query, max_chars=SNIPPET_CHARS, merge=MERGE_OVERLAPS):
+    """
+    Search results as sent to the model: overlapping chunks of a file
+    merged, and each result trimmed to a snippet around the query terms.
+    "start" is moved to where the snippet begins.
+    """
+    results = merge_overlapping(results) if merge else [dict(r) for r in results]
+    for result in results:
+        content = result.get("content")
+        if not isinstance(content, str):
+            continue
+        offset, result["content"] = query_snippet(content, query, max_chars)
+        if offset and result.get("start") is not None:
+            result["start"] += offset
+    return results
+
+
+def filter_mask(index, filter_dict):
+    """Boolean mask of the documents of a text index that pass `filter_dict`."""
+    if not filter_dict:
+        return np.ones(len(index.docs), dtype=bool)
+    if hasattr(index, "_filter_mask"):
+        return index._filter_mask(np.arange(len(index.docs)), filter_dict)
+    return index._filter.apply(filter_dict) > 0
+
+
+class HybridIndex:
+    """
+    Text index combined with dense embeddings of the same documents.
+
+    A document scores `alpha * cosine(query, doc)` plus `(1 - alpha)` times
+    its lexical score divided by the best lexical score for the query, so
+    both parts are on the same scale.
+
+    Args:
+        text_index: Unfitted `minsearch.Index` or `search_engine.SearchIndex`.
+        vectors (embeddings.VectorIndex): Dense vectors for the documents.
+        alpha (float): Weight of the dense similarity, between 0 and 1.
+    """
+
+    def __init__(self, text_index, vectors, alpha=0.5):
+        self.text_index = text_index
+        self.vectors = vectors
+        self.alpha = alpha
+        self.version = 0
+
+    @property
+    def docs(self):
+        return self.text_index.docs
+
+    def fit(self, docs):
+        self.text_index.fit(docs)
+        self.vectors.update(self.text_index.docs)
+        self.version += 1
+        return self
+
+    def scores(self, query, filter_dict=None, boost_dict=None):
+        """Blended score of every document; filtered-out documents get -inf."""
+        return self.scores_many([query], filter_dict, boost_dict)[0]
+
+    def scores_many(self, queries, filter_dict=None, boost_dict=None):
+        """Blended (queries x documents) scores for a batch of queries."""
+        lexical = text_score_matrix(self.text_index, queries, filter_dict, boost_dict)
+        lexical = lexical.toarray()
+        best = lexical.max(axis=1, keepdims=True) if lexical.size else 0
+        lexical /= np.where(best > 0, best, 1)
+
+        scores = self.alpha * self.vectors.score_many(queries) + (1 - self.alpha) * lexical
+        if filter_dict:
+            scores[:, ~filter_mask(self.text_index, filter_dict)] = -np.inf
+        return scores
+
+    def _top(self, scores, num_results):
+        if len(scores) > num_results:
+            top = np.argpartition(-scores, num_results - 1)[:num_results]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.isfinite(scores[top])]
+        return top[np.lexsort((top, -scores[top]))]
+
+    def search(
+        self, query, filter_dict=None, boost_dict=None, num_results=10, output_ids=False
+    ):
+        if not self.docs:
+            return []
+
+        top = self._top(self.scores(query, filter_dict, boost_dict), num_results)
+
+        if output_ids:
+            return [{**self.docs[i], "_id": int(i)} for i in top]
+        return [self.docs[i] for i in top]
+
+    def search_many(self, queries, filter_dict=None, boost_dict=None, num_results=10):
+        """`search` for a batch of queries, embedded and scored together."""
+        if not self.docs:
+            return [[] for _ in queries]
+
+        scores = self.scores_many(queries, filter_dict, boost_dict)
+        return [[self.docs[i] for i in self._top(row, num_results)] for row in scores]
+
+
+def normalize_query(query, keep_order=False):
+    """
+    Cache key form of a query: lowercased index tokens, sorted unless
+    `keep_order` (TF-IDF scores do not depend on word order).
+    """
+    tokens = tokenize(query)
+    if not keep_order:
+        tokens.sort()
+    return " ".join(tokens)
+
+
+class QueryCache:
+    """
+    Thread-safe LRU cache of search results whose entries expire after
+    `ttl` seconds. A `max_size` of 0 disables caching.
+    """
+
+    def __init__(self, max_size=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """Cached value for `key`, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+# Shared by every SearchTool in the process, e.g. across Streamlit sessions
+RESULT_CACHE = QueryCache()
+
+_index_ids = weakref.WeakKeyDictionary()
+_index_ids_lock = threading.Lock()
+_next_index_id = itertools.count()
+
+
+def index_key(index):
+    """
+    Identity of an index as it is now: a rebuilt index is a new object
+    with a new id, and patching an index bumps its `version`.
+    """
+    with _index_ids_lock:
+        ident = _index_ids.get(index)
+        if ident is None:
+            ident = _index_ids[index] = next(_next_index_id)
+    return ident, getattr(index, "version", None)
+
 
 class SearchTool:
-    def __init__(self, index):
+    def __init__(
+        self, index, cache=None, snippet_chars=SNIPPET_CHARS, merge_overlaps=MERGE_OVERLAPS
+    ):
         self.index = index
+        self.cache = cache if cache is not None else RESULT_CACHE
+        self.snippet_chars = snippet_chars
+        self.merge_overlaps = merge_overlaps
+
+    def cache_key(self, query, num_results):
+        # Dense embeddings depend on word order, TF-IDF scores do not
+        keep_order = getattr(self.index, "vectors", None) is not None
+        return index_key(self.index), normalize_query(query, keep_order), num_results
 
     def search(self, query: str) -> List[Any]:
         """
@@ -13,6 +421,63 @@ class SearchTool:
             query (str): The search query string.
 
         Returns:
-            List[Any]: A list of up to 5 search results returned by the FAQ index.
+            List[Any]: Up to 5 search results from the FAQ index. Overlapping
+                chunks of a file are merged, and long ones are trimmed to the
+                part around the query terms.
+        """
+        with tracing.span("tool.search", kind=tracing.TOOL_KIND, query=query) as tool:
+            key = self.cache_key(query, 5)
+            results = self.cache.get(key)
+            tool.set(cached=results is not None)
+            if results is None:
+                # Compact chunk stores return lazy views; hand the model plain dicts
+                results = self.index.search(query, num_results=5)
+                results = [dict(result) for result in results]
+                self.cache.put(key, results)
+            results = compact_results(results, query, self.snippet_chars, self.merge_overlaps)
+            tool.set(results=len(results))
+            return results
+
+    def search_many(self, queries: List[str], num_results: int = 5) -> List[Any]:
+        """
+        Search the FAQ index for several queries at once.
+
+        Prefer this over repeated `search` calls when a question has several
+        aspects, e.g. ["install kafka", "kafka docker compose"].
+
+        Args:
+            queries (List[str]): The search query strings.
+            num_results (int): Maximum results per query.
+
+        Returns:
+            List[Any]: The results of all queries without duplicates, taking
+                the best remaining result of each query in turn.
         """
-        return self.index.search(query, num_results=5)
+        with tracing.span(
+            "tool.search_many", kind=tracing.TOOL_KIND, queries=len(queries)
+        ) as tool:
+            keys = [self.cache_key(query, num_results) for query in queries]
+            per_query = [self.cache.get(key) for key in keys]
+
+            missing = [i for i, results in enumerate(per_query) if results is None]
+            tool.set(cached=len(queries) - len(missing))
+            if missing:
+                batch = batch_search(
+                    self.index, [queries[i] for i in missing], num_results=num_results
+                )
+                for i, results in zip(missing, batch):
+                    per_query[i] = [dict(result) for result in results]
+                    self.cache.put(keys[i], per_query[i])
+
+            results = compact_results(
+                merge_results(per_query, num_results),
+                " ".join(queries),
+                self.snippet_chars,
+                self.merge_overlaps,
+            )
+            tool.set(results=len(results))
+            return results
+
+    def cache_stats(self):
+        """Hit, miss and eviction counters of the result cache."""
+        return self.cache.stats()
@@ -0,0 +1,301 @@
+"""
+Serving many repositories from one process.
+
+A `ShardManager` keeps one search index ("shard") per repository. A
+shard is loaded with `ingest.index_data` the first time it is needed, and
+the least recently used shards are dropped once their combined size
+exceeds a memory budget. `ShardedSearchTool` exposes the shards to the
+agent, either for one repository or fanned out across all of them.
+"""
+
+import os
+import heapq
+import array
+import types
+import threading
+from collections import OrderedDict, namedtuple
+from typing import List, Any, Optional
+
+import ingest
+import tracing
+import answer_cache
+import search_tools
+from lazy_import import lazy_import
+
+np = lazy_import("numpy")
+pydantic_ai = lazy_import("pydantic_ai")
+
+
+REPOS = os.getenv("GITSENSEI_REPOS", "DataTalksClub/faq")
+
+SHARD_MEMORY_BUDGET = int(float(os.getenv("SHARD_MEMORY_BUDGET_MB", "1024")) * 2**20)
+
+
+Shard = namedtuple("Shard", ["index", "nbytes", "version"])
+
+
+def shard_version(index):
+    """
+    Version of a loaded index: the commit it was built from (set by
+    `ingest.index_data`), or the digest of its documents when the commit
+    is unknown, e.g. when it was indexed offline.
+    """
+    commit = getattr(index, "commit", None)
+    if commit is not None:
+        return commit
+    return answer_cache.corpus_fingerprint(index)
+
+
+def parse_repos(value):
+    """Parse "owner/name, owner/name" into a list of "owner/name" strings."""
+    repos = []
+    for part in value.split(","):
+        part = part.strip().strip("/")
+        if not part:
+            continue
+        owner, sep, name = part.partition("/")
+        if not sep or not owner or not name or "/" in name:
+            raise ValueError(f"Expected owner/name, got: {part!r}")
+        repos.append(f"{owner}/{name}")
+    return repos
+
+
+def estimate_bytes(index):
+    """
+    Approximate resident size of an index: the buffers of its NumPy arrays
+    and sparse matrices (`data`, `indices`, `indptr`), `array.array` rows
+    such as those of a `ChunkStore`, pandas frames and the length of its
+    strings. Memory-mapped arrays, like the embedding cache, are not
+    resident and are skipped.
+    """
+    total = 0
+    seen = set()
+    stack = [index]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or obj is None:
+            continue
+        seen.add(id(obj))
+
+        if isinstance(obj, (str, bytes)):
+            total += len(obj)
+        elif isinstance(obj, (type, types.ModuleType, types.FunctionType)):
+            continue
+        elif isinstance(obj, np.memmap):
+            continue
+        elif isinstance(obj, np.ndarray):
+            total += obj.nbytes
+            if obj.dtype == object:
+                stack.extend(obj.ravel())
+        elif isinstance(obj, array.array):
+            total += len(obj) * obj.itemsize
+        elif isinstance(obj, dict):
+            total += _strings_bytes(obj.keys(), stack)
+            total += _strings_bytes(obj.values(), stack)
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            total += _strings_bytes(obj, stack)
+        elif type(obj).__module__.startswith("pandas"):
+            total += int(np.sum(obj.memory_usage(deep=True)))
+        elif hasattr(obj, "__dict__"):
+            # Sparse matrices, vectorizers, ChunkStore, HybridIndex, ...
+            stack.extend(vars(obj).values())
+    return total
+
+
+def _strings_bytes(items, stack):
+    # Strings of a container are counted right away; the rest is walked
+    total = 0
+    for item in items:
+        if type(item) is str:
+            total += len(item)
+        elif item is not None and not isinstance(item, (int, float, bool)):
+            stack.append(item)
+    return total
+
+
+class ShardManager:
+    """
+    Lazily loaded, LRU-evicted search indexes for several repositories.
+
+    Args:
+        repos (list): Repositories as "owner/name" strings.
+        loader (callable, optional): `loader(owner, name)` returning a
+            fitted index; defaults to `ingest.index_data`.
+        memory_budget (int): Bytes of shards to keep loaded. The most
+            recently used shard is always kept, even if it alone is larger.
+    """
+
+    def __init__(self, repos, loader=None, memory_budget=SHARD_MEMORY_BUDGET):
+        if not repos:
+            raise ValueError("At least one repository is required")
+        self.repos = list(repos)
+        self.loader = loader or ingest.index_data
+        self.memory_budget = memory_budget
+        self._shards = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self.loads = 0
+        self.evictions = 0
+
+    def resolve(self, repo):
+        """Full "owner/name" for `repo`, which may also be just the name."""
+        if repo in self.repos:
+            return repo
+        matches = [r for r in self.repos if r.split("/", 1)[1] == repo]
+        if len(matches) == 1:
+            return matches[0]
+        raise ValueError(
+            f"Unknown repository: {repo}. Available: {', '.join(self.repos)}"
+        )
+
+    def get(self, repo):
+        """Index of `repo`, loading it (and evicting others) if needed."""
+        repo = self.resolve(repo)
+
+        with self._lock:
+            shard = self._shards.get(repo)
+            if shard is not None:
+                self._shards.move_to_end(repo)
+                return shard.index
+            load_lock = self._load_locks.setdefault(repo, threading.Lock())
+
+        # One load per repository at a time; other repositories are not blocked
+        with load_lock:
+            with self._lock:
+                shard = self._shards.get(repo)
+                if shard is not None:
+                    self._shards.move_to_end(repo)
+                    return shard.index
+
+            owner, name = repo.split("/", 1)
+            index = self.loader(owner, name)
+            shard = Shard(index, estimate_bytes(index), shard_version(index))
+
+            with self._lock:
+                self._shards[repo] = shard
+                self.loads += 1
+                self._evict()
+
+        return index
+
+    def versions(self):
+        """Version of each loaded shard by repository; see `shard_version`."""
+        with self._lock:
+            return {repo: shard.version for repo, shard in self._shards.items()}
+
+    def _evict(self):
+        while len(self._shards) > 1 and self.loaded_bytes() > self.memory_budget:
+            self._shards.popitem(last=False)
+            self.evictions += 1
+
+    def loaded_bytes(self):
+        return sum(shard.nbytes for shard in self._shards.values())
+
+    def loaded(self):
+        """Loaded repositories, least recently used first."""
+        with self._lock:
+            return list(self._shards)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "repos": len(self.repos),
+                "loaded": len(self._shards),
+                "loaded_bytes": self.loaded_bytes(),
+                "memory_budget": self.memory_budget,
+                "loads": self.loads,
+                "evictions": self.evictions,
+            }
+
+    def search(self, query, repo=None, num_results=5):
+        """
+        Top results for `query` from one repository, or from all of them
+        merged by score when `repo` is None. Results carry a "repo" key.
+        """
+        return self.search_many([query], repo=repo, num_results=num_results)[0]
+
+    def search_many(self, queries, repo=None, num_results=5):
+        """`search` for a batch of queries, scored together per shard."""
+        repos = self.repos if repo is None else [self.resolve(repo)]
+
+        per_query = [[] for _ in queries]
+        # Shards are searched one after another, so fanning out never needs
+        # more than one shard beyond the budget in memory.
+        for shard_repo in repos:
+            index = self.get(shard_repo)
+            batch = search_tools.scored_batch_search(index, queries, num_results)
+            for hits, results in zip(per_query, batch):
+                hits.extend(
+                    (score, shard_repo, {**dict(doc), "repo": shard_repo})
+                    for score, doc in results
+                )
+
+        return [
+            [doc for _, _, doc in heapq.nlargest(num_results, hits, key=lambda h: h[0])]
+            for hits in per_query
+        ]
+
+
+class ShardedSearchTool:
+    """Agent tools over a `ShardManager`."""
+
+    def __init__(
+        self,
+        manager,
+        snippet_chars=search_tools.SNIPPET_CHARS,
+        merge_overlaps=search_tools.MERGE_OVERLAPS,
+    ):
+        self.manager = manager
+        self.snippet_chars = snippet_chars
+        self.merge_overlaps = merge_overlaps
+
+    def search(self, query: str, repo: Optional[str] = None) -> List[Any]:
+        """
+        Search the indexed repositories.
+
+        Args:
+            query (str): The search query string.
+            repo (str, optional): Repository as "owner/name" to search only
+                that one; all repositories are searched when omitted.
+
+        Returns:
+            List[Any]: Up to 5 results, each with the "repo" it came from.
+        """
+        with tracing.span("tool.search", kind=tracing.TOOL_KIND, query=query, repo=repo or ""):
+            try:
+                results = self.manager.search(query, repo=repo, num_results=5)
+            except ValueError as e:
+                raise pydantic_ai.ModelRetry(str(e)) from e
+            return search_tools.compact_results(
+                results, query, self.snippet_chars, self.merge_overlaps
+            )
+
+    def search_many(
+        self, queries: List[str], repo: Optional[str] = None, num_results: int = 5
+    ) -> List[Any]:
+        """
+        Search the indexed repositories for several queries at once.
+
+        Args:
+            queries (List[str]): The search query strings.
+            repo (str, optional): Repository as "owner/name" to search only
+                that one; all repositories are searched when omitted.
+            num_results (int): Maximum results per query.
+
+        Returns:
+            List[Any]: The results of all queries without duplicates, each
+                with the "repo" it came from.
+        """
+        with tracing.span(
+            "tool.search_many", kind=tracing.TOOL_KIND, queries=len(queries), repo=repo or ""
+        ):
+            try:
+                batch = self.manager.search_many(queries, repo=repo, num_results=num_results)
+            except ValueError as e:
+                raise pydantic_ai.ModelRetry(str(e)) from e
+            return search_tools.compact_results(
+                search_tools.merge_results(batch, num_results),
+                " ".join(queries),
+                self.snippet_chars,
+                self.merge_overlaps,
+            )
@@ -0,0 +1,105 @@
+"""
+Coalescing of identical concurrent requests.
+
+When several sessions ask the same question at the same time, only the
+first one (the leader) starts an agent run; the others join it and get
+the same result, or the same exception. Streamed progress (text chunks)
+is forwarded to every waiter, and chunks sent before a waiter joined are
+replayed to it first.
+
+Each waiter can be cancelled on its own, e.g. by a timeout. The shared run
+continues while anyone still waits for it and is cancelled when the last
+waiter is gone.
+"""
+
+import asyncio
+
+
+def request_key(prompt, scope=None):
+    """
+    Key under which runs are shared: `scope` plus the prompt with case and
+    whitespace normalized. Punctuation and short words are kept, since
+    "Python 2?" and "Python 3?" need different answers.
+    """
+    return scope, " ".join(prompt.lower().split())
+
+
+class _Flight:
+    def __init__(self):
+        self.task = None
+        self.waiters = 0
+        self.progress = []
+        self.listeners = []
+
+    def publish(self, item):
+        self.progress.append(item)
+        for listener in list(self.listeners):
+            listener(item)
+
+
+class SingleFlight:
+    """
+    Shares one in-flight run between callers using the same key.
+
+    All methods must be called from the same event loop.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self.started = 0
+        self.joined = 0
+        self.cancelled = 0
+
+    async def run(self, key, factory, on_progress=None):
+        """
+        Result of `factory(publish)` for `key`, shared with concurrent callers.
+
+        Args:
+            key: Hashable request identity, e.g. `request_key(prompt, scope)`.
+            factory (callable): Returns the coroutine to run when no run for
+                `key` is in flight. It may call `publish(item)` to report
+                progress to every waiter.
+            on_progress (callable, optional): Called with each progress item
+                of the shared run, including the ones published before this
+                caller joined.
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight()
+            flight.task = asyncio.ensure_future(factory(flight.publish))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+            self.started += 1
+        else:
+            self.joined += 1
+
+        if on_progress is not None:
+            for item in flight.progress:
+                on_progress(item)
+            flight.listeners.append(on_progress)
+        flight.waiters += 1
+
+        try:
+            # shield: cancelling this waiter must not cancel the shared run
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if on_progress is not None:
+                flight.listeners.remove(on_progress)
+            if flight.waiters == 0 and not flight.task.done():
+                # Nobody is waiting any more; later callers start a new run
+                self._forget(key, flight)
+                flight.task.cancel()
+                self.cancelled += 1
+
+    def _forget(self, key, flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def stats(self):
+        return {
+            "in_flight": len(self._flights),
+            "started": self.started,
+            "joined": self.joined,
+            "cancelled": self.cancelled,
+        }
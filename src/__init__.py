@@ -0,0 +1,3 @@
+"""
+GitSensei tooling built on the top-level modules (`ingest`, `search_agent`, ...).
+"""
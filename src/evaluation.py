@@ -0,0 +1,443 @@
+"""
+Offline evaluation of the GitSensei agent.
+
+`run_agent_evaluation` sends a question set through an agent built by
+`search_agent.init_agent`, `EVAL_CONCURRENCY` questions at a time, and
+records for each question the answer, latency, tool calls, the files the
+searches returned and whether they include the question's expected file.
+Every answer is then checked by `evaluate_agent_response`.
+
+With `stand_in_model()` no API is called: the deterministic stand-in
+searches for the question and answers with the top results, so thousands
+of questions take minutes and results are reproducible. Runs against the
+real model are sent at batch priority, behind interactive requests.
+
+    python -m src.evaluation --questions 1000 --concurrency 64
+"""
+
+import os
+import re
+import time
+import random
+import asyncio
+import argparse
+from pathlib import Path
+from typing import List
+
+import pandas as pd
+from pydantic import BaseModel
+from pydantic_ai import Agent
+from pydantic_ai.messages import (
+    ModelResponse,
+    TextPart,
+    ToolCallPart,
+    ToolReturnPart,
+    UserPromptPart,
+)
+from pydantic_ai.models.function import FunctionModel
+
+import logs
+import scheduler
+
+
+EVAL_CONCURRENCY = int(os.getenv("EVAL_CONCURRENCY", "16"))
+
+CITATION = re.compile(r"\[[^\]]+\]\(([^)\s]+)\)")
+
+# Columns of `create_evaluation_dataframe` that are not checks
+RESULT_COLUMNS = [
+    "file",
+    "question",
+    "response",
+    "tool_calls_made",
+    "latency_s",
+    "retrieval_hit",
+    "error",
+]
+
+
+class EvaluationCheck(BaseModel):
+    check_name: str
+    justification: str
+    check_pass: bool
+
+
+class EvaluationChecklist(BaseModel):
+    checklist: List[EvaluationCheck]
+    summary: str
+
+
+def stand_in_model(repo="owner/name", num_citations=2):
+    """
+    Deterministic offline model: calls `search` with the question, then
+    answers with the start of the top results, each cited as a link into
+    `repo`.
+    """
+
+    def respond(messages, info):
+        parts = messages[-1].parts
+        returns = [part for part in parts if isinstance(part, ToolReturnPart)]
+        if not returns:
+            prompt = next(p.content for p in parts if isinstance(p, UserPromptPart))
+            return ModelResponse(parts=[ToolCallPart("search", {"query": prompt})])
+
+        results = returns[0].content if isinstance(returns[0].content, list) else []
+        if not results:
+            return ModelResponse(parts=[TextPart("I could not find this in the repository.")])
+        answers = []
+        for result in results[:num_citations]:
+            snippet = " ".join(str(result.get("content", "")).split()[:30])
+            link = f"https://github.com/{repo}/blob/main/{result['filename']}"
+            answers.append(f"{snippet} [{result['filename']}]({link})")
+        return ModelResponse(parts=[TextPart("\n\n".join(answers))])
+
+    return FunctionModel(respond)
+
+
+def tool_calls_of(messages):
+    return [
+        {"tool_name": part.tool_name, "args": part.args_as_dict()}
+        for message in messages
+        for part in message.parts
+        if isinstance(part, ToolCallPart)
+    ]
+
+
+def retrieved_files(messages):
+    """Filenames of the search results the agent saw, in order."""
+    files = []
+    for message in messages:
+        for part in message.parts:
+            if isinstance(part, ToolReturnPart) and isinstance(part.content, list):
+                files.extend(
+                    result["filename"]
+                    for result in part.content
+                    if isinstance(result, dict) and "filename" in result
+                )
+    return list(dict.fromkeys(files))
+
+
+def evaluate_agent_response(
+    question, response, tool_calls=None, retrieved=None, expected_docs=None
+):
+    """
+    Rule-based checks of an answer, as an `EvaluationChecklist`: it is not
+    empty, a search was made, it cites sources, its citations point to
+    files the search returned, and (when known) the expected file was found.
+    """
+    tool_calls = tool_calls or []
+    retrieved = retrieved or []
+    citations = CITATION.findall(response or "")
+
+    checks = [
+        ("answer_given", bool((response or "").strip()), "The answer is not empty."),
+        ("tool_used", bool(tool_calls), f"{len(tool_calls)} tool calls were made."),
+        ("has_citation", bool(citations), f"{len(citations)} links are cited."),
+        (
+            "citations_grounded",
+            bool(citations)
+            and all(any(link.endswith(f) for f in retrieved) for link in citations),
+            "Every cited link is a file the search returned.",
+        ),
+    ]
+    if expected_docs:
+        found = [doc for doc in expected_docs if doc in retrieved]
+        checks.append(
+            ("expected_doc_retrieved", bool(found), f"Found {len(found)} expected files.")
+        )
+
+    checklist = [
+        EvaluationCheck(check_name=name, justification=reason, check_pass=passed)
+        for name, passed, reason in checks
+    ]
+    passed = sum(check.check_pass for check in checklist)
+    return EvaluationChecklist(
+        checklist=checklist, summary=f"{passed}/{len(checklist)} checks passed for {question!r}"
+    )
+
+
+def _question_item(item):
+    if isinstance(item, str):
+        return {"question": item, "expected_docs": []}
+    return {"expected_docs": [], **item}
+
+
+async def _ask(agent, question, model=None, log=False):
+    """Answer, tool calls, retrieved files and log file of one question."""
+    if isinstance(agent, Agent):
+        with scheduler.request_priority(scheduler.BATCH):
+            result = await agent.run(question, model=model)
+        messages = result.new_messages()
+        log_file = (
+            logs.log_interaction_to_file(agent, messages, source="evaluation") if log else None
+        )
+        return str(result.output), tool_calls_of(messages), retrieved_files(messages), log_file
+
+    # Agents with a blocking `ask(question)` returning a dict
+    answer = await asyncio.to_thread(agent.ask, question)
+    return (
+        answer["response"],
+        answer.get("tool_calls", []),
+        answer.get("retrieved", []),
+        answer.get("log_file"),
+    )
+
+
+async def evaluate_questions(
+    agent, questions, concurrency=EVAL_CONCURRENCY, model=None, log=False
+):
+    """Async `run_agent_evaluation`, for callers already in an event loop."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def evaluate(item):
+        item = _question_item(item)
+        record = {
+            "question": item["question"],
+            "expected_docs": item["expected_docs"],
+            "response": "",
+            "tool_calls": [],
+            "retrieved": [],
+            "log_file": None,
+            "evaluation": None,
+            "error": None,
+        }
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                answer = await _ask(agent, item["question"], model, log)
+            except Exception as e:
+                record["error"] = f"{type(e).__name__}: {e}"
+                answer = None
+            record["latency_s"] = time.perf_counter() - start
+
+        if answer is not None:
+            response, tool_calls, retrieved, log_file = answer
+            record.update(
+                response=response, tool_calls=tool_calls, retrieved=retrieved, log_file=log_file
+            )
+            record["evaluation"] = evaluate_agent_response(
+                item["question"], response, tool_calls, retrieved, item["expected_docs"]
+            )
+        record["num_tool_calls"] = len(record["tool_calls"])
+        record["retrieval_hit"] = (
+            any(doc in record["retrieved"] for doc in item["expected_docs"])
+            if item["expected_docs"] and record["error"] is None
+            else None
+        )
+        return record
+
+    return await asyncio.gather(*(evaluate(item) for item in questions))
+
+
+def run_agent_evaluation(
+    agent,
+    questions,
+    max_questions=None,
+    concurrency=EVAL_CONCURRENCY,
+    model=None,
+    log=False,
+):
+    """
+    Evaluate `agent` on `questions`, at most `concurrency` at a time.
+
+    Args:
+        agent: A pydantic-ai agent (e.g. from `search_agent.init_agent`), or
+            any object whose `ask(question)` returns a dict with "response",
+            "tool_calls" and "log_file".
+        questions (list): Question strings, or dicts with "question" and
+            optionally "expected_docs" (filenames a search should return).
+        max_questions (int, optional): Evaluate only the first ones.
+        model (optional): Model to run the agent with, e.g. `stand_in_model()`.
+        log (bool): Log every interaction with source "evaluation".
+
+    Returns:
+        list: One dict per question, in order, with "question", "response",
+            "tool_calls", "num_tool_calls", "retrieved", "retrieval_hit",
+            "latency_s", "evaluation", "log_file" and "error".
+    """
+    questions = list(questions)[:max_questions]
+    return asyncio.run(evaluate_questions(agent, questions, concurrency, model, log))
+
+
+def create_evaluation_dataframe(eval_results):
+    """One row per evaluated question, with one boolean column per check."""
+    rows = []
+    for result in eval_results:
+        log_file = result.get("log_file")
+        row = {
+            "file": log_file.name if isinstance(log_file, Path) else log_file,
+            "question": result["question"],
+            "response": result["response"],
+            "tool_calls_made": len(result.get("tool_calls") or []),
+            "latency_s": result.get("latency_s"),
+            "retrieval_hit": result.get("retrieval_hit"),
+            "error": result.get("error"),
+        }
+        evaluation = result.get("evaluation")
+        if evaluation is not None:
+            for check in evaluation.checklist:
+                row[check.check_name] = check.check_pass
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def analyze_evaluation_results(df):
+    """Pass rates, tool usage, retrieval hit rate and latency of a results frame."""
+    if df.empty:
+        return {
+            "total_questions": 0,
+            "average_pass_rate": 0.0,
+            "tool_usage_rate": 0.0,
+            "check_pass_rates": {},
+        }
+
+    checks = [column for column in df.columns if column not in RESULT_COLUMNS]
+    pass_rates = {column: float(df[column].fillna(False).astype(bool).mean()) for column in checks}
+    analysis = {
+        "total_questions": len(df),
+        "average_pass_rate": sum(pass_rates.values()) / len(pass_rates) if pass_rates else 0.0,
+        "tool_usage_rate": float((df["tool_calls_made"] > 0).mean()),
+        "check_pass_rates": pass_rates,
+    }
+    if "error" in df:
+        analysis["error_rate"] = float(df["error"].notna().mean())
+    if "retrieval_hit" in df and df["retrieval_hit"].notna().any():
+        analysis["retrieval_hit_rate"] = float(df["retrieval_hit"].dropna().astype(bool).mean())
+    if "latency_s" in df and df["latency_s"].notna().any():
+        latency = df["latency_s"].dropna()
+        analysis["latency_p50_s"] = float(latency.quantile(0.5))
+        analysis["latency_p95_s"] = float(latency.quantile(0.95))
+    if "tool_calls_made" in df:
+        analysis["avg_tool_calls"] = float(df["tool_calls_made"].mean())
+    return analysis
+
+
+def evaluate_search_quality(search_function, test_queries):
+    """
+    Precision, recall, hit rate and reciprocal rank of `search_function`
+    on queries with known relevant files.
+
+    Args:
+        search_function (callable): Takes a query and returns results with
+            a "filename", e.g. `SearchTool(index).search`.
+        test_queries (list): Dicts with "query" and "expected_docs".
+    """
+    individual = []
+    for test in test_queries:
+        try:
+            results = search_function(test["query"])
+        except Exception as e:
+            individual.append({"query": test["query"], "error": str(e)})
+            continue
+
+        retrieved = [result["filename"] for result in results]
+        relevant = set(test["expected_docs"])
+        hits = [rank for rank, name in enumerate(retrieved, 1) if name in relevant]
+        individual.append(
+            {
+                "query": test["query"],
+                "retrieved": retrieved,
+                "precision": len(hits) / len(retrieved) if retrieved else 0.0,
+                "recall": len({retrieved[r - 1] for r in hits}) / len(relevant) if relevant else 0.0,
+                "hit": bool(hits),
+                "reciprocal_rank": 1 / hits[0] if hits else 0.0,
+            }
+        )
+
+    scored = [result for result in individual if "error" not in result]
+
+    def average(metric):
+        return sum(float(r[metric]) for r in scored) / len(scored) if scored else 0
+
+    return {
+        "individual_results": individual,
+        "aggregate_metrics": {
+            "num_queries": len(individual),
+            "num_errors": len(individual) - len(scored),
+            "avg_precision": average("precision"),
+            "avg_recall": average("recall"),
+            "hit_rate": average("hit"),
+            "mrr": average("reciprocal_rank"),
+        },
+    }
+
+
+def generate_test_questions(faq_data, num_samples=10, seed=42):
+    """
+    A reproducible sample of the FAQ's own questions, each with the file
+    that answers it as "expected_docs".
+    """
+    questions = {}
+    for doc in faq_data:
+        question = doc.get("question")
+        if question and question not in questions:
+            questions[question] = [doc["filename"]] if doc.get("filename") else []
+
+    items = [{"question": q, "expected_docs": docs} for q, docs in questions.items()]
+    if num_samples < len(items):
+        items = random.Random(seed).sample(items, num_samples)
+    return items
+
+
+class EvaluationRunner:
+    """Generates questions from FAQ documents, evaluates the agent and analyzes the results."""
+
+    def __init__(self, agent, faq_data, concurrency=EVAL_CONCURRENCY, model=None):
+        self.agent = agent
+        self.faq_data = faq_data
+        self.concurrency = concurrency
+        self.model = model
+
+    def run_full_evaluation(self, num_questions=10, max_questions=None):
+        print(f"Generating {num_questions} test questions...")
+        questions = generate_test_questions(self.faq_data, num_samples=num_questions)
+
+        print(f"Evaluating {len(questions)} questions, {self.concurrency} at a time...")
+        start = time.perf_counter()
+        eval_results = run_agent_evaluation(
+            self.agent,
+            questions,
+            max_questions=max_questions,
+            concurrency=self.concurrency,
+            model=self.model,
+        )
+        print(f"Evaluated in {time.perf_counter() - start:.1f}s")
+
+        df = create_evaluation_dataframe(eval_results)
+        analysis = analyze_evaluation_results(df)
+        return {
+            "questions": questions,
+            "eval_results": eval_results,
+            "dataframe": df,
+            "analysis": analysis,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--questions", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=EVAL_CONCURRENCY)
+    parser.add_argument("--live", action="store_true", help="call the real model")
+    parser.add_argument("--output", type=Path, help="write per-question results as CSV")
+    args = parser.parse_args()
+
+    import main as cli
+    import search_agent
+
+    index = cli.load_repo_index(cli.REPO_OWNER, cli.REPO_NAME)
+    if args.live:
+        model = scheduler.ScheduledModel(search_agent.MODEL_NAME)
+    else:
+        model = stand_in_model(f"{cli.REPO_OWNER}/{cli.REPO_NAME}")
+    agent = search_agent.init_agent(index, cli.REPO_OWNER, cli.REPO_NAME, model=model)
+
+    runner = EvaluationRunner(agent, index.docs, concurrency=args.concurrency)
+    results = runner.run_full_evaluation(num_questions=args.questions)
+    for name, value in results["analysis"].items():
+        print(f"{name}: {value}")
+    if args.output:
+        results["dataframe"].to_csv(args.output, index=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Streaming agent answers.
+
+`stream_answer` runs the agent with an event stream handler and hands
+every text delta to a callback as soon as it arrives, so the CLI and the
+web app can show the answer while it is being generated. The run goes on
+through any tool calls to the final answer. It measures time to first
+token (TTFT) and total latency, and returns the final message list for
+logging. Set `STREAM_RESPONSES=false` to wait for complete answers instead.
+"""
+
+import os
+import time
+import queue
+from collections import namedtuple
+
+import profiling
+from lazy_import import lazy_import
+
+pydantic_ai = lazy_import("pydantic_ai")
+
+
+STREAM_RESPONSES = os.getenv("STREAM_RESPONSES", "true").lower() in ("1", "true", "yes")
+
+
+StreamedAnswer = namedtuple("StreamedAnswer", ["output", "messages", "ttft", "latency"])
+
+
+async def stream_answer(agent, user_prompt, on_delta=None, **kwargs):
+    """
+    Run `agent` on `user_prompt`, calling `on_delta(text)` per text chunk.
+
+    Text the model writes before a tool call (e.g. "Let me search...") is
+    streamed as well, separated from the next response by a blank line;
+    TTFT is the time to the first chunk of any response.
+
+    Returns:
+        StreamedAnswer: The final output, the new messages of the run, and
+            the seconds to the first text chunk (None if there was none)
+            and to the end of the run.
+    """
+    start = time.perf_counter()
+    ttft = None
+    streamed = False
+
+    def emit(delta):
+        nonlocal ttft
+        if ttft is None:
+            ttft = time.perf_counter() - start
+        if on_delta is not None:
+            on_delta(delta)
+
+    async def handle_events(ctx, events):
+        # Called once per model response (and per batch of tool calls);
+        # events arrive as the model sends them, without debouncing
+        nonlocal streamed
+        first = True
+        async for event in events:
+            delta = _text_delta(event)
+            if not delta:
+                continue
+            if first and streamed:
+                emit("\n\n")
+            first = False
+            streamed = True
+            emit(delta)
+
+    result = await agent.run(user_prompt, event_stream_handler=handle_events, **kwargs)
+    return StreamedAnswer(
+        result.output, result.new_messages(), ttft, time.perf_counter() - start
+    )
+
+
+def _text_delta(event):
+    messages = pydantic_ai.messages
+    if isinstance(event, messages.PartStartEvent) and isinstance(event.part, messages.TextPart):
+        return event.part.content
+    if isinstance(event, messages.PartDeltaEvent) and isinstance(
+        event.delta, messages.TextPartDelta
+    ):
+        return event.delta.content_delta
+    return None
+
+
+def stream_in_background(
+    runner, agent, user_prompt, flight=None, key=None, profile=None, **kwargs
+):
+    """
+    Stream an answer on `runner` (an `async_runner.AsyncRunner`) into sync code.
+
+    With a `single_flight.SingleFlight`, concurrent calls with the same
+    `key` share one run and all receive its chunks. `profile` is passed to
+    `profiling.profiled` as `enabled` (None samples at the configured rate).
+
+    Returns a generator of text chunks, which ends when the run does, and
+    the future of the `StreamedAnswer`; its `result()` re-raises errors and
+    timeouts of the run.
+    """
+    deltas = queue.Queue()
+    if flight is None:
+        coro = stream_answer(agent, user_prompt, deltas.put, **kwargs)
+    else:
+        coro = flight.run(
+            key,
+            lambda publish: stream_answer(agent, user_prompt, publish, **kwargs),
+            on_progress=deltas.put,
+        )
+    future = runner.submit(profiling.profile_coro(coro, enabled=profile))
+    future.add_done_callback(lambda _: deltas.put(None))
+
+    def chunks():
+        while (delta := deltas.get()) is not None:
+            yield delta
+
+    return chunks(), future
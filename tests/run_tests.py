@@ -31,6 +31,8 @@ def run_test_module(module_name, test_class):
         test_file = project_root / "tests" / f"{module_name}.py"
         spec = importlib.util.spec_from_file_location(module_name, test_file)
         test_module = importlib.util.module_from_spec(spec)
+        # Registered so that classes defined in tests can be pickled
+        sys.modules[module_name] = test_module
         spec.loader.exec_module(test_module)
 
         # Get the test class
@@ -79,6 +81,26 @@ def main():
         ("test_logging_utils", "TestLoggingUtils"),
         ("test_agent_logic", "TestAgent"),
         ("test_evaluation", "TestEvaluationFunctions"),
+        ("test_index_cache", "TestIndexCache"),
+        ("test_ingest", "TestIngest"),
+        ("test_chunk_store", "TestChunkStore"),
+        ("test_search_engine", "TestSearchEngine"),
+        ("test_embeddings", "TestEmbeddings"),
+        ("test_ann_index", "TestAnnIndex"),
+        ("test_search_tools", "TestSearchTools"),
+        ("test_shards", "TestShards"),
+        ("test_logs", "TestLogs"),
+        ("test_log_store", "TestLogStore"),
+        ("test_async_runner", "TestAsyncRunner"),
+        ("test_streaming", "TestStreaming"),
+        ("test_answer_cache", "TestAnswerCache"),
+        ("test_single_flight", "TestSingleFlight"),
+        ("test_scheduler", "TestScheduler"),
+        ("test_benchmark_suite", "TestBenchmarkSuite"),
+        ("test_evaluation", "TestOfflineEvaluation"),
+        ("test_tracing", "TestTracing"),
+        ("test_profiling", "TestProfiling"),
+        ("test_startup", "TestStartup"),
     ]
 
     total_passed = 0
@@ -0,0 +1,168 @@
+"""
+Unit tests for the IVF-PQ approximate nearest-neighbour index.
+"""
+
+import pickle
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+
+import embeddings
+from ann_index import IVFPQIndex
+
+
+def clustered_vectors(num_vectors=3000, dim=32, num_clusters=30, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(num_clusters, dim))
+    labels = rng.integers(0, num_clusters, size=num_vectors)
+    vectors = centers[labels] + 0.2 * rng.normal(size=(num_vectors, dim))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.astype(np.float32)
+
+
+def exact_neighbours(vectors, queries, k):
+    dists = ((queries[:, None, :] - vectors[None, :, :]) ** 2).sum(-1)
+    return np.argsort(dists, axis=1)[:, :k]
+
+
+def recall(found, expected):
+    return np.mean([len(set(f) & set(e)) / len(e) for f, e in zip(found, expected)])
+
+
+class FixedEmbedder:
+    """Embedder returning a preset vector per text."""
+
+    name = "fixed"
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def encode(self, texts, batch_size=64):
+        return np.stack([self.vectors[text] for text in texts])
+
+
+class TestAnnIndex:
+    """Test cases for the IVF-PQ index"""
+
+    def test_recall_improves_with_nprobe_and_refine(self):
+        """Test the recall/latency knobs against exact search"""
+        vectors = clustered_vectors()
+        queries = vectors[:50]
+        expected = exact_neighbours(vectors, queries, 10)
+
+        index = IVFPQIndex(32, nlist=16, m=8).train(vectors).add(vectors)
+
+        coarse, _ = index.search(queries, k=10, nprobe=1)
+        wide, _ = index.search(queries, k=10, nprobe=16)
+        refined, dists = index.search(
+            queries, k=10, nprobe=16, vectors=vectors, refine=10
+        )
+
+        assert recall(coarse, expected) <= recall(wide, expected)
+        assert recall(wide, expected) < recall(refined, expected)
+        assert recall(refined, expected) > 0.95
+        assert np.all(np.diff(dists, axis=1) >= 0)
+
+    def test_incremental_add(self):
+        """Test that vectors added after training are searchable by id"""
+        vectors = clustered_vectors()
+        index = IVFPQIndex(32, nlist=16, m=8).train(vectors)
+        index.add(vectors[:2000])
+        index.add(vectors[2000:], ids=np.arange(5000, 5000 + 1000))
+
+        ids, _ = index.search(vectors[2500], k=1, nprobe=16, vectors=None)
+
+        assert len(index) == 3000
+        assert ids[0] == 5500
+        assert set(index.ids[:10]) <= set(range(2000)) | set(range(5000, 6000))
+
+    def test_missing_results_are_padded(self):
+        """Test that fewer matches than k are padded with -1"""
+        vectors = clustered_vectors(num_vectors=300)
+        index = IVFPQIndex(32, nlist=4, m=4).train(vectors).add(vectors[:3])
+
+        ids, dists = index.search(vectors[0], k=5, nprobe=4)
+
+        assert list(ids[3:]) == [-1, -1]
+        assert np.isinf(dists[3:]).all()
+
+    def test_save_and_mmap_load(self):
+        """Test persistence, memory-mapped loading and light pickles"""
+        vectors = clustered_vectors()
+        index = IVFPQIndex(32, nlist=16, m=8).train(vectors).add(vectors)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            index.save(tmp_dir)
+            loaded = IVFPQIndex.load(tmp_dir)
+
+            assert isinstance(loaded.codes, np.memmap)
+            expected = index.search(vectors[:5], k=5)
+            found = loaded.search(vectors[:5], k=5)
+            np.testing.assert_array_equal(found[0], expected[0])
+
+            payload = pickle.dumps(loaded)
+            assert len(payload) < 1000
+            restored = pickle.loads(payload)
+            np.testing.assert_array_equal(restored.search(vectors[:5], k=5)[0], expected[0])
+
+            loaded.add(vectors[:10], ids=np.arange(10000, 10010))
+            assert len(pickle.loads(pickle.dumps(loaded))) == 3010
+
+    def test_vector_index_uses_ann(self):
+        """Test ANN scoring in VectorIndex and updates of the saved index"""
+        vectors = clustered_vectors(num_vectors=1200)
+        texts = {f"doc {i}": vector for i, vector in enumerate(vectors)}
+        docs = [{"content": text} for text in texts]
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            texts["query"] = vectors[7]
+            texts["new doc"] = vectors[7] * 0.99 + vectors[8] * 0.01
+            texts["new doc"] /= np.linalg.norm(texts["new doc"])
+            vector_index = embeddings.VectorIndex(FixedEmbedder(texts), cache_dir)
+            vector_index.update(docs)
+            exact = vector_index.score("query")
+
+            ann_dir = Path(cache_dir) / "ann"
+            vector_index.build_ann(nlist=8, m=8, candidates=20, refine=10, path=ann_dir)
+            approx = vector_index.score("query")
+
+            assert np.argmax(approx) == np.argmax(exact) == 7
+            assert np.count_nonzero(approx) == 20
+            assert Path(ann_dir, "codes.npy").exists()
+
+            vector_index.update(docs + [{"content": "new doc"}])
+            reloaded = pickle.loads(pickle.dumps(vector_index))
+
+            assert len(reloaded.ann) == 1201
+            assert np.count_nonzero(reloaded.score("query") > 0.99) == 2
+
+            vector_index.update(docs[1:])
+            assert len(vector_index.ann) == 1199
+            assert vector_index.ann.path == ann_dir
+            assert np.argmax(vector_index.score("query")) == 6
+
+    def test_ann_covers_only_index_docs(self):
+        """Test that the ANN index of a shared cache holds only the index's documents"""
+        vectors = clustered_vectors(num_vectors=1200)
+        texts = {f"doc {i}": vector for i, vector in enumerate(vectors)}
+        texts["query"] = vectors[1100]
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            other = embeddings.VectorIndex(FixedEmbedder(texts), cache_dir)
+            other.update([{"content": f"doc {i}"} for i in range(1000)])
+
+            with patch("embeddings.ANN_THRESHOLD", 150):
+                vector_index = embeddings.VectorIndex(FixedEmbedder(texts), cache_dir)
+                vector_index.update([{"content": f"doc {i}"} for i in range(1050, 1150)])
+                assert vector_index.ann is None
+
+                vector_index.update([{"content": f"doc {i}"} for i in range(1000, 1200)])
+                assert vector_index.ann is not None
+                assert vector_index.ann.path is None
+
+            assert set(vector_index.ann.ids) == set(range(1000, 1200))
+            scores = vector_index.score("query")
+            assert np.argmax(scores) == 100
+            assert np.count_nonzero(scores) == vector_index.ann_candidates
@@ -0,0 +1,170 @@
+"""
+Unit tests for the semantic answer cache.
+"""
+
+import tempfile
+from unittest.mock import patch
+
+import numpy as np
+
+import ingest
+import shards
+import search_agent
+import answer_cache
+from answer_cache import AnswerCache, HashingEmbedder
+from tests.test_embeddings import FakeEmbedder
+
+
+DOCS = [
+    {"filename": "faq/kafka.md", "content": "How to install Kafka with docker"},
+    {"filename": "faq/spark.md", "content": "Spark setup on Windows"},
+]
+
+
+class TestAnswerCache:
+    """Test cases for AnswerCache and its scope keys"""
+
+    def test_hashing_embedder(self):
+        """Test that rephrasings are close and other topics are not"""
+        vectors = HashingEmbedder().encode(
+            [
+                "How do I install Kafka?",
+                "how to install kafka",
+                "How do I install Spark?",
+            ]
+        )
+
+        assert np.allclose(np.linalg.norm(vectors, axis=1), 1)
+        assert vectors[0] @ vectors[1] > 0.95
+        assert vectors[0] @ vectors[2] < 0.7
+
+    def test_hit_above_threshold(self):
+        """Test that near-duplicate questions reuse the stored answer"""
+        cache = AnswerCache(directory=None, threshold=0.9)
+        cache.put("How do I install Kafka?", "Use docker", scope="s")
+
+        answer, similarity = cache.get("how to install kafka", scope="s")
+        assert answer == "Use docker"
+        assert similarity > 0.9
+        assert cache.get("How do I install Spark?", scope="s") is None
+
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["hit_rate"] == 0.5
+
+    def test_near_misses_counted(self):
+        """Test that misses just below the threshold are reported"""
+        cache = AnswerCache(directory=None, embedder=FakeEmbedder(), threshold=0.92)
+        cache.put("kafka broker", "answer", scope="s")
+
+        assert cache.get("kafka streaming setup", scope="s") is None
+        assert cache.stats()["near_misses"] == 1
+
+    def test_scopes_are_separate(self):
+        """Test that answers are never shared across scopes"""
+        cache = AnswerCache(directory=None)
+        cache.put("How do I install Kafka?", "old answer", scope="old")
+
+        assert cache.get("How do I install Kafka?", scope="new") is None
+        cache.put("How do I install Kafka?", "new answer", scope="new")
+        assert cache.get("How do I install Kafka?", scope="new")[0] == "new answer"
+        assert cache.get("How do I install Kafka?", scope="old")[0] == "old answer"
+
+    def test_lru_eviction_and_ttl(self):
+        """Test size bound, recency order and expiry"""
+        cache = AnswerCache(directory=None, max_size=2, ttl=60)
+        cache.put("kafka install", "a")
+        cache.put("spark windows", "b")
+        cache.get("kafka install")
+        cache.put("docker compose", "c")
+
+        assert cache.get("spark windows") is None
+        assert cache.get("kafka install")[0] == "a"
+        assert cache.stats()["evictions"] == 1
+
+        with patch("answer_cache.time.time", return_value=10**12):
+            assert cache.get("kafka install") is None
+        assert cache.stats()["expirations"] == 2
+        assert len(cache) == 0
+
+    def test_replaces_identical_question(self):
+        """Test that answering the same question again updates the entry"""
+        cache = AnswerCache(directory=None)
+        cache.put("kafka install", "a")
+        cache.put("kafka install", "b")
+
+        assert len(cache) == 1
+        assert cache.get("kafka install")[0] == "b"
+
+    def test_persistence(self):
+        """Test that the cache survives a restart but not an embedder change"""
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = AnswerCache(directory=cache_dir)
+            cache.put("How do I install Kafka?", "Use docker", scope="s")
+            cache.put("Spark on Windows?", "Use WSL", scope="s")
+
+            reloaded = AnswerCache(directory=cache_dir)
+            assert len(reloaded) == 2
+            assert reloaded.get("how to install kafka", scope="s")[0] == "Use docker"
+
+            other = AnswerCache(directory=cache_dir, embedder=HashingEmbedder(dim=64))
+            assert len(other) == 0
+
+    def test_disabled(self):
+        """Test that a zero-size cache stores nothing"""
+        cache = AnswerCache(directory=None, max_size=0)
+        cache.put("kafka", "a")
+
+        assert cache.get("kafka") is None
+        assert len(cache) == 0
+
+    def test_scope_follows_index_and_prompt(self):
+        """Test that the scope changes with the documents and the repository"""
+        repos = ["owner/repo"]
+        index = ingest.fit_index(DOCS, engine="native")
+        scope = search_agent.answer_scope(repos, index)
+
+        assert scope == search_agent.answer_scope(repos, ingest.fit_index(DOCS))
+        assert scope != search_agent.answer_scope(["owner/other"], index)
+        assert scope != search_agent.answer_scope(repos, manager=shards.ShardManager(repos))
+
+        fingerprint = answer_cache.corpus_fingerprint(index)
+        new_doc = {"filename": "faq/kafka.md", "content": "Kafka on Windows"}
+        ingest.patch_index(index, {"faq/kafka.md"}, [new_doc])
+
+        assert answer_cache.corpus_fingerprint(index) != fingerprint
+        assert search_agent.answer_scope(repos, index) != scope
+
+    def test_sharded_scope_follows_loaded_commits(self):
+        """Test that a shard reloaded at a new commit misses the cached answer"""
+        repos = ["owner/a", "owner/b"]
+        commits = {"a": "c1", "b": "c2"}
+
+        def loader(owner, name):
+            index = ingest.fit_index(DOCS, engine="native")
+            index.commit = commits[name]
+            return index
+
+        manager = shards.ShardManager(repos, loader=loader, memory_budget=1)
+        cache = AnswerCache(directory=None)
+
+        manager.get("a")
+        scope = search_agent.answer_scope(repos, manager=manager)
+        assert manager.versions() == {"owner/a": "c1"}
+        cache.put("How do I install Kafka?", "Use docker", scope=scope)
+        assert cache.get("How do I install Kafka?", search_agent.answer_scope(repos, manager=manager))
+
+        # "b" evicts "a", which then comes back at a new commit
+        manager.get("b")
+        commits["a"] = "c3"
+        manager.get("a")
+        assert manager.versions() == {"owner/a": "c3"}
+        assert cache.get("How do I install Kafka?", search_agent.answer_scope(repos, manager=manager)) is None
+
+    def test_shard_version_without_commit(self):
+        """Test that indexes of unknown commit are versioned by their documents"""
+        index = ingest.fit_index(DOCS, engine="native")
+        assert shards.shard_version(index) == answer_cache.corpus_fingerprint(index)
+        index.commit = "abc"
+        assert shards.shard_version(index) == "abc"
@@ -0,0 +1,139 @@
+"""
+Unit tests for the background event loop runner.
+"""
+
+import os
+import asyncio
+import threading
+from unittest.mock import patch
+
+import pytest
+from pydantic_ai.models.test import TestModel
+
+import ingest
+import search_agent
+from async_runner import AsyncRunner
+
+
+DOCS = [
+    {"filename": "faq/kafka.md", "content": "How to install Kafka with docker"},
+    {"filename": "faq/spark.md", "content": "Spark setup on Windows"},
+]
+
+
+async def where():
+    return asyncio.get_running_loop(), threading.get_ident()
+
+
+class TestAsyncRunner:
+    """Test cases for AsyncRunner"""
+
+    def test_runs_on_one_persistent_loop(self):
+        """Test that every call reuses the same loop and thread"""
+        runner = AsyncRunner()
+        try:
+            first = runner.run(where())
+            second = runner.run(where())
+
+            assert first == second
+            assert first[1] != threading.get_ident()
+            assert runner.stats()["completed"] == 2
+        finally:
+            runner.close()
+
+    def test_callable_from_running_loop(self):
+        """Test submitting from a thread that already runs a loop"""
+        runner = AsyncRunner()
+
+        async def caller():
+            return runner.run(where())
+
+        try:
+            loop, _ = asyncio.run(caller())
+            assert loop is runner.loop
+        finally:
+            runner.close()
+
+    def test_concurrency_cap(self):
+        """Test that no more than max_concurrency coroutines run at once"""
+        runner = AsyncRunner(max_concurrency=2)
+        active = []
+        peak = []
+
+        async def job():
+            active.append(1)
+            peak.append(len(active))
+            await asyncio.sleep(0.02)
+            active.pop()
+
+        try:
+            futures = [runner.submit(job()) for _ in range(6)]
+            for future in futures:
+                future.result()
+
+            assert max(peak) == 2
+            assert runner.stats()["running"] == runner.stats()["waiting"] == 0
+        finally:
+            runner.close()
+
+    def test_timeout_and_errors(self):
+        """Test per-request timeouts and failing coroutines"""
+        runner = AsyncRunner(timeout=0.05)
+
+        async def fail():
+            raise ValueError("boom")
+
+        try:
+            with pytest.raises(TimeoutError):
+                runner.run(asyncio.sleep(1))
+            assert runner.run(asyncio.sleep(0.2, "done"), timeout=5) == "done"
+            with pytest.raises(ValueError):
+                runner.run(fail())
+
+            stats = runner.stats()
+            assert stats["timeouts"] == 1
+            assert stats["errors"] == 1
+        finally:
+            runner.close()
+
+    def test_waiting_for_slot_counts_towards_timeout(self):
+        """Test that a request queued behind a busy slot times out"""
+        runner = AsyncRunner(max_concurrency=1)
+        try:
+            busy = runner.submit(asyncio.sleep(0.3), timeout=5)
+            with pytest.raises(TimeoutError):
+                runner.run(asyncio.sleep(0), timeout=0.05)
+            busy.result()
+        finally:
+            runner.close()
+
+    def test_shared_http_client_closed_with_runner(self):
+        """Test that one HTTP client is shared and closed on shutdown"""
+        runner = AsyncRunner()
+        client = runner.http_client()
+
+        assert runner.http_client() is client
+        runner.close()
+
+        assert client.is_closed
+        assert not runner._thread.is_alive()
+        with pytest.raises(RuntimeError):
+            runner.run(asyncio.sleep(0))
+
+    def test_agent_runs_with_shared_client_model(self):
+        """Test an agent run on the runner and the Gemini model wiring"""
+        runner = AsyncRunner()
+        try:
+            with patch.dict(os.environ, {"GOOGLE_API_KEY": "test-key"}):
+                model = search_agent.google_model(runner.http_client())
+                agent = search_agent.init_agent(
+                    ingest.fit_index(DOCS), "owner", "repo", model=model
+                )
+            assert model.client._api_client._async_httpx_client is runner.http_client()
+
+            result = runner.run(
+                agent.run("How do I install Kafka?", model=TestModel(call_tools=["search"]))
+            )
+            assert result.output
+        finally:
+            runner.close()
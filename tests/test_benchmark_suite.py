@@ -0,0 +1,46 @@
+"""
+Unit tests for the benchmark suite's stage measurements and comparisons.
+"""
+
+from benchmarks import suite
+
+
+def report(**stages):
+    return {
+        "results": [
+            {"pages": 10, "stage": stage, "seconds": seconds, "peak_mb": peak_mb}
+            for stage, (seconds, peak_mb) in stages.items()
+        ]
+    }
+
+
+class TestBenchmarkSuite:
+    """Test cases for benchmarks/suite.py"""
+
+    def test_run_measures_every_stage(self):
+        """Test a small run against a local archive server"""
+        result = suite.run([5], repeat=1, num_queries=3)
+
+        stages = [r["stage"] for r in result["results"]]
+        assert stages == ["read_repo_data", "chunk_documents", "fit", "search"]
+        by_stage = {r["stage"]: r for r in result["results"]}
+        assert by_stage["read_repo_data"]["items"] == 6
+        assert by_stage["search"]["items"] == 3
+        assert all(r["seconds"] > 0 and r["peak_mb"] > 0 for r in result["results"])
+        assert result["meta"]["repeat"] == 1
+
+    def test_compare_thresholds(self):
+        """Test that only growth past the thresholds is a regression"""
+        baseline = report(fit=(1.0, 10.0), search=(0.5, 5.0), chunk_documents=(0.001, 1.0))
+        current = report(fit=(1.4, 10.5), search=(0.8, 6.0), chunk_documents=(0.004, 1.0))
+
+        assert suite.compare(current, baseline) == [
+            (10, "search", "seconds", 0.5, 0.8),
+            (10, "search", "peak_mb", 5.0, 6.0),
+        ]
+        assert suite.compare(current, baseline, threshold=1, memory_threshold=1) == []
+        assert suite.compare(current, baseline, min_seconds=0)[-1][1] == "chunk_documents"
+
+    def test_new_stages_are_not_regressions(self):
+        """Test that stages missing from the baseline are skipped"""
+        assert suite.compare(report(fit=(9.0, 9.0)), report(search=(1.0, 1.0))) == []
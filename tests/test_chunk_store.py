@@ -0,0 +1,86 @@
+"""
+Unit tests for the compact chunk store.
+"""
+
+import pickle
+
+import ingest
+import search_tools
+from chunk_store import Chunk, ChunkStore
+
+
+DOCS = [
+    {"content": "kafka " * 30, "filename": "faq/kafka.md", "title": "Kafka"},
+    {"content": "spark " * 12, "filename": "faq/spark.md", "title": "Spark"},
+    {"content": "", "filename": "faq/empty.md", "title": "Empty"},
+]
+
+
+class TestChunkStore:
+    """Test cases for ChunkStore"""
+
+    def test_matches_chunk_documents(self):
+        """Test that compact chunks equal the sliding window chunks"""
+        expected = ingest.chunk_documents(DOCS, size=50, step=25)
+
+        store = ChunkStore.from_documents(DOCS, size=50, step=25)
+
+        assert len(store) == len(expected)
+        assert [dict(chunk) for chunk in store] == expected
+        assert isinstance(store[0], Chunk)
+        assert store[-1]["filename"] == "faq/spark.md"
+
+    def test_text_and_metadata_stored_once(self):
+        """Test that chunks share document text and metadata"""
+        store = ChunkStore.from_documents(DOCS, size=50, step=25)
+
+        assert len(store.texts) == len(DOCS)
+        assert len(store.metadata) == len(DOCS)
+        assert store.metadata[0] == {"filename": "faq/kafka.md", "title": "Kafka"}
+
+    def test_take_and_extend(self):
+        """Test row selection and appending"""
+        store = ChunkStore.from_documents(DOCS[:1], size=50, step=25)
+        other = ChunkStore.from_documents(DOCS[1:], size=50, step=25)
+
+        taken = store.take([0, 2])
+        assert len(taken.texts) == 1
+        assert [chunk["start"] for chunk in taken] == [0, 50]
+
+        taken.extend(other)
+        assert taken[-1]["filename"] == "faq/spark.md"
+        assert taken[-1]["content"] == DOCS[1]["content"][25:72]
+
+    def test_index_and_search_tool(self):
+        """Test fitting an index on a store and returning plain dicts"""
+        docs = ingest.prepare_documents(
+            DOCS, chunk=True, chunking_params={"size": 50, "step": 25, "compact": True}
+        )
+        index = ingest.fit_index(docs)
+        assert index.docs is docs
+
+        results = search_tools.SearchTool(index).search("spark")
+
+        assert results
+        assert all(type(result) is dict for result in results)
+        assert results[0]["filename"] == "faq/spark.md"
+
+        restored = pickle.loads(pickle.dumps(index))
+        assert isinstance(restored.docs, ChunkStore)
+        assert restored.search("spark")[0]["title"] == "Spark"
+
+    def test_patch_index_keeps_store(self):
+        """Test incremental patching of a compact index"""
+        params = {"size": 50, "step": 25, "compact": True}
+        index = ingest.build_index(DOCS, chunk=True, chunking_params=params)
+
+        new_docs = ingest.prepare_documents(
+            [{"content": "kafka streams " * 5, "filename": "faq/kafka.md"}],
+            chunk=True,
+            chunking_params=params,
+        )
+        ingest.patch_index(index, {"faq/kafka.md"}, new_docs)
+
+        assert isinstance(index.docs, ChunkStore)
+        assert index.text_matrices["content"].shape[0] == len(index.docs)
+        assert index.search("kafka")[0]["content"].startswith("kafka streams")
@@ -0,0 +1,232 @@
+"""
+Unit tests for the embedding cache and hybrid search.
+"""
+
+import pickle
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+
+import ingest
+import embeddings
+from search_tools import HybridIndex, SearchTool
+from search_engine import SearchIndex
+
+
+class FakeEmbedder:
+    """Deterministic embedder mapping words to fixed topic vectors."""
+
+    name = "fake/topics"
+    topics = {
+        "kafka": 0, "streaming": 0, "broker": 0,
+        "docker": 1, "container": 1, "compose": 1,
+        "spark": 2, "pyspark": 2,
+    }
+
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, texts, batch_size=64):
+        self.encoded.append(list(texts))
+        vectors = np.full((len(texts), 4), 0.01, dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                vectors[row, self.topics.get(word.strip(".,?"), 3)] += 1
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    @property
+    def num_encoded(self):
+        return sum(len(batch) for batch in self.encoded)
+
+
+DOCS = [
+    {"filename": "faq/kafka.md", "content": "Running a Kafka broker locally"},
+    {"filename": "faq/docker.md", "content": "Docker compose setup"},
+    {"filename": "faq/spark.md", "content": "Installing Spark on Windows"},
+    {"filename": "faq/stream.md", "content": "Streaming questions"},
+]
+
+
+class TestEmbeddings:
+    """Test cases for embeddings and hybrid search"""
+
+    def test_cache_round_trip(self):
+        """Test that cached vectors are memory-mapped float16 rows by hash"""
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = embeddings.EmbeddingCache(Path(cache_dir) / "model")
+            vectors = np.eye(3, dtype=np.float32)
+            cache.add(["a", "b", "c"], vectors)
+
+            reopened = embeddings.EmbeddingCache(Path(cache_dir) / "model")
+            matrix = reopened.matrix()
+
+            assert len(reopened) == 3
+            assert isinstance(matrix, np.memmap)
+            assert matrix.dtype == np.float16
+            assert list(reopened.lookup(["c", "a"])) == [2, 0]
+            np.testing.assert_array_equal(matrix[reopened.lookup(["b"])[0]], [0, 1, 0])
+
+    def test_cache_ignores_rows_without_keys(self):
+        """Test that vectors from an interrupted write are not addressable"""
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = embeddings.EmbeddingCache(cache_dir)
+            cache.add(["a"], np.ones((1, 2)))
+            with cache.vectors_path.open("ab") as f_out:
+                f_out.write(np.ones((1, 2), dtype=np.float16).tobytes())
+            cache.keys_path.write_text("a\nb\n")
+
+            reopened = embeddings.EmbeddingCache(cache_dir)
+            assert len(reopened) == 2
+            assert "b" in reopened
+
+            cache.keys_path.write_text("a\n")
+            with cache.vectors_path.open("ab") as f_out:
+                f_out.write(np.ones((1, 2), dtype=np.float16).tobytes())
+            assert len(embeddings.EmbeddingCache(cache_dir)) == 1
+
+    def test_cache_appends_after_torn_write(self):
+        """Test that a reopened cache drops a torn write before appending"""
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = embeddings.EmbeddingCache(cache_dir)
+            cache.add(["a"], [[1, 0]])
+            with cache.vectors_path.open("ab") as f_out:
+                f_out.write(np.ones((1, 2), dtype=np.float16).tobytes()[:3])
+            with cache.keys_path.open("a") as f_out:
+                f_out.write("tor")
+
+            reopened = embeddings.EmbeddingCache(cache_dir)
+            assert cache.vectors_path.stat().st_size == 4
+            assert cache.keys_path.read_text() == "a\n"
+            reopened.add(["b"], [[0, 1]])
+            np.testing.assert_array_equal(reopened.matrix()[reopened.lookup(["b"])], [[0, 1]])
+
+    def test_caches_share_directory(self):
+        """Test that two caches appending to one directory keep rows aligned"""
+        with tempfile.TemporaryDirectory() as cache_dir:
+            first = embeddings.EmbeddingCache(cache_dir)
+            second = embeddings.EmbeddingCache(cache_dir)
+            first.add(["a"], [[1, 0, 0]])
+            second.add(["b", "a"], [[0, 1, 0], [1, 0, 0]])
+            first.add(["c"], [[0, 0, 1]])
+
+            for cache in (first, second, embeddings.EmbeddingCache(cache_dir)):
+                rows = cache.lookup(["a", "b"])
+                np.testing.assert_array_equal(cache.matrix()[rows], [[1, 0, 0], [0, 1, 0]])
+            assert list(first.lookup(["a", "b", "c"])) == [0, 1, 2]
+            assert cache.keys_path.read_text() == "a\nb\nc\n"
+
+    def test_update_embeds_only_new_content(self):
+        """Test batching and that unchanged chunks are not re-embedded"""
+        with tempfile.TemporaryDirectory() as cache_dir:
+            embedder = FakeEmbedder()
+            vectors = embeddings.VectorIndex(embedder, cache_dir, batch_size=3)
+
+            assert vectors.update(DOCS + DOCS[:1]) == 4
+            assert [len(batch) for batch in embedder.encoded] == [3, 1]
+
+            changed = DOCS[:3] + [{"filename": "faq/new.md", "content": "PySpark"}]
+            fresh = embeddings.VectorIndex(embedder, cache_dir)
+            assert fresh.update(changed) == 1
+            assert embedder.num_encoded == 5
+            assert len(fresh.doc_rows) == 4
+
+    def test_score_embeds_query_once(self):
+        """Test that scoring is one query embedding over all documents"""
+        with tempfile.TemporaryDirectory() as cache_dir:
+            embedder = FakeEmbedder()
+            vectors = embeddings.VectorIndex(embedder, cache_dir)
+            vectors.update(DOCS)
+            embedder.encoded.clear()
+
+            scores = vectors.score("kafka streaming")
+
+            assert embedder.encoded == [["kafka streaming"]]
+            assert scores.shape == (4,)
+            assert set(np.argsort(-scores)[:2]) == {0, 3}
+
+    def test_score_reads_only_index_rows(self):
+        """Test blockwise scoring of one index's rows in a shared cache"""
+        with tempfile.TemporaryDirectory() as cache_dir:
+            other = embeddings.VectorIndex(FakeEmbedder(), cache_dir)
+            other.update([{"content": f"docker note {i}"} for i in range(50)])
+            vectors = embeddings.VectorIndex(FakeEmbedder(), cache_dir)
+            vectors.update(DOCS)
+            expected = vectors.score_many(["kafka", "spark"])
+
+            read = []
+            matrix = vectors.cache.matrix()
+
+            class Recording:
+                def __getitem__(self, rows):
+                    read.append(len(rows))
+                    return matrix[rows]
+
+            with (
+                patch("embeddings.SCORE_BLOCK_ROWS", 3),
+                patch.object(vectors.cache, "matrix", return_value=Recording()),
+            ):
+                scores = vectors.score_many(["kafka", "spark"])
+
+            assert read == [3, 1]
+            np.testing.assert_allclose(scores, expected)
+            assert scores.shape == (2, 4)
+
+    def test_hybrid_search_blends_text_and_dense_scores(self):
+        """Test that dense similarity surfaces documents without shared terms"""
+        with tempfile.TemporaryDirectory() as cache_dir:
+            for engine in ["minsearch", "native"]:
+                with patch("embeddings.EMBEDDING_CACHE_DIR", Path(cache_dir)):
+                    index = ingest.fit_index(
+                        DOCS, engine=engine, hybrid=True, embedder=FakeEmbedder()
+                    )
+
+                results = index.search("kafka", num_results=2)
+                assert [doc["filename"] for doc in results] == [
+                    "faq/kafka.md",
+                    "faq/stream.md",
+                ]
+
+                text_only = HybridIndex(index.text_index, index.vectors, alpha=0)
+                results = text_only.search("kafka", num_results=1)
+                assert [doc["filename"] for doc in results] == ["faq/kafka.md"]
+
+    def test_hybrid_search_filters(self):
+        """Test keyword filters with a native text index"""
+        with tempfile.TemporaryDirectory() as cache_dir:
+            docs = [{**doc, "section": str(i % 2)} for i, doc in enumerate(DOCS)]
+            text_index = SearchIndex(["content"], keyword_fields=["section"])
+            vectors = embeddings.VectorIndex(FakeEmbedder(), cache_dir)
+            index = HybridIndex(text_index, vectors).fit(docs)
+
+            results = index.search("kafka", filter_dict={"section": "1"})
+
+            assert {doc["section"] for doc in results} == {"1"}
+            assert results[0]["filename"] == "faq/stream.md"
+
+    def test_hybrid_index_pickles_without_vectors(self):
+        """Test that snapshots reference the on-disk cache instead of copying it"""
+        with tempfile.TemporaryDirectory() as cache_dir:
+            vectors = embeddings.VectorIndex(FakeEmbedder(), cache_dir)
+            index = HybridIndex(SearchIndex(["content"]), vectors).fit(DOCS)
+            index.search("docker")
+
+            restored = pickle.loads(pickle.dumps(index))
+
+            assert restored.vectors.cache._matrix is None
+            assert SearchTool(restored).search("container")[0]["filename"] == "faq/docker.md"
+
+    def test_patch_hybrid_index(self):
+        """Test that incremental patches embed only the new documents"""
+        with tempfile.TemporaryDirectory() as cache_dir:
+            embedder = FakeEmbedder()
+            vectors = embeddings.VectorIndex(embedder, cache_dir)
+            index = HybridIndex(SearchIndex(["content", "filename"]), vectors).fit(DOCS)
+
+            new_docs = [{"filename": "faq/kafka.md", "content": "Kafka broker on Docker"}]
+            ingest.patch_index(index, {"faq/kafka.md"}, new_docs)
+
+            assert embedder.num_encoded == 5
+            assert len(index.vectors.doc_rows) == len(index.docs) == 4
+            assert index.search("kafka")[0]["content"] == new_docs[0]["content"]
@@ -185,3 +185,118 @@ class TestEvaluationRunner:
         assert "dataframe" in results
         assert "analysis" in results
         mock_generate.assert_called_once_with(faq_data, num_samples=1)
+
+
+FAQ_DOCS = [
+    {
+        "filename": "faq/kafka.md",
+        "question": "How do I install Kafka?",
+        "content": "Install Kafka with docker compose up",
+    },
+    {
+        "filename": "faq/spark.md",
+        "question": "How do I run Spark on Windows?",
+        "content": "Run Spark on Windows with WSL",
+    },
+    {
+        "filename": "faq/python.md",
+        "question": "Which Python version do I need?",
+        "content": "Python 3.13 is required",
+    },
+]
+
+
+def offline_agent(model=None):
+    import os
+    import ingest
+    import search_agent
+
+    with patch.dict(os.environ, {"GOOGLE_API_KEY": "test-key"}):
+        index = ingest.fit_index(FAQ_DOCS)
+        return search_agent.init_agent(index, "owner", "repo", model=model)
+
+
+class TestOfflineEvaluation:
+    """Test cases for concurrent evaluation with the stand-in model"""
+
+    def test_stand_in_model_run(self):
+        """Test a full offline evaluation of the real agent"""
+        from src.evaluation import generate_test_questions, stand_in_model
+
+        agent = offline_agent(stand_in_model("owner/repo"))
+        questions = generate_test_questions(FAQ_DOCS, num_samples=3)
+        results = run_agent_evaluation(agent, questions, concurrency=2)
+
+        assert [r["question"] for r in results] == [q["question"] for q in questions]
+        for result in results:
+            assert result["error"] is None
+            assert result["num_tool_calls"] == 1
+            assert result["retrieval_hit"] is True
+            assert result["latency_s"] > 0
+            assert "https://github.com/owner/repo/blob/main/faq/" in result["response"]
+            assert all(check.check_pass for check in result["evaluation"].checklist)
+
+        analysis = analyze_evaluation_results(create_evaluation_dataframe(results))
+        assert analysis["retrieval_hit_rate"] == 1.0
+        assert analysis["average_pass_rate"] == 1.0
+        assert analysis["avg_tool_calls"] == 1.0
+
+    def test_concurrency_is_bounded(self):
+        """Test that at most `concurrency` questions run at once"""
+        import asyncio
+        from pydantic_ai.messages import ModelResponse, TextPart
+        from pydantic_ai.models.function import FunctionModel
+
+        running, peak = [0], [0]
+
+        async def slow(messages, info):
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+            await asyncio.sleep(0.01)
+            running[0] -= 1
+            return ModelResponse(parts=[TextPart("answer")])
+
+        agent = offline_agent()
+        model = FunctionModel(slow)
+        results = run_agent_evaluation(agent, ["q"] * 20, concurrency=4, model=model)
+
+        assert [r["response"] for r in results] == ["answer"] * 20
+        assert peak[0] == 4
+
+    def test_errors_are_recorded(self):
+        """Test that a failing question does not stop the others"""
+        from pydantic_ai.messages import ModelResponse, TextPart
+        from pydantic_ai.models.function import FunctionModel
+
+        def flaky(messages, info):
+            if "fail" in messages[0].parts[-1].content:
+                raise RuntimeError("quota")
+            return ModelResponse(parts=[TextPart("ok")])
+
+        results = run_agent_evaluation(
+            offline_agent(), ["fine", "fail", "fine"], model=FunctionModel(flaky)
+        )
+
+        assert [r["error"] for r in results] == [None, "RuntimeError: quota", None]
+        df = create_evaluation_dataframe(results)
+        analysis = analyze_evaluation_results(df)
+        assert analysis["error_rate"] == 1 / 3
+        assert analysis["tool_usage_rate"] == 0.0
+        assert analysis["check_pass_rates"]["has_citation"] == 0.0
+
+    def test_search_quality_of_index(self):
+        """Test retrieval metrics of the search tool on FAQ questions"""
+        import ingest
+        from search_tools import QueryCache, SearchTool
+        from src.evaluation import generate_test_questions
+
+        tool = SearchTool(ingest.fit_index(FAQ_DOCS), cache=QueryCache(max_size=0))
+        queries = [
+            {"query": q["question"], "expected_docs": q["expected_docs"]}
+            for q in generate_test_questions(FAQ_DOCS)
+        ]
+
+        metrics = evaluate_search_quality(tool.search, queries)["aggregate_metrics"]
+        assert metrics["hit_rate"] == 1.0
+        assert metrics["mrr"] == 1.0
+        assert metrics["num_errors"] == 0
@@ -0,0 +1,206 @@
+"""
+Unit tests for index snapshot caching.
+"""
+
+import io
+import os
+import pickle
+import zipfile
+import tempfile
+from pathlib import Path
+from contextlib import contextmanager
+from unittest.mock import patch, MagicMock
+
+import ingest
+import index_cache
+
+
+FILES = {
+    "faq/kafka.md": "How to install Kafka with docker",
+    "faq/spark.md": "Spark setup on Windows",
+}
+
+
+def archive_opener(files):
+    """Stand-in for ingest.open_repo_archive serving `files`."""
+    calls = MagicMock()
+
+    @contextmanager
+    def open_repo_archive(*args, **kwargs):
+        calls(*args, **kwargs)
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as zf:
+            for name, content in files.items():
+                zf.writestr(f"repo-sha/{name}", content)
+        buffer.seek(0)
+        with zipfile.ZipFile(buffer) as zf:
+            yield zf
+
+    open_repo_archive.calls = calls
+    return open_repo_archive
+
+
+class TestIndexCache:
+    """Test cases for index snapshots"""
+
+    def test_params_digest_depends_on_params(self):
+        """Test that filter and chunking parameters change the key"""
+        base = index_cache.params_digest()
+
+        assert base == index_cache.params_digest()
+        assert base != index_cache.params_digest(filter=lambda doc: True)
+        assert base != index_cache.params_digest(
+            chunk=True, chunking_params={"size": 2000, "step": 1000}
+        )
+        assert index_cache.params_digest(
+            chunk=True, chunking_params={"size": 2000, "step": 1000}
+        ) != index_cache.params_digest(
+            chunk=True, chunking_params={"size": 1000, "step": 500}
+        )
+
+    def test_snapshot_written_and_reused(self):
+        """Test that a cache hit skips download and commit lookup"""
+        with tempfile.TemporaryDirectory() as cache_dir:
+            opener = archive_opener(FILES)
+            with (
+                patch("ingest.open_repo_archive", opener),
+                patch("index_cache.resolve_commit", return_value="abc123"),
+            ):
+                index = ingest.index_data("owner", "repo", cache_dir=cache_dir)
+                assert opener.calls.call_count == 1
+                assert opener.calls.call_args.kwargs["commit"] == "abc123"
+
+            snapshots = list(Path(cache_dir).rglob("*-abc123.pkl"))
+            assert len(snapshots) == 1
+
+            with (
+                patch("ingest.open_repo_archive") as mock_open,
+                patch("index_cache.resolve_commit") as mock_resolve,
+            ):
+                cached = ingest.index_data("owner", "repo", cache_dir=cache_dir)
+                mock_open.assert_not_called()
+                mock_resolve.assert_not_called()
+
+            assert len(cached.docs) == len(index.docs)
+            assert cached.search("kafka")[0]["filename"] == "faq/kafka.md"
+            assert index.commit == cached.commit == "abc123"
+
+    def test_stale_snapshot_checks_commit(self):
+        """Test that an expired snapshot is reused only for the same commit"""
+        with tempfile.TemporaryDirectory() as cache_dir:
+            with (
+                patch("ingest.open_repo_archive", archive_opener(FILES)),
+                patch("index_cache.resolve_commit", return_value="abc123"),
+            ):
+                ingest.index_data("owner", "repo", cache_dir=cache_dir)
+
+            with (
+                patch("ingest.open_repo_archive") as mock_open,
+                patch("index_cache.resolve_commit", return_value="abc123"),
+            ):
+                ingest.index_data("owner", "repo", cache_dir=cache_dir, cache_ttl=0)
+                mock_open.assert_not_called()
+
+            opener = archive_opener(FILES)
+            with (
+                patch("ingest.open_repo_archive", opener),
+                patch("index_cache.resolve_commit", return_value="def456"),
+            ):
+                ingest.index_data("owner", "repo", cache_dir=cache_dir, cache_ttl=0)
+                assert opener.calls.call_count == 1
+
+            snapshots = list(Path(cache_dir).rglob("*.pkl"))
+            assert [path.name.split("-")[-1] for path in snapshots] == ["def456.pkl"]
+
+    def test_offline_uses_latest_snapshot(self):
+        """Test that the newest snapshot is used when GitHub is unreachable"""
+        with tempfile.TemporaryDirectory() as cache_dir:
+            with (
+                patch("ingest.open_repo_archive", archive_opener(FILES)),
+                patch("index_cache.resolve_commit", return_value="abc123"),
+            ):
+                ingest.index_data("owner", "repo", cache_dir=cache_dir)
+
+            with (
+                patch("ingest.read_repo_data") as mock_read,
+                patch("index_cache.resolve_commit", return_value=None),
+            ):
+                index = ingest.index_data(
+                    "owner", "repo", cache_dir=cache_dir, cache_ttl=0
+                )
+                mock_read.assert_not_called()
+
+            assert len(index.docs) == 2
+            assert index.commit == "abc123"
+
+    def test_load_snapshot_rejects_other_versions(self):
+        """Test that snapshots from another format version are ignored"""
+        with tempfile.TemporaryDirectory() as cache_dir:
+            path = Path(cache_dir) / "snapshot.pkl"
+            with path.open("wb") as f_out:
+                pickle.dump({"version": -1, "index": None}, f_out)
+
+            assert index_cache.load_snapshot(path) is None
+            assert index_cache.load_snapshot(Path(cache_dir) / "missing.pkl") is None
+
+    def test_save_snapshot_leaves_no_temp_files(self):
+        """Test that snapshots are written atomically"""
+        with tempfile.TemporaryDirectory() as cache_dir:
+            path = Path(cache_dir) / "a" / "snapshot.pkl"
+            index_cache.save_snapshot(path, {"docs": []}, commit="abc123")
+
+            assert os.listdir(path.parent) == ["snapshot.pkl"]
+            assert index_cache.load_snapshot(path)["commit"] == "abc123"
+
+    def test_incremental_update_patches_changed_files(self):
+        """Test that a new commit re-parses only changed files"""
+        files = {f"faq/page{i}.md": f"page {i} about docker" for i in range(20)}
+        files["faq/kafka.md"] = "How to install Kafka"
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            with (
+                patch("ingest.open_repo_archive", archive_opener(files)),
+                patch("index_cache.resolve_commit", return_value="abc123"),
+            ):
+                ingest.index_data("owner", "repo", cache_dir=cache_dir)
+
+            updated = dict(files)
+            updated["faq/kafka.md"] = "How to install Kafka and docker compose"
+            updated["faq/new.md"] = "New answer about spark"
+            del updated["faq/page0.md"]
+
+            with (
+                patch("ingest.open_repo_archive", archive_opener(updated)),
+                patch("index_cache.resolve_commit", return_value="def456"),
+                patch("ingest.parse_zip_entry", wraps=ingest.parse_zip_entry) as parse,
+                patch("minsearch.Index.fit") as fit,
+            ):
+                index = ingest.index_data(
+                    "owner", "repo", cache_dir=cache_dir, cache_ttl=0
+                )
+                fit.assert_not_called()
+
+            parsed = sorted(call.args[1].filename for call in parse.call_args_list)
+            assert parsed == ["repo-sha/faq/kafka.md", "repo-sha/faq/new.md"]
+
+            filenames = sorted(doc["filename"] for doc in index.docs)
+            assert filenames == sorted(updated)
+            assert index.search("kafka")[0]["content"] == updated["faq/kafka.md"]
+            assert index.text_matrices["content"].shape[0] == len(updated)
+
+            snapshot = index_cache.load_snapshot(
+                next(Path(cache_dir).rglob("*-def456.pkl"))
+            )
+            assert snapshot["manifest"].keys() == updated.keys()
+            assert snapshot["stale_files"] == 3
+
+    def test_diff_manifests(self):
+        """Test manifest comparison"""
+        old = {"a.md": "1", "b.md": "2", "c.md": "3"}
+        new = {"a.md": "1", "b.md": "9", "d.md": "4"}
+
+        added, modified, deleted = ingest.diff_manifests(old, new)
+
+        assert added == {"d.md"}
+        assert modified == {"b.md"}
+        assert deleted == {"c.md"}
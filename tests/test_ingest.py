@@ -0,0 +1,211 @@
+"""
+Unit tests for repository ingestion.
+"""
+
+import io
+import types
+import zipfile
+from unittest.mock import patch, MagicMock
+
+import ingest
+
+
+def make_archive(files):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        for name, content in files.items():
+            zf.writestr(f"repo-main/{name}", content)
+    return buffer.getvalue()
+
+
+def fake_response(payload, block_size=7):
+    resp = MagicMock()
+    resp.__enter__.return_value = resp
+    resp.iter_content.side_effect = lambda chunk_size: (
+        payload[i : i + block_size] for i in range(0, len(payload), block_size)
+    )
+    return resp
+
+
+def not_spark(doc):
+    return "spark" not in doc["filename"]
+
+
+FILES = {
+    "docs/kafka.md": "---\ntitle: Kafka\n---\nRun Kafka with docker compose.",
+    "docs/spark.mdx": "Spark needs Java 11.",
+    "src/main.py": "print('skip me')",
+}
+
+
+class TestIngest:
+    """Test cases for ingestion"""
+
+    @patch("ingest.requests.get")
+    def test_read_repo_data(self, mock_get):
+        """Test that markdown files are parsed with frontmatter"""
+        mock_get.return_value = fake_response(make_archive(FILES))
+
+        docs = ingest.read_repo_data("owner", "repo")
+
+        assert isinstance(docs, list)
+        assert [doc["filename"] for doc in docs] == ["docs/kafka.md", "docs/spark.mdx"]
+        assert docs[0]["title"] == "Kafka"
+        assert docs[0]["content"] == "Run Kafka with docker compose."
+        assert mock_get.call_args.kwargs["stream"] is True
+
+    @patch("ingest.requests.get")
+    def test_read_repo_data_stream(self, mock_get):
+        """Test that stream mode yields documents lazily"""
+        mock_get.return_value = fake_response(make_archive(FILES))
+
+        docs = ingest.read_repo_data("owner", "repo", stream=True)
+
+        assert isinstance(docs, types.GeneratorType)
+        mock_get.assert_not_called()
+        assert next(docs)["filename"] == "docs/kafka.md"
+        assert [doc["filename"] for doc in docs] == ["docs/spark.mdx"]
+
+    def test_archive_url(self):
+        """Test archive URLs for branches and pinned commits"""
+        assert ingest.archive_url("o", "r").endswith("/o/r/zip/refs/heads/main")
+        assert ingest.archive_url("o", "r", commit="abc").endswith("/o/r/zip/abc")
+
+    def test_build_index_from_generator(self):
+        """Test that build_index consumes a lazy iterable"""
+        docs = (
+            {"content": f"document number {i} about kafka", "filename": f"{i}.md"}
+            for i in range(5)
+        )
+
+        index = ingest.build_index(
+            docs,
+            filter=lambda doc: doc["filename"] != "0.md",
+            chunk=True,
+            chunking_params={"size": 10, "step": 5},
+        )
+
+        filenames = {doc["filename"] for doc in index.docs}
+        assert filenames == {"1.md", "2.md", "3.md", "4.md"}
+        assert all(len(doc["content"]) <= 10 for doc in index.docs)
+
+    def test_chunk_documents(self):
+        """Test that chunks carry document metadata"""
+        docs = [{"content": "a" * 25, "filename": "a.md", "title": "A"}]
+
+        chunks = ingest.chunk_documents(docs, size=10, step=5)
+
+        assert [chunk["start"] for chunk in chunks] == [0, 5, 10, 15, 20]
+        assert all(chunk["title"] == "A" for chunk in chunks)
+        assert "content" in docs[0]
+
+    def test_load_archive_docs_parallel(self):
+        """Test that parallel ingestion matches serial output and order"""
+        files = {
+            f"docs/page{i:02d}.md": f"---\nid: {i}\n---\n" + f"word{i} " * 30
+            for i in range(25)
+        }
+        files["docs/spark.md"] = "Spark needs Java 11."
+        params = {"chunk": True, "chunking_params": {"size": 50, "step": 25}}
+
+        with zipfile.ZipFile(io.BytesIO(make_archive(files))) as zf:
+            serial = list(ingest.load_archive_docs(zf, filter=not_spark, **params))
+            parallel = list(
+                ingest.load_archive_docs(
+                    zf, filter=not_spark, workers=2, batch_size=3, **params
+                )
+            )
+            local_filter = list(
+                ingest.load_archive_docs(
+                    zf,
+                    filter=lambda doc: "spark" not in doc["filename"],
+                    workers=2,
+                    batch_size=4,
+                    **params,
+                )
+            )
+
+        assert len(serial) > len(files)
+        assert parallel == serial
+        assert local_filter == serial
+        assert all(doc["filename"] != "docs/spark.md" for doc in serial)
+
+    def test_markdown_chunks(self):
+        """Test header and paragraph aware chunking"""
+        text = (
+            "# Guide\n\nIntro.\n\n## Setup\n\nFirst step.\n\nSecond step.\n\n"
+            "```bash\n# comment, not a header\n\necho hi\n```\n\n"
+            "### Docker\n\n" + "word " * 30
+        )
+        docs = [{"content": text, "filename": "guide.md"}]
+
+        chunks = list(
+            ingest.prepare_documents(
+                docs,
+                chunk=True,
+                chunking_params={"method": "markdown", "max_size": 60},
+            )
+        )
+
+        assert [chunk["section"] for chunk in chunks] == [
+            "Guide",
+            "Guide > Setup",
+            "Guide > Setup",
+            "Guide > Setup > Docker",
+            "Guide > Setup > Docker",
+            "Guide > Setup > Docker",
+            "Guide > Setup > Docker",
+        ]
+        assert chunks[1]["content"] == "## Setup\n\nFirst step.\n\nSecond step."
+        assert chunks[2]["content"].startswith("```bash\n# comment")
+        assert all(len(chunk["content"]) <= 60 for chunk in chunks)
+        assert all(
+            text[chunk["start"] :].startswith(chunk["content"]) for chunk in chunks
+        )
+
+        compact = ingest.prepare_documents(
+            docs,
+            chunk=True,
+            chunking_params={"method": "markdown", "max_size": 60, "compact": True},
+        )
+        assert [dict(chunk) for chunk in compact] == chunks
+
+    def test_default_chunking_params(self):
+        """Test that chunking without parameters uses the default windows"""
+        docs = [{"filename": "faq/long.md", "content": "x" * 5000}]
+        chunks = list(ingest.prepare_documents(docs, chunk=True))
+        assert [chunk["start"] for chunk in chunks] == [0, 1000, 2000, 3000, 4000]
+
+        buffer = io.BytesIO(make_archive(FILES))
+        with zipfile.ZipFile(buffer) as zf:
+            for workers in (1, 2):
+                loaded = list(ingest.load_archive_docs(zf, chunk=True, workers=workers))
+                assert {chunk["filename"] for chunk in loaded} >= {"docs/kafka.md"}
+
+    def test_unknown_chunking_method(self):
+        """Test that an unknown chunker is rejected"""
+        try:
+            ingest.prepare_documents(
+                [], chunk=True, chunking_params={"method": "sentences"}
+            )
+        except ValueError as e:
+            assert "sentences" in str(e)
+        else:
+            raise AssertionError("ValueError not raised")
+
+    def test_patch_refits_unknown_minsearch(self):
+        """Test that patching falls back to a full fit without the expected internals"""
+        docs = [
+            {"filename": "faq/kafka.md", "content": "Run Kafka with docker compose"},
+            {"filename": "faq/spark.md", "content": "Spark needs Java"},
+        ]
+        index = ingest.fit_index(docs, engine="minsearch")
+
+        new_doc = {"filename": "faq/kafka.md", "content": "Kafka runs on Kubernetes"}
+        # As if a minsearch release had renamed one of them
+        with patch("ingest.MINSEARCH_INTERNALS", ("text_matrices", "renamed_vectorizers")):
+            ingest.patch_index(index, {"faq/kafka.md"}, [new_doc])
+
+        assert len(index.docs) == 2
+        assert index.version == 1
+        assert index.search("kubernetes", num_results=1)[0]["filename"] == "faq/kafka.md"
@@ -0,0 +1,257 @@
+"""
+Unit tests for the columnar interaction log store.
+"""
+
+import gzip
+import importlib.util
+import json
+import tempfile
+from pathlib import Path
+
+import pytest
+
+import logs
+import log_store
+
+
+def agent_entry(prompt, tools, start, end, input_tokens=10, output_tokens=5):
+    """An entry shaped like `logs.log_entry` output for a pydantic-ai run."""
+    return {
+        "agent_name": "gitsensei",
+        "provider": "google-gla",
+        "model": "gemini-2.0-flash",
+        "source": "user",
+        "messages": [
+            {
+                "kind": "request",
+                "parts": [
+                    {"part_kind": "user-prompt", "content": prompt, "timestamp": start}
+                ],
+            },
+            {
+                "kind": "response",
+                "parts": [{"part_kind": "tool-call", "tool_name": tool} for tool in tools],
+                "usage": {"input_tokens": input_tokens, "output_tokens": output_tokens},
+                "timestamp": start,
+            },
+            {
+                "kind": "response",
+                "parts": [{"part_kind": "text", "content": "Use docker"}],
+                "usage": {"input_tokens": input_tokens, "output_tokens": output_tokens},
+                "timestamp": end,
+            },
+        ],
+        "timestamp": end,
+    }
+
+
+def web_entry(prompt, timestamp, latency):
+    """An entry shaped like the ones app.py logs."""
+    return {
+        "agent_name": "gitsensei_web",
+        "model": "gemini-2.0-flash",
+        "messages": [
+            {"role": "user", "content": prompt, "timestamp": timestamp},
+            {"role": "assistant", "content": "Sure", "timestamp": timestamp},
+        ],
+        "latency_s": latency,
+        "timestamp": timestamp,
+    }
+
+
+def write_jsonl(path, entries, mode="w"):
+    with open(path, mode, encoding="utf-8") as f_out:
+        for entry in entries:
+            f_out.write(json.dumps(entry) + "\n")
+
+
+class TestLogStore:
+    """Test cases for log compaction and the LogStore query API"""
+
+    def test_extract_agent_record(self):
+        """Test flattening of a pydantic-ai message history"""
+        entry = agent_entry(
+            "How do I install Kafka?",
+            ["search", "search_many"],
+            "2025-01-02T03:04:05Z",
+            "2025-01-02T03:04:07.500000Z",
+        )
+
+        record = log_store.extract_record(entry)
+
+        assert record["user_prompt"] == "How do I install Kafka?"
+        assert record["response"] == "Use docker"
+        assert record["tools_called"] == "search;search_many"
+        assert record["num_tool_calls"] == 2
+        assert record["input_tokens"] == 20
+        assert record["output_tokens"] == 10
+        assert record["latency_s"] == 2.5
+        assert record["model"] == "gemini-2.0-flash"
+
+    def test_extract_web_record(self):
+        """Test that the measured latency of app.py entries is kept"""
+        record = log_store.extract_record(
+            web_entry("Spark on Windows?", "2025-01-02T03:04:05", 1.25)
+        )
+
+        assert record["user_prompt"] == "Spark on Windows?"
+        assert record["response"] == "Sure"
+        assert record["latency_s"] == 1.25
+        assert record["num_tool_calls"] == 0
+
+    def test_compact_is_incremental(self):
+        """Test that each logged interaction is compacted exactly once"""
+        formats = ["csv"]
+        if importlib.util.find_spec("pyarrow") is not None:
+            formats.append("parquet")
+        for format in formats:
+            with (
+                tempfile.TemporaryDirectory() as log_dir,
+                tempfile.TemporaryDirectory() as store_dir,
+            ):
+                segment = Path(log_dir) / "interactions_1.jsonl"
+                write_jsonl(segment, [web_entry("a", "2025-01-01T10:00:00", 1.0)])
+                with segment.open("a") as f_out:
+                    f_out.write('{"partial": ')
+
+                first = log_store.compact(log_dir, store_dir, format=format)
+                assert first.suffix == log_store.SUFFIXES[format]
+
+                with segment.open("a") as f_out:
+                    f_out.write('"line"}\n')
+                write_jsonl(segment, [web_entry("b", "2025-01-01T11:00:00", 2.0)], mode="a")
+                with gzip.open(Path(log_dir) / "interactions_0.jsonl.gz", "wt") as f_out:
+                    f_out.write(json.dumps(web_entry("c", "2025-01-01T09:00:00", 3.0)) + "\n")
+                legacy = Path(log_dir) / "gitsensei_20250101_080000_abc123.json"
+                legacy.write_text(json.dumps(web_entry("d", "2025-01-01T08:00:00", 4.0)))
+
+                assert log_store.compact(log_dir, store_dir, format=format) is not None
+                assert log_store.compact(log_dir, store_dir, format=format) is None
+
+                df = log_store.LogStore(store_dir).load()
+                assert list(df.columns) == log_store.COLUMNS
+                assert sorted(df["user_prompt"].dropna()) == ["a", "b", "c", "d"]
+                assert len(df) == 5
+                assert df["latency_s"].sum() == 10.0
+
+    def test_compact_skips_corrupt_input(self):
+        """Test that malformed lines and damaged files are skipped and counted"""
+        with (
+            tempfile.TemporaryDirectory() as log_dir,
+            tempfile.TemporaryDirectory() as store_dir,
+        ):
+            segment = Path(log_dir) / "interactions_2.jsonl"
+            write_jsonl(segment, [web_entry("a", "2025-01-01T10:00:00", 1.0)])
+            with segment.open("a") as f_out:
+                f_out.write('{"torn": \n[1, 2]\n')
+            write_jsonl(segment, [web_entry("b", "2025-01-01T11:00:00", 2.0)], mode="a")
+
+            lines = "".join(
+                json.dumps(web_entry(prompt, "2025-01-01T09:00:00", 3.0)) + "\n"
+                for prompt in ["c", "d"]
+            )
+            truncated = Path(log_dir) / "interactions_1.jsonl.gz"
+            truncated.write_bytes(gzip.compress(lines.encode())[:-8])
+            (Path(log_dir) / "gitsensei_20250101_080000_abc123.json").write_text('{"agent')
+
+            stats = {}
+            assert log_store.compact(log_dir, store_dir, format="csv", stats=stats) is not None
+            assert stats == {"records": 4, "bad_lines": 2, "bad_files": 2}
+
+            df = log_store.LogStore(store_dir).load()
+            assert sorted(df["user_prompt"]) == ["a", "b", "c", "d"]
+
+            assert log_store.compact(log_dir, store_dir, format="csv", stats=stats) is None
+            assert stats == {"records": 0, "bad_lines": 0, "bad_files": 0}
+
+    def test_rotated_segment_not_compacted_twice(self):
+        """Test that gzipping a partly compacted segment adds only the rest"""
+        with (
+            tempfile.TemporaryDirectory() as log_dir,
+            tempfile.TemporaryDirectory() as store_dir,
+        ):
+            logger = logs.BackgroundLogger(log_dir, compress=True)
+            logger.log(web_entry("a", "2025-01-01T10:00:00", 1.0))
+            logger.flush()
+            log_store.compact(log_dir, store_dir, format="csv")
+
+            logger.log(web_entry("b", "2025-01-01T11:00:00", 2.0))
+            logger.close()
+            assert [p.suffix for p in Path(log_dir).iterdir()] == [".gz"]
+            log_store.compact(log_dir, store_dir, format="csv")
+
+            df = log_store.LogStore(store_dir).load(["user_prompt"])
+            assert sorted(df["user_prompt"]) == ["a", "b"]
+
+    def test_aggregations(self):
+        """Test latency percentiles, top queries, tokens and tools"""
+        with (
+            tempfile.TemporaryDirectory() as log_dir,
+            tempfile.TemporaryDirectory() as store_dir,
+        ):
+            entries = [
+                web_entry("Install Kafka", f"2025-01-01T10:00:{i:02d}", float(i))
+                for i in range(1, 21)
+            ]
+            entries += [
+                web_entry("install  kafka", "2025-01-02T10:00:00", 7.0),
+                web_entry("Spark setup", "2025-01-02T11:00:00", 3.0),
+                agent_entry(
+                    "Spark setup",
+                    ["search", "search"],
+                    "2025-01-02T12:00:00",
+                    "2025-01-02T12:00:01",
+                ),
+            ]
+            write_jsonl(Path(log_dir) / "interactions_1.jsonl", entries)
+            log_store.compact(log_dir, store_dir, format="csv")
+            store = log_store.LogStore(store_dir)
+
+            p95 = store.latency_percentile(0.95)
+            assert p95.iloc[0] == pytest.approx(19.05)
+            assert p95.iloc[1] == pytest.approx(6.6)
+
+            top = store.top_queries(2)
+            assert top.to_dict() == {"install kafka": 21, "spark setup": 2}
+
+            tokens = store.token_usage()
+            assert tokens["input_tokens"].tolist() == [0, 20]
+            assert store.tool_usage().to_dict() == {"search": 2}
+            assert store.model_usage().to_dict() == {"gemini-2.0-flash": 23}
+
+    def test_load_cache_follows_new_parts(self):
+        """Test that cached columns are reloaded after a new compaction"""
+        with (
+            tempfile.TemporaryDirectory() as log_dir,
+            tempfile.TemporaryDirectory() as store_dir,
+        ):
+            store = log_store.LogStore(store_dir)
+            assert len(store.load()) == 0
+
+            write_jsonl(
+                Path(log_dir) / "interactions_1.jsonl",
+                [web_entry("a", "2025-01-01T10:00:00", 1.0)],
+            )
+            log_store.compact(log_dir, store_dir, format="csv")
+
+            assert store.load(["user_prompt"])["user_prompt"].tolist() == ["a"]
+
+    def test_logged_latency_reaches_store(self):
+        """Test the path from log_interaction_to_file to the store"""
+        with (
+            tempfile.TemporaryDirectory() as log_dir,
+            tempfile.TemporaryDirectory() as store_dir,
+        ):
+            logger = logs.BackgroundLogger(log_dir)
+            logger.log(
+                {
+                    **web_entry("Kafka?", "2025-01-01T10:00:00", None),
+                    "latency_s": 0.75,
+                }
+            )
+            logger.close()
+
+            log_store.compact(log_dir, store_dir, format="csv")
+
+            df = log_store.LogStore(store_dir).load(["latency_s"])
+            assert df["latency_s"].tolist() == [0.75]
@@ -0,0 +1,137 @@
+"""
+Unit tests for interaction logging.
+"""
+
+import gzip
+import json
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+
+import logs
+
+
+def read_entries(directory):
+    entries = []
+    for path in sorted(Path(directory).iterdir()):
+        opener = gzip.open if path.suffix == ".gz" else open
+        with opener(path, "rt", encoding="utf-8") as f_in:
+            entries.extend(json.loads(line) for line in f_in)
+    return entries
+
+
+class TestLogs:
+    """Test cases for the background interaction logger"""
+
+    def test_entries_written_in_batches(self):
+        """Test that queued entries end up as JSONL lines in one segment"""
+        with tempfile.TemporaryDirectory() as log_dir:
+            logger = logs.BackgroundLogger(log_dir, batch_size=50)
+            for i in range(120):
+                assert logger.log({"i": i})
+            logger.close()
+
+            assert [entry["i"] for entry in read_entries(log_dir)] == list(range(120))
+            stats = logger.stats()
+            assert stats["written"] == 120
+            assert stats["queue_depth"] == 0
+            assert stats["segments"] == 1
+            assert 3 <= stats["batches"] <= 120
+
+    def test_size_rotation_and_compression(self):
+        """Test that full segments are closed and gzipped"""
+        with tempfile.TemporaryDirectory() as log_dir:
+            logger = logs.BackgroundLogger(
+                log_dir, max_bytes=200, compress=True, batch_size=5
+            )
+            for i in range(40):
+                logger.log({"i": i, "text": "x" * 20})
+                logger.flush()
+            logger.close()
+
+            paths = list(Path(log_dir).iterdir())
+            assert len(paths) == logger.stats()["segments"] > 1
+            assert all(path.name.endswith(".jsonl.gz") for path in paths)
+            assert [entry["i"] for entry in read_entries(log_dir)] == list(range(40))
+
+    def test_time_rotation(self):
+        """Test that old segments are rotated"""
+        with tempfile.TemporaryDirectory() as log_dir:
+            logger = logs.BackgroundLogger(log_dir, max_age=0)
+            logger.log({"i": 1})
+            logger.flush()
+            logger.log({"i": 2})
+            logger.close()
+
+            assert len(list(Path(log_dir).iterdir())) == 2
+
+    def test_full_queue_drops_without_blocking(self):
+        """Test that a full queue drops entries and counts them"""
+        with tempfile.TemporaryDirectory() as log_dir:
+            logger = logs.BackgroundLogger(log_dir, queue_size=2)
+            with patch.object(logger, "_ensure_started"):
+                results = [logger.log({"i": i}) for i in range(5)]
+
+            assert results == [True, True, False, False, False]
+            assert logger.stats()["dropped"] == 3
+            assert logger.stats()["queue_depth"] == 2
+
+            logger._thread = None
+            logger._ensure_started()
+            logger.close()
+            assert [entry["i"] for entry in read_entries(log_dir)] == [0, 1]
+
+    def test_log_after_close_is_dropped(self):
+        """Test that closing twice is safe and later entries are counted"""
+        with tempfile.TemporaryDirectory() as log_dir:
+            logger = logs.BackgroundLogger(log_dir)
+            logger.log({"i": 1})
+            logger.close()
+            logger.close()
+
+            assert not logger.log({"i": 2})
+            assert logger.stats()["dropped"] == 1
+            assert len(read_entries(log_dir)) == 1
+
+    def test_write_errors_are_counted(self):
+        """Test that an unserializable entry is skipped without losing its batch"""
+        with tempfile.TemporaryDirectory() as log_dir:
+            logger = logs.BackgroundLogger(log_dir)
+            with patch.object(logger, "_ensure_started"):
+                logger.log({"i": 0})
+                logger.log({"bad": object()})
+                logger.log({"i": 1})
+            logger._ensure_started()
+            logger.close()
+
+            assert logger.stats()["errors"] == 1
+            assert logger.stats()["batches"] == 1
+            assert logger.stats()["written"] == 2
+            assert read_entries(log_dir) == [{"i": 0}, {"i": 1}]
+
+    def test_log_interaction_to_file_formats(self):
+        """Test the queued JSONL default and the per-file JSON format"""
+        with tempfile.TemporaryDirectory() as log_dir:
+            logger = logs.BackgroundLogger(Path(log_dir) / "jsonl")
+            kwargs = {
+                "agent_name": "gitsensei_web",
+                "user_prompt": "How do I install Kafka?",
+                "agent_response": "Use docker",
+                "timestamp": "2025-01-02T03:04:05",
+            }
+
+            with patch("logs._interaction_logger", logger):
+                assert logs.log_interaction_to_file(**kwargs) is None
+            logger.close()
+            assert logger.stats()["written"] == 1
+
+            [entry] = read_entries(Path(log_dir) / "jsonl")
+            assert entry["timestamp"].startswith("2025-01-02T")
+            assert entry["messages"][0]["content"] == kwargs["user_prompt"]
+
+            with (
+                patch("logs.LOG_FORMAT", "json"),
+                patch("logs.LOG_DIR", Path(log_dir)),
+            ):
+                path = logs.log_interaction_to_file(**kwargs)
+            assert json.loads(path.read_text())["agent_name"] == "gitsensei_web"
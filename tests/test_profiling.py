@@ -0,0 +1,88 @@
+"""
+Unit tests for on-demand request profiling.
+"""
+
+import os
+import pstats
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+
+import ingest
+import profiling
+import search_agent
+import tracing
+from async_runner import AsyncRunner
+from src.evaluation import stand_in_model
+
+
+DOCS = [
+    {"filename": "faq/kafka.md", "content": "How to install Kafka with docker"},
+]
+
+
+def allocate():
+    return [str(i) * 10 for i in range(20000)]
+
+
+class TestProfiling:
+    """Test cases for profiled blocks and sampling"""
+
+    def test_profile_files(self):
+        """Test that a profiled block saves pstats and an allocation report"""
+        with tempfile.TemporaryDirectory() as profile_dir:
+            with profiling.profiled("ingest", enabled=True, directory=profile_dir) as profile:
+                kept = allocate()
+
+            assert profile.saved
+            assert profile.seconds > 0
+            assert profile.peak_mb > 0.5
+            assert profile.stats_path.parent == Path(profile_dir)
+            stats = pstats.Stats(str(profile.stats_path))
+            assert any(func[2] == "allocate" for func in stats.stats)
+
+            report = profile.report_path.read_text()
+            assert "Top functions by cumulative time" in report
+            assert f"{Path(__file__).name}:" in report.split("Top allocation sites")[1]
+            assert len(kept) == 20000
+
+    def test_sampling(self):
+        """Test that unsampled and concurrent blocks are not profiled"""
+        assert profiling.sampled(1.0)
+        assert not profiling.sampled(0)
+
+        with tempfile.TemporaryDirectory() as profile_dir:
+            with patch("profiling.PROFILE_SAMPLE_RATE", 0):
+                with profiling.profiled("agent.run", directory=profile_dir) as profile:
+                    allocate()
+            assert not profile.saved
+
+            with profiling.profiled("outer", enabled=True, directory=profile_dir) as outer:
+                with profiling.profiled("inner", enabled=True, directory=profile_dir) as inner:
+                    allocate()
+            assert outer.saved and not inner.saved
+            assert len(list(Path(profile_dir).glob("*.pstats"))) == 1
+
+    def test_agent_run_on_background_loop(self):
+        """Test profiling an agent run submitted to the runner, linked to its trace"""
+        with patch.dict(os.environ, {"GOOGLE_API_KEY": "test-key"}):
+            agent = search_agent.init_agent(ingest.fit_index(DOCS), "owner", "repo")
+        runner = AsyncRunner(max_concurrency=2, timeout=5)
+
+        with (
+            tempfile.TemporaryDirectory() as profile_dir,
+            patch("profiling.PROFILE_DIRECTORY", Path(profile_dir)),
+        ):
+            try:
+                with tracing.span("request") as request:
+                    coro = agent.run("How do I install Kafka?", model=stand_in_model())
+                    result = runner.run(profiling.profile_coro(coro, enabled=True))
+            finally:
+                runner.close()
+
+            assert "faq/kafka.md" in result.output
+            stats_path = Path(request.attributes["profile"])
+            assert stats_path.exists()
+            assert request.trace.trace_id in stats_path.name
+            stats = pstats.Stats(str(stats_path))
+            assert any(func[2] == "search" for func in stats.stats)
@@ -0,0 +1,219 @@
+"""
+Unit tests for quota-aware scheduling of model requests.
+"""
+
+import os
+import time
+import asyncio
+from unittest.mock import patch
+
+import pytest
+from google.genai.errors import ClientError
+from pydantic_ai.exceptions import ModelHTTPError
+from pydantic_ai.messages import ModelResponse, TextPart
+from pydantic_ai.models.function import FunctionModel
+
+import ingest
+import search_agent
+import streaming
+import scheduler
+from scheduler import BATCH, INTERACTIVE, Scheduler, ScheduledModel
+
+
+DOCS = [
+    {"filename": "faq/kafka.md", "content": "How to install Kafka with docker"},
+]
+
+
+class RateLimitedModel:
+    """
+    Stand-in for the API: answers at most `limit` requests per `window`
+    seconds and responds with 429 to the rest.
+    """
+
+    def __init__(self, limit, window):
+        self.limit = limit
+        self.window = window
+        self.accepted = []
+        self.rejected = 0
+
+    def _admit(self):
+        now = time.monotonic()
+        self.accepted = [t for t in self.accepted if now - t < self.window]
+        if len(self.accepted) >= self.limit:
+            self.rejected += 1
+            raise ModelHTTPError(429, "stand-in", body="RESOURCE_EXHAUSTED")
+        self.accepted.append(now)
+
+    def answer(self, messages, info):
+        self._admit()
+        return ModelResponse(parts=[TextPart("Use docker.")])
+
+    async def stream(self, messages, info):
+        self._admit()
+        for chunk in ["Use ", "docker."]:
+            yield chunk
+
+    def model(self):
+        return FunctionModel(self.answer, stream_function=self.stream)
+
+
+def make_agent():
+    with patch.dict(os.environ, {"GOOGLE_API_KEY": "test-key"}):
+        return search_agent.init_agent(ingest.fit_index(DOCS), "owner", "repo")
+
+
+class TestScheduler:
+    """Test cases for Scheduler and ScheduledModel"""
+
+    def test_requests_per_minute(self):
+        """Test that requests beyond the burst are spaced by the rate"""
+        limits = Scheduler(rpm=600, tpm=0, burst=2)
+
+        async def scenario():
+            start = time.monotonic()
+            waits = await asyncio.gather(*[limits.acquire() for _ in range(5)])
+            return waits, time.monotonic() - start
+
+        waits, elapsed = asyncio.run(scenario())
+        assert waits[:2] == [pytest.approx(0, abs=0.01)] * 2
+        assert 0.25 < elapsed < 0.6
+        assert limits.stats()["dispatched"] == 5
+        assert limits.stats()["wait_max_s"] > 0.25
+
+    def test_tokens_per_minute(self):
+        """Test that large requests wait for the token budget"""
+        limits = Scheduler(rpm=0, tpm=6000)
+
+        async def scenario():
+            await limits.acquire(tokens=6000)
+            return await limits.acquire(tokens=50)
+
+        assert 0.4 < asyncio.run(scenario()) < 0.8
+
+    def test_interactive_before_batch(self):
+        """Test that queued interactive requests go first"""
+        limits = Scheduler(rpm=1200, tpm=0, burst=1)
+        order = []
+
+        async def request(name, priority):
+            await limits.acquire(priority=priority)
+            order.append(name)
+
+        async def scenario():
+            await limits.acquire()
+            batch = [asyncio.ensure_future(request(f"batch {i}", BATCH)) for i in range(2)]
+            await asyncio.sleep(0)
+            with scheduler.request_priority(BATCH):
+                background = asyncio.ensure_future(request("batch 2", None))
+            await asyncio.sleep(0)
+            await asyncio.gather(request("interactive", INTERACTIVE), *batch, background)
+
+        asyncio.run(scenario())
+        assert order == ["interactive", "batch 0", "batch 1", "batch 2"]
+
+    def test_cancelled_request_leaves_queue(self):
+        """Test that a cancelled waiter does not hold up the next one"""
+        limits = Scheduler(rpm=600, tpm=0, burst=1)
+
+        async def scenario():
+            await limits.acquire()
+            first = asyncio.ensure_future(limits.acquire())
+            second = asyncio.ensure_future(limits.acquire())
+            await asyncio.sleep(0)
+            first.cancel()
+            await second
+            return first
+
+        assert asyncio.run(scenario()).cancelled()
+        assert limits.stats()["queued"] == 0
+        assert limits.stats()["dispatched"] == 2
+
+    def test_retries_rate_limited_requests(self):
+        """Test that 429 responses are retried after a backoff"""
+        api = RateLimitedModel(limit=1, window=0.2)
+        limits = Scheduler(rpm=0, tpm=0, backoff_base=0.1)
+        model = ScheduledModel(api.model(), scheduler=limits)
+        agent = make_agent()
+
+        async def scenario():
+            return await asyncio.gather(
+                *[agent.run("Install Kafka?", model=model) for _ in range(3)]
+            )
+
+        results = asyncio.run(scenario())
+        assert [result.output for result in results] == ["Use docker."] * 3
+        assert api.rejected > 0
+        assert limits.stats()["retries"] == api.rejected
+
+    def test_quota_prevents_rate_limits(self):
+        """Test that a matching request rate never triggers a 429"""
+        api = RateLimitedModel(limit=2, window=0.5)
+        limits = Scheduler(rpm=240, tpm=0, burst=1)
+        model = ScheduledModel(api.model(), scheduler=limits)
+        agent = make_agent()
+
+        async def scenario():
+            return await asyncio.gather(
+                *[agent.run("Install Kafka?", model=model) for _ in range(4)]
+            )
+
+        asyncio.run(scenario())
+        assert api.rejected == 0
+        assert limits.stats()["wait_max_s"] > 0.7
+
+    def test_gives_up_after_max_retries(self):
+        """Test that the 429 is raised once retries are used up"""
+        api = RateLimitedModel(limit=0, window=1)
+        limits = Scheduler(rpm=0, tpm=0, max_retries=2, backoff_base=0.01)
+        model = ScheduledModel(api.model(), scheduler=limits)
+
+        with pytest.raises(ModelHTTPError):
+            asyncio.run(make_agent().run("Install Kafka?", model=model))
+        assert api.rejected == 3
+        assert limits.stats()["rate_limited"] == 2
+
+    def test_streamed_requests_retried(self):
+        """Test that opening a stream is scheduled and retried"""
+        api = RateLimitedModel(limit=1, window=0.2)
+        limits = Scheduler(rpm=0, tpm=0, backoff_base=0.1)
+        model = ScheduledModel(api.model(), scheduler=limits)
+        agent = make_agent()
+
+        async def scenario():
+            return await asyncio.gather(
+                *[streaming.stream_answer(agent, "Install Kafka?", model=model) for _ in range(2)]
+            )
+
+        answers = asyncio.run(scenario())
+        assert [answer.output for answer in answers] == ["Use docker."] * 2
+        assert api.rejected > 0
+
+    def test_rate_limit_errors(self):
+        """Test recognition of Gemini quota errors and their retry delay"""
+        body = {
+            "error": {
+                "code": 429,
+                "status": "RESOURCE_EXHAUSTED",
+                "details": [{"retryDelay": "35s"}],
+            }
+        }
+        error = ClientError(429, body)
+
+        assert scheduler.is_rate_limit(error)
+        assert scheduler.is_rate_limit(ModelHTTPError(429, "gemini"))
+        assert not scheduler.is_rate_limit(ModelHTTPError(500, "gemini"))
+        assert not scheduler.is_rate_limit(ValueError("invalid API_KEY"))
+        assert scheduler.retry_after(error) == 35
+
+        limits = Scheduler(rpm=0, tpm=0)
+        assert limits.backoff(0, error) == 35
+        assert limits.stats()["paused_for_s"] > 30
+
+    def test_backoff_grows_with_jitter(self):
+        """Test exponential backoff bounds"""
+        limits = Scheduler(backoff_base=1, backoff_max=8)
+        for attempt, high in [(0, 1), (1, 2), (2, 4), (5, 8)]:
+            delays = [limits.backoff(attempt) for _ in range(50)]
+            assert all(high / 2 <= delay <= high for delay in delays)
+            assert len(set(delays)) > 1
@@ -0,0 +1,114 @@
+"""
+Unit tests for the sparse search engine.
+"""
+
+import pickle
+import random
+
+import numpy as np
+from minsearch import Index
+
+import ingest
+from search_engine import SearchIndex, tokenize
+
+
+WORDS = "kafka spark docker python install error setup cluster module homework".split()
+
+
+def make_docs(count, seed=1):
+    rng = random.Random(seed)
+    return [
+        {
+            "content": " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 40))),
+            "filename": f"docs/{rng.choice(WORDS)}/{i}.md",
+            "course": rng.choice(["de", "ml"]),
+        }
+        for i in range(count)
+    ]
+
+
+def minsearch_scores(index, query, boost_dict=None):
+    from sklearn.metrics.pairwise import cosine_similarity
+
+    scores = np.zeros(len(index.docs))
+    for field in index.text_fields:
+        query_vec = index.vectorizers[field].transform([query])
+        sim = cosine_similarity(query_vec, index.text_matrices[field]).flatten()
+        scores += sim * (boost_dict or {}).get(field, 1)
+    return scores
+
+
+class TestSearchEngine:
+    """Test cases for SearchIndex"""
+
+    def test_scores_match_minsearch(self):
+        """Test that scores equal minsearch cosine TF-IDF scores"""
+        docs = make_docs(200)
+        reference = Index(text_fields=["content", "filename"]).fit(docs)
+        index = SearchIndex(text_fields=["content", "filename"]).fit(docs)
+
+        for query in ["kafka docker", "install spark on cluster", "python python error"]:
+            for boost in [None, {"filename": 3}]:
+                expected = minsearch_scores(reference, query, boost)
+                doc_ids, scores = index.score(query, boost_dict=boost)
+
+                dense = np.zeros(len(docs))
+                dense[doc_ids] = scores
+                np.testing.assert_allclose(dense, expected, atol=1e-9)
+
+                top = index.search(query, boost_dict=boost, num_results=5, output_ids=True)
+                expected_top = np.sort(expected)[::-1][:5]
+                np.testing.assert_allclose(
+                    [expected[doc["_id"]] for doc in top], expected_top, atol=1e-9
+                )
+
+    def test_no_match_and_unknown_terms(self):
+        """Test queries without indexed terms"""
+        index = SearchIndex(text_fields=["content"]).fit(make_docs(10))
+
+        assert index.search("zookeeper") == []
+        assert index.search("") == []
+        assert SearchIndex(text_fields=["content"]).fit([]).search("kafka") == []
+
+    def test_keyword_filter(self):
+        """Test exact-match keyword filters"""
+        docs = make_docs(50)
+        index = SearchIndex(text_fields=["content"], keyword_fields=["course"]).fit(docs)
+
+        results = index.search("kafka", filter_dict={"course": "ml"}, num_results=50)
+        assert results
+        assert all(doc["course"] == "ml" for doc in results)
+
+        both = index.search("kafka", filter_dict={"course": ["de", "ml"]}, num_results=50)
+        assert len(both) == len(index.search("kafka", num_results=50))
+
+    def test_patch(self):
+        """Test removing and appending documents without refitting"""
+        docs = make_docs(30)
+        index = ingest.fit_index(docs, engine="native")
+        version = index.version
+
+        new_doc = {"content": "kafka kafka kafka", "filename": "docs/new.md"}
+        removed = docs[0]["filename"]
+        ingest.patch_index(index, {removed}, [new_doc])
+
+        assert index.version == version + 1
+        assert all(doc["filename"] != removed for doc in index.docs)
+        assert index.docs[-1] is new_doc
+        assert index.fields["content"].postings.shape[1] == len(index.docs)
+        top = index.search("kafka", boost_dict={"filename": 0}, num_results=1)
+        assert top[0] is new_doc
+
+    def test_pickle_round_trip(self):
+        """Test that the index survives snapshotting"""
+        index = SearchIndex(text_fields=["content", "filename"]).fit(make_docs(20))
+
+        restored = pickle.loads(pickle.dumps(index))
+
+        assert restored.search("docker spark") == index.search("docker spark")
+
+    def test_tokenize(self):
+        """Test that tokenization follows scikit-learn defaults"""
+        assert tokenize("How do I run Kafka-Connect? a 42") == [
+            "how", "do", "run", "kafka", "connect", "42"
+        ]
@@ -0,0 +1,255 @@
+"""
+Unit tests for the search tool and its result cache.
+"""
+
+import os
+import tempfile
+import threading
+from unittest.mock import patch
+
+from pydantic_ai.models.test import TestModel
+
+import ingest
+import embeddings
+import search_agent
+import search_tools
+from search_tools import HybridIndex, QueryCache, SearchTool
+from search_engine import SearchIndex
+from tests.test_embeddings import FakeEmbedder
+
+
+DOCS = [
+    {"filename": "faq/kafka.md", "content": "How to install Kafka with docker"},
+    {"filename": "faq/spark.md", "content": "Spark setup on Windows"},
+]
+
+MORE_DOCS = DOCS + [
+    {"filename": "faq/compose.md", "content": "Docker compose for Kafka and Spark"},
+    {"filename": "faq/python.md", "content": "Installing Python packages"},
+    {"filename": "faq/broker.md", "content": "Kafka broker streaming setup"},
+]
+
+QUERIES = ["install kafka", "spark windows setup", "docker", "nothing matches"]
+
+LONG_TEXT = " ".join(f"filler{i}" for i in range(600)) + (
+    " To install kafka run docker compose up. "
+) + " ".join(f"padding{i}" for i in range(600))
+
+
+class TestSearchTools:
+    """Test cases for SearchTool result caching"""
+
+    def test_normalize_query(self):
+        """Test that case, whitespace and word order do not change the key"""
+        normalize = search_tools.normalize_query
+
+        assert normalize("How to  install Kafka?") == normalize("kafka install TO how")
+        assert normalize("install kafka") != normalize("install spark")
+        assert normalize("kafka install", keep_order=True) == "kafka install"
+
+    def test_repeated_queries_hit_cache(self):
+        """Test that equivalent queries are scored only once"""
+        index = ingest.fit_index(DOCS, engine="minsearch")
+        tool = SearchTool(index, cache=QueryCache(max_size=10))
+
+        with patch.object(index, "search", wraps=index.search) as search:
+            first = tool.search("Install Kafka")
+            second = tool.search("  kafka   install ")
+            assert search.call_count == 1
+
+        assert first == second
+        assert first[0]["filename"] == "faq/kafka.md"
+        assert tool.cache_stats()["hits"] == 1
+        assert tool.cache_stats()["misses"] == 1
+
+    def test_results_are_copies(self):
+        """Test that callers cannot modify cached results"""
+        tool = SearchTool(ingest.fit_index(DOCS), cache=QueryCache())
+
+        tool.search("kafka")[0]["content"] = "changed"
+
+        assert tool.search("kafka")[0]["content"] == DOCS[0]["content"]
+
+    def test_patch_invalidates_entries(self):
+        """Test that patched and rebuilt indexes do not serve stale results"""
+        cache = QueryCache()
+        for engine in ["minsearch", "native"]:
+            index = ingest.fit_index(DOCS, engine=engine)
+            tool = SearchTool(index, cache=cache)
+            assert tool.search("kafka")[0]["content"] == DOCS[0]["content"]
+
+            new_doc = {"filename": "faq/kafka.md", "content": "Kafka on Windows"}
+            ingest.patch_index(index, {"faq/kafka.md"}, [new_doc])
+            assert tool.search("kafka")[0]["content"] == new_doc["content"]
+
+            rebuilt = SearchTool(ingest.fit_index(DOCS, engine=engine), cache=cache)
+            assert rebuilt.search("kafka")[0]["content"] == DOCS[0]["content"]
+
+        assert cache.stats()["hits"] == 0
+
+    def test_lru_eviction_and_ttl(self):
+        """Test size bound, recency order and expiry"""
+        cache = QueryCache(max_size=2, ttl=60)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.stats()["evictions"] == 1
+
+        with patch("search_tools.time.monotonic", return_value=10**9):
+            assert cache.get("a") is None
+        stats = cache.stats()
+        assert stats["expirations"] == 1
+        assert stats["size"] == 1
+        assert stats["hit_rate"] == 2 / 4
+
+    def test_disabled_cache(self):
+        """Test that a zero-size cache stores nothing"""
+        cache = QueryCache(max_size=0)
+        cache.put("a", 1)
+
+        assert cache.get("a") is None
+
+    def test_shared_across_threads(self):
+        """Test concurrent use of one cache from many sessions"""
+        cache = QueryCache(max_size=50)
+        tools = [SearchTool(ingest.fit_index(DOCS), cache=cache) for _ in range(2)]
+        errors = []
+
+        def session(tool):
+            try:
+                for i in range(200):
+                    tool.search(["kafka", "spark", f"query {i % 80}"][i % 3])
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=session, args=(tools[i % 2],)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        stats = cache.stats()
+        assert errors == []
+        assert stats["size"] <= 50
+        assert stats["hits"] + stats["misses"] == 1600
+
+    def test_batch_search_matches_single_queries(self):
+        """Test that batched scoring returns the same ranking per query"""
+        with tempfile.TemporaryDirectory() as cache_dir:
+            vectors = embeddings.VectorIndex(FakeEmbedder(), cache_dir)
+            indexes = [
+                ingest.fit_index(MORE_DOCS, engine="minsearch"),
+                ingest.fit_index(MORE_DOCS, engine="native"),
+                HybridIndex(SearchIndex(["content", "filename"]), vectors).fit(MORE_DOCS),
+            ]
+
+            for index in indexes:
+                batch = search_tools.batch_search(index, QUERIES, num_results=3)
+                single = [index.search(query, num_results=3) for query in QUERIES]
+                assert batch == single
+
+    def test_hybrid_batch_embeds_queries_once(self):
+        """Test that a batch of queries is embedded in one call"""
+        with tempfile.TemporaryDirectory() as cache_dir:
+            embedder = FakeEmbedder()
+            vectors = embeddings.VectorIndex(embedder, cache_dir)
+            index = HybridIndex(SearchIndex(["content"]), vectors).fit(MORE_DOCS)
+            embedder.encoded.clear()
+
+            index.search_many(QUERIES, num_results=2)
+
+            assert embedder.encoded == [QUERIES]
+
+    def test_search_many_merges_and_deduplicates(self):
+        """Test round-robin merging of per-query results without duplicates"""
+        tool = SearchTool(ingest.fit_index(MORE_DOCS, engine="native"), cache=QueryCache())
+
+        merged = tool.search_many(["kafka", "docker"], num_results=3)
+        filenames = [doc["filename"] for doc in merged]
+
+        kafka = [doc["filename"] for doc in tool.search("kafka")[:3]]
+        docker = [doc["filename"] for doc in tool.search("docker")[:3]]
+        assert len(filenames) == len(set(filenames))
+        assert set(filenames) == set(kafka) | set(docker)
+        assert filenames[:2] == [kafka[0], docker[0]] or kafka[0] == docker[0]
+
+    def test_search_many_uses_cache(self):
+        """Test that only uncached queries are scored"""
+        index = ingest.fit_index(MORE_DOCS, engine="native")
+        tool = SearchTool(index, cache=QueryCache())
+        tool.search_many(["kafka"], num_results=5)
+
+        with patch("search_tools.batch_search", wraps=search_tools.batch_search) as batch:
+            tool.search_many(["Kafka", "spark"], num_results=5)
+            assert batch.call_args.args[1] == ["spark"]
+
+    def test_overlapping_windows_merged(self):
+        """Test that overlapping chunks of a file become one result"""
+        chunks = ingest.sliding_window(LONG_TEXT, 2000, 1000)
+        results = [
+            {"filename": "faq/long.md", **chunks[1]},
+            {"filename": "faq/other.md", "start": 0, "content": "other"},
+            {"filename": "faq/long.md", **chunks[3]},
+            {"filename": "faq/long.md", **chunks[2]},
+        ]
+
+        merged = search_tools.merge_overlapping(results)
+
+        assert [r["filename"] for r in merged] == ["faq/long.md", "faq/other.md"]
+        assert merged[0]["start"] == chunks[1]["start"]
+        span = merged[0]["start"], merged[0]["start"] + len(merged[0]["content"])
+        assert merged[0]["content"] == LONG_TEXT[span[0]:span[1]]
+        assert span[1] == chunks[3]["start"] + len(chunks[3]["content"])
+
+    def test_snippet_centred_on_query(self):
+        """Test that long results are trimmed around the query terms"""
+        offset, snippet = search_tools.query_snippet(LONG_TEXT, "install Kafka", 300)
+
+        assert "install kafka run docker" in snippet
+        assert snippet.startswith("…") and snippet.endswith("…")
+        assert len(snippet) <= 302
+        assert LONG_TEXT[offset:].startswith(snippet.strip("…"))
+        assert search_tools.query_snippet("short text", "kafka", 300) == (0, "short text")
+        assert search_tools.query_snippet(LONG_TEXT, "kafka", 0) == (0, LONG_TEXT)
+
+    def test_search_results_compacted(self):
+        """Test that search merges chunks and respects the snippet budget"""
+        docs = [{"filename": "faq/long.md", "content": LONG_TEXT}]
+        chunks = ingest.chunk_documents(docs)
+        index = ingest.fit_index(chunks)
+
+        compact = SearchTool(index, cache=QueryCache(), snippet_chars=500)
+        full = SearchTool(index, cache=QueryCache(), snippet_chars=0, merge_overlaps=False)
+        results = compact.search("install kafka")
+
+        assert len(results) == 1
+        assert len(results[0]["content"]) <= 502
+        assert "install kafka" in results[0]["content"]
+        start = results[0]["start"]
+        assert LONG_TEXT[start:].startswith(results[0]["content"].strip("…"))
+        assert len(full.search("install kafka")) > 1
+        assert compact.search_many(["install kafka", "docker"]) == results
+
+    def test_agent_registers_search_many(self):
+        """Test that the agent can call both search tools"""
+        index = ingest.fit_index(MORE_DOCS, engine="native")
+        with patch.dict(os.environ, {"GOOGLE_API_KEY": "test-key"}):
+            agent = search_agent.init_agent(index, "owner", "repo")
+
+        result = agent.run_sync(
+            "How do I install Kafka?",
+            model=TestModel(call_tools=["search_many"]),
+        )
+
+        assert set(agent._function_toolset.tools) == {"search", "search_many"}
+        tool_returns = [
+            part
+            for message in result.all_messages()
+            for part in message.parts
+            if part.part_kind == "tool-return"
+        ]
+        assert tool_returns[0].tool_name == "search_many"
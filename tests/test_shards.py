@@ -0,0 +1,183 @@
+"""
+Unit tests for multi-repository shards.
+"""
+
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pytest
+from pydantic_ai import ModelRetry
+from pydantic_ai.models.test import TestModel
+
+import ingest
+import shards
+import search_agent
+
+
+REPO_DOCS = {
+    "acme/kafka-docs": [
+        {"filename": "install.md", "content": "How to install Kafka with docker"},
+        {"filename": "broker.md", "content": "Kafka broker configuration"},
+    ],
+    "acme/spark-docs": [
+        {"filename": "windows.md", "content": "Spark setup on Windows"},
+        {"filename": "kafka.md", "content": "Reading Kafka topics from Spark"},
+    ],
+    "other/python": [
+        {"filename": "venv.md", "content": "Python virtual environments"},
+    ],
+}
+
+
+def make_loader():
+    def loader(owner, name):
+        return ingest.fit_index(REPO_DOCS[f"{owner}/{name}"], engine="native")
+
+    return MagicMock(side_effect=loader)
+
+
+class TestShards:
+    """Test cases for ShardManager and ShardedSearchTool"""
+
+    def test_parse_repos(self):
+        """Test parsing of the GITSENSEI_REPOS setting"""
+        assert shards.parse_repos(" a/b, c/d ,") == ["a/b", "c/d"]
+        with pytest.raises(ValueError):
+            shards.parse_repos("just-a-name")
+
+    def test_shards_load_lazily_once(self):
+        """Test that a shard is loaded on first use and then reused"""
+        loader = make_loader()
+        manager = shards.ShardManager(list(REPO_DOCS), loader=loader)
+        loader.assert_not_called()
+
+        first = manager.get("acme/kafka-docs")
+        second = manager.get("kafka-docs")
+
+        assert first is second
+        loader.assert_called_once_with("acme", "kafka-docs")
+        with pytest.raises(ValueError):
+            manager.get("unknown/repo")
+
+    def test_lru_eviction_by_bytes(self):
+        """Test that least recently used shards are dropped over budget"""
+        loader = make_loader()
+        sizes = {
+            repo: shards.estimate_bytes(loader(*repo.split("/")))
+            for repo in REPO_DOCS
+        }
+        budget = sizes["acme/kafka-docs"] + sizes["acme/spark-docs"]
+        manager = shards.ShardManager(list(REPO_DOCS), loader=loader, memory_budget=budget)
+
+        manager.get("acme/kafka-docs")
+        manager.get("acme/spark-docs")
+        manager.get("acme/kafka-docs")
+        assert manager.loaded() == ["acme/spark-docs", "acme/kafka-docs"]
+
+        manager.get("other/python")
+        assert manager.loaded() == ["acme/kafka-docs", "other/python"]
+        assert manager.stats()["loaded_bytes"] <= budget
+        assert manager.stats()["evictions"] == 1
+
+    def test_estimate_bytes_counts_resident_buffers(self):
+        """Test that arrays and texts count and memory-mapped vectors do not"""
+        index = ingest.fit_index(REPO_DOCS["acme/kafka-docs"], engine="native")
+        size = shards.estimate_bytes(index)
+        texts = sum(len(doc["content"]) + len(doc["filename"]) for doc in index.docs)
+        postings = index.fields["content"].postings
+        assert size >= texts + postings.data.nbytes + postings.indptr.nbytes
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / "vectors.f32"
+            np.zeros((1000, 64), dtype=np.float32).tofile(path)
+            index.vectors = np.memmap(path, dtype=np.float32, mode="r", shape=(1000, 64))
+            assert shards.estimate_bytes(index) == size
+            index.vectors = np.array(index.vectors)
+            assert shards.estimate_bytes(index) == size + 1000 * 64 * 4
+
+    def test_oversized_shard_stays_loaded(self):
+        """Test that the shard in use is kept even if it exceeds the budget"""
+        manager = shards.ShardManager(list(REPO_DOCS), loader=make_loader(), memory_budget=1)
+
+        manager.get("acme/kafka-docs")
+        manager.get("acme/spark-docs")
+
+        assert manager.loaded() == ["acme/spark-docs"]
+
+    def test_concurrent_first_use_loads_once(self):
+        """Test that sessions asking for the same shard share one load"""
+        def slow_loader(owner, name):
+            time.sleep(0.05)
+            return ingest.fit_index(REPO_DOCS[f"{owner}/{name}"], engine="native")
+
+        loader = MagicMock(side_effect=slow_loader)
+        manager = shards.ShardManager(list(REPO_DOCS), loader=loader)
+        threads = [
+            threading.Thread(target=manager.get, args=("acme/kafka-docs",))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert loader.call_count == 1
+
+    def test_routed_and_fan_out_search(self):
+        """Test searching one repository or all of them"""
+        manager = shards.ShardManager(list(REPO_DOCS), loader=make_loader())
+
+        routed = manager.search("kafka", repo="acme/spark-docs")
+        assert {doc["repo"] for doc in routed} == {"acme/spark-docs"}
+
+        merged = manager.search("kafka", num_results=3)
+        assert len(merged) == 3
+        assert {doc["repo"] for doc in merged} == {"acme/kafka-docs", "acme/spark-docs"}
+
+        scored = []
+        for repo in ["acme/kafka-docs", "acme/spark-docs"]:
+            doc_ids, scores = manager.get(repo).top_k("kafka", 5)
+            scored += [(score, repo, int(i)) for i, score in zip(doc_ids, scores)]
+        best = max(scored)
+        assert merged[0]["repo"] == best[1]
+        assert merged[0]["filename"] == REPO_DOCS[best[1]][best[2]]["filename"]
+
+    def test_fan_out_respects_budget(self):
+        """Test that fanning out works with room for only one shard"""
+        manager = shards.ShardManager(list(REPO_DOCS), loader=make_loader(), memory_budget=1)
+
+        results = manager.search_many(["kafka", "python"], num_results=2)
+
+        assert {doc["repo"] for doc in results[0]} <= {"acme/kafka-docs", "acme/spark-docs"}
+        assert [doc["repo"] for doc in results[1]] == ["other/python"]
+        assert manager.loaded() == ["other/python"]
+        assert manager.stats()["loads"] == 3
+
+    def test_tool_reports_unknown_repo_to_model(self):
+        """Test that a bad repo argument asks the model to retry"""
+        tool = shards.ShardedSearchTool(
+            shards.ShardManager(list(REPO_DOCS), loader=make_loader())
+        )
+
+        with pytest.raises(ModelRetry):
+            tool.search("kafka", repo="nope")
+
+        merged = tool.search_many(["kafka", "windows"], num_results=2)
+        keys = [(doc["repo"], doc["filename"]) for doc in merged]
+        assert len(keys) == len(set(keys))
+
+    def test_sharded_agent(self):
+        """Test that the multi-repository agent exposes the sharded tools"""
+        manager = shards.ShardManager(list(REPO_DOCS), loader=make_loader())
+        with patch.dict(os.environ, {"GOOGLE_API_KEY": "test-key"}):
+            agent = search_agent.init_sharded_agent(manager)
+
+        agent.run_sync("Kafka?", model=TestModel(call_tools=["search"]))
+
+        assert set(agent._function_toolset.tools) == {"search", "search_many"}
+        assert manager.stats()["loads"] == len(REPO_DOCS)
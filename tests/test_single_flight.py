@@ -0,0 +1,234 @@
+"""
+Unit tests for coalescing identical concurrent requests.
+"""
+
+import os
+import asyncio
+from unittest.mock import patch
+
+import pytest
+from pydantic_ai.models.function import FunctionModel
+
+import ingest
+import search_agent
+import streaming
+from async_runner import AsyncRunner
+from single_flight import SingleFlight, request_key
+
+
+DOCS = [
+    {"filename": "faq/kafka.md", "content": "How to install Kafka with docker"},
+]
+
+
+class Slow:
+    """Factory that counts its runs and finishes when released."""
+
+    def __init__(self, result="answer", error=None):
+        self.result = result
+        self.error = error
+        self.calls = 0
+        self.cancelled = False
+        self.release = None
+
+    def __call__(self, publish):
+        self.calls += 1
+        return self.run(publish)
+
+    async def run(self, publish):
+        self.release = self.release or asyncio.Event()
+        publish("chunk 1")
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        publish("chunk 2")
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+class TestSingleFlight:
+    """Test cases for SingleFlight"""
+
+    def test_request_key(self):
+        """Test that prompts differing in case and whitespace share a key"""
+        assert request_key("How do I install Kafka?", "s") == request_key(
+            " how do I  install KAFKA?", "s"
+        )
+        assert request_key("Should I use Python 3?", "s") != request_key(
+            "Should I use Python 2?", "s"
+        )
+        assert request_key("Is R supported?", "s") != request_key("Is C supported?", "s")
+        assert request_key("install kafka", "s") != request_key("kafka install", "s")
+        assert request_key("install kafka", "s") != request_key("install kafka", "t")
+
+    def test_concurrent_calls_share_one_run(self):
+        """Test that identical concurrent requests start a single run"""
+        flight = SingleFlight()
+        factory = Slow()
+
+        async def scenario():
+            waiters = [asyncio.ensure_future(flight.run("k", factory)) for _ in range(5)]
+            other = asyncio.ensure_future(flight.run("other", Slow("other")))
+            await settle()
+            factory.release.set()
+            results = await asyncio.gather(*waiters)
+            other.cancel()
+            return results
+
+        assert asyncio.run(scenario()) == ["answer"] * 5
+        assert factory.calls == 1
+        assert flight.stats() == {"in_flight": 0, "started": 2, "joined": 4, "cancelled": 1}
+
+    def test_one_character_difference_gets_own_run(self):
+        """Test that prompts differing only in a 1-character token do not share a run"""
+        flight = SingleFlight()
+        factories = {"Should I use Python 3?": Slow("3"), "Should I use Python 2?": Slow("2")}
+
+        async def scenario():
+            waiters = [
+                asyncio.ensure_future(flight.run(request_key(prompt, "s"), factory))
+                for prompt, factory in factories.items()
+            ]
+            await settle()
+            for factory in factories.values():
+                factory.release.set()
+            return await asyncio.gather(*waiters)
+
+        assert asyncio.run(scenario()) == ["3", "2"]
+        assert [factory.calls for factory in factories.values()] == [1, 1]
+        assert flight.stats()["joined"] == 0
+
+    def test_errors_reach_every_waiter(self):
+        """Test that a failed run fails all waiters and is not reused"""
+        flight = SingleFlight()
+        factory = Slow(error=ValueError("quota"))
+
+        async def scenario():
+            waiters = [asyncio.ensure_future(flight.run("k", factory)) for _ in range(3)]
+            await settle()
+            factory.release.set()
+            results = await asyncio.gather(*waiters, return_exceptions=True)
+            factory.error, factory.release = None, asyncio.Event()
+            factory.release.set()
+            return results, await flight.run("k", factory)
+
+        results, retry = asyncio.run(scenario())
+        assert all(isinstance(result, ValueError) for result in results)
+        assert retry == "answer"
+        assert factory.calls == 2
+
+    def test_cancelled_waiter_does_not_cancel_others(self):
+        """Test that cancelling one waiter leaves the shared run going"""
+        flight = SingleFlight()
+        factory = Slow()
+
+        async def scenario():
+            first = asyncio.ensure_future(flight.run("k", factory))
+            second = asyncio.ensure_future(flight.run("k", factory))
+            await settle()
+            first.cancel()
+            await settle()
+            factory.release.set()
+            return first, await second
+
+        first, result = asyncio.run(scenario())
+        assert first.cancelled()
+        assert result == "answer"
+        assert not factory.cancelled
+        assert flight.stats()["cancelled"] == 0
+
+    def test_last_waiter_leaving_cancels_run(self):
+        """Test that an abandoned run is cancelled and not joined later"""
+        flight = SingleFlight()
+        factory = Slow()
+
+        async def scenario():
+            waiters = [asyncio.ensure_future(flight.run("k", factory)) for _ in range(2)]
+            await settle()
+            for waiter in waiters:
+                waiter.cancel()
+            await settle()
+            factory.release = asyncio.Event()
+            factory.release.set()
+            return await flight.run("k", factory)
+
+        assert asyncio.run(scenario()) == "answer"
+        assert factory.cancelled
+        assert factory.calls == 2
+        assert flight.stats()["cancelled"] == 1
+
+    def test_progress_replayed_to_late_waiters(self):
+        """Test that a joining waiter first receives earlier progress"""
+        flight = SingleFlight()
+        factory = Slow()
+        early, late = [], []
+
+        async def scenario():
+            first = asyncio.ensure_future(flight.run("k", factory, early.append))
+            await settle()
+            second = asyncio.ensure_future(flight.run("k", factory, late.append))
+            await settle()
+            factory.release.set()
+            await asyncio.gather(first, second)
+
+        asyncio.run(scenario())
+        assert early == late == ["chunk 1", "chunk 2"]
+
+    def test_timeout_of_one_session_on_runner(self):
+        """Test per-waiter timeouts on the background loop"""
+        runner = AsyncRunner()
+        flight = SingleFlight()
+        factory = Slow()
+        try:
+            patient = runner.submit(flight.run("k", factory), timeout=5)
+            with pytest.raises(TimeoutError):
+                runner.run(flight.run("k", factory), timeout=0.05)
+
+            runner.loop.call_soon_threadsafe(factory.release.set)
+            assert patient.result() == "answer"
+            assert factory.calls == 1
+        finally:
+            runner.close()
+
+    def test_streamed_answers_shared(self):
+        """Test that concurrent streams of one question call the model once"""
+        calls = []
+
+        async def stream_chunks(messages, info):
+            calls.append(1)
+            for chunk in ["Use ", "docker."]:
+                await asyncio.sleep(0.05)
+                yield chunk
+
+        with patch.dict(os.environ, {"GOOGLE_API_KEY": "test-key"}):
+            agent = search_agent.init_agent(ingest.fit_index(DOCS), "owner", "repo")
+        model = FunctionModel(stream_function=stream_chunks)
+        runner = AsyncRunner()
+        flight = SingleFlight()
+        try:
+            streams = [
+                streaming.stream_in_background(
+                    runner,
+                    agent,
+                    prompt,
+                    flight=flight,
+                    key=request_key(prompt, "scope"),
+                    model=model,
+                )
+                for prompt in ["Install Kafka?", "install  kafka?"]
+            ]
+
+            for chunks, future in streams:
+                assert list(chunks) == ["Use ", "docker."]
+                assert future.result().output == "Use docker."
+            assert len(calls) == 1
+        finally:
+            runner.close()
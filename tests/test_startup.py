@@ -0,0 +1,100 @@
+"""
+Unit tests for fast CLI startup: lazy imports and the background agent build.
+"""
+
+import sys
+import tempfile
+import textwrap
+import subprocess
+from pathlib import Path
+
+import pytest
+
+import main
+from lazy_import import lazy_import
+from benchmarks import bench_startup
+
+
+ROOT = Path(__file__).resolve().parent.parent
+
+HEAVY_MODULES = ["pydantic_ai.agent", "pandas.core", "sklearn", "scipy.sparse._csr"]
+
+IMPORTTIME = """\
+import time: self [us] | cumulative | imported package
+import time:       100 |        100 | site
+import time:       300 |        300 |     numpy.core
+import time:       200 |        500 |   numpy
+import time:        50 |         50 |   tracing
+import time:        25 |        575 | main
+"""
+
+
+class TestStartup:
+    """Test cases for lazy imports and background startup"""
+
+    def test_lazy_import(self):
+        """Test that a lazily imported module runs on first attribute access"""
+        with tempfile.TemporaryDirectory() as module_dir:
+            Path(module_dir, "lazy_probe.py").write_text(
+                textwrap.dedent(
+                    """
+                    import builtins
+                    builtins.lazy_probe_loaded = True
+                    VALUE = 42
+                    """
+                )
+            )
+            sys.path.insert(0, module_dir)
+            try:
+                import builtins
+
+                probe = lazy_import("lazy_probe")
+                assert not hasattr(builtins, "lazy_probe_loaded")
+                assert probe.VALUE == 42
+                assert builtins.lazy_probe_loaded
+                assert lazy_import("lazy_probe") is probe
+                del builtins.lazy_probe_loaded
+            finally:
+                sys.path.remove(module_dir)
+                sys.modules.pop("lazy_probe", None)
+
+        with pytest.raises(ModuleNotFoundError):
+            lazy_import("no_such_module_here")
+
+    def test_cli_import_is_light(self):
+        """Test that importing the CLI loads no heavy dependency and creates no log directory"""
+        with tempfile.TemporaryDirectory() as work_dir:
+            code = (
+                "import sys, main\n"
+                f"print([m for m in {HEAVY_MODULES!r} if m in sys.modules])\n"
+                "import logs"
+            )
+            out = subprocess.run(
+                [sys.executable, "-c", code],
+                cwd=work_dir,
+                env={"PYTHONPATH": str(ROOT), "LOGS_DIRECTORY": "logs", "PATH": ""},
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+            assert out.stdout.strip() == "[]"
+            assert not (Path(work_dir) / "logs").exists()
+
+    def test_background_result(self):
+        """Test that the background build hands over its result or its error"""
+        assert main.in_background(lambda x: x * 2, 21).result(timeout=5) == 42
+
+        def fail():
+            raise RuntimeError("no index")
+
+        with pytest.raises(RuntimeError, match="no index"):
+            main.in_background(fail).result(timeout=5)
+
+    def test_parse_importtime(self):
+        """Test parsing -X importtime output for one entry point"""
+        rows = bench_startup.parse_importtime(IMPORTTIME)
+        assert rows[1] == ("numpy.core", 300, 300, 2)
+
+        entry = bench_startup.entry_rows(rows, "main")
+        assert [row[0] for row in entry] == ["numpy.core", "numpy", "tracing", "main"]
+        assert [row[0] for row in bench_startup.heaviest(entry, 5)] == ["numpy", "tracing"]
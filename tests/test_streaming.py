@@ -0,0 +1,187 @@
+"""
+Unit tests for streamed agent answers.
+"""
+
+import os
+import json
+import asyncio
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+from pydantic_ai.models.function import DeltaToolCall, FunctionModel
+from pydantic_ai.models.test import TestModel
+
+import ingest
+import logs
+import log_store
+import search_agent
+import streaming
+from async_runner import AsyncRunner
+
+
+DOCS = [
+    {"filename": "faq/kafka.md", "content": "How to install Kafka with docker"},
+]
+
+CHUNKS = ["Use ", "docker ", "compose."]
+
+
+async def stream_chunks(messages, info):
+    for chunk in CHUNKS:
+        await asyncio.sleep(0.01)
+        yield chunk
+
+
+async def stream_failure(messages, info):
+    yield "partial"
+    raise RuntimeError("connection lost")
+
+
+async def stream_preamble_then_search(messages, info):
+    if len(messages) == 1:
+        yield "Let me search. "
+        yield {0: DeltaToolCall(name="search", json_args='{"query": "kafka"}', tool_call_id="c1")}
+    else:
+        for chunk in CHUNKS:
+            yield chunk
+
+
+def make_agent():
+    with patch.dict(os.environ, {"GOOGLE_API_KEY": "test-key"}):
+        return search_agent.init_agent(ingest.fit_index(DOCS), "owner", "repo")
+
+
+class TestStreaming:
+    """Test cases for streaming answers"""
+
+    def test_deltas_arrive_in_order(self):
+        """Test that every chunk is passed on and the output is complete"""
+        received = []
+
+        answer = asyncio.run(
+            streaming.stream_answer(
+                make_agent(),
+                "Kafka?",
+                on_delta=received.append,
+                model=FunctionModel(stream_function=stream_chunks),
+            )
+        )
+
+        assert received == CHUNKS
+        assert answer.output == "".join(CHUNKS)
+        assert 0 < answer.ttft < answer.latency
+        assert answer.messages[-1].parts[0].content == answer.output
+
+    def test_tool_calls_before_answer(self):
+        """Test that tool calls run before streaming and are in the messages"""
+        answer = asyncio.run(
+            streaming.stream_answer(
+                make_agent(), "Kafka?", model=TestModel(call_tools=["search"])
+            )
+        )
+
+        kinds = [part.part_kind for message in answer.messages for part in message.parts]
+        assert "tool-return" in kinds
+        assert answer.output
+
+    def test_text_before_tool_call(self):
+        """Test that text before a tool call does not end the run"""
+        received = []
+
+        answer = asyncio.run(
+            streaming.stream_answer(
+                make_agent(),
+                "Kafka?",
+                on_delta=received.append,
+                model=FunctionModel(stream_function=stream_preamble_then_search),
+            )
+        )
+
+        assert received == ["Let me search. ", "\n\n"] + CHUNKS
+        assert answer.output == "".join(CHUNKS)
+        returns = [
+            part
+            for message in answer.messages
+            for part in message.parts
+            if part.part_kind == "tool-return"
+        ]
+        assert [part.tool_name for part in returns] == ["search"]
+        assert "faq/kafka.md" in str(returns[0].content)
+        assert answer.messages[-1].parts[0].content == answer.output
+
+    def test_stream_in_background(self):
+        """Test consuming chunks in a sync thread from the background loop"""
+        runner = AsyncRunner()
+        try:
+            chunks, future = streaming.stream_in_background(
+                runner,
+                make_agent(),
+                "Kafka?",
+                model=FunctionModel(stream_function=stream_chunks),
+            )
+
+            assert list(chunks) == CHUNKS
+            assert future.result().output == "".join(CHUNKS)
+        finally:
+            runner.close()
+
+    def test_background_errors_end_stream(self):
+        """Test that a failing run ends the chunks and raises from the future"""
+        runner = AsyncRunner()
+        try:
+            chunks, future = streaming.stream_in_background(
+                runner,
+                make_agent(),
+                "Kafka?",
+                model=FunctionModel(stream_function=stream_failure),
+            )
+
+            assert list(chunks) == ["partial"]
+            with pytest.raises(RuntimeError):
+                future.result()
+        finally:
+            runner.close()
+
+    def test_ttft_logged_and_stored(self):
+        """Test that TTFT reaches the log entry and the log store"""
+        with (
+            tempfile.TemporaryDirectory() as log_dir,
+            tempfile.TemporaryDirectory() as store_dir,
+        ):
+            agent = make_agent()
+            answer = asyncio.run(
+                streaming.stream_answer(
+                    agent, "Kafka?", model=FunctionModel(stream_function=stream_chunks)
+                )
+            )
+            with (
+                patch("logs.LOG_FORMAT", "json"),
+                patch("logs.LOG_DIR", Path(log_dir)),
+            ):
+                path = logs.log_interaction_to_file(
+                    agent, answer.messages, latency=answer.latency, ttft=answer.ttft
+                )
+            assert json.loads(path.read_text())["ttft_s"] == answer.ttft
+
+            log_store.compact(log_dir, store_dir, format="csv")
+            ttft = log_store.LogStore(store_dir).latency_percentile(0.5, column="ttft_s")
+            assert ttft.iloc[0] == pytest.approx(answer.ttft)
+
+    def test_store_reads_parts_without_ttft(self):
+        """Test that parts written before the TTFT column still load"""
+        with tempfile.TemporaryDirectory() as store_dir:
+            old = log_store.to_frame(
+                [
+                    log_store.extract_record(
+                        {"messages": [], "timestamp": "2025-01-01T00:00:00"}
+                    )
+                ]
+            ).drop(columns=["ttft_s"])
+            log_store.write_part(old, store_dir, format="csv")
+
+            df = log_store.LogStore(store_dir).load()
+
+            assert list(df.columns) == log_store.COLUMNS
+            assert df["ttft_s"].isna().all()
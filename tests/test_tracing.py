@@ -0,0 +1,193 @@
+"""
+Unit tests for per-stage tracing.
+"""
+
+import os
+import json
+import asyncio
+import contextlib
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+import ingest
+import logs
+import log_store
+import search_agent
+import tracing
+from async_runner import AsyncRunner
+from scheduler import Scheduler, ScheduledModel
+from src.evaluation import stand_in_model
+
+
+DOCS = [
+    {"filename": "faq/kafka.md", "content": "How to install Kafka with docker"},
+    {"filename": "faq/spark.md", "content": "Spark needs Java to run"},
+]
+
+
+class ListExporter:
+    def __init__(self):
+        self.batches = []
+
+    def export(self, spans):
+        self.batches.append(list(spans))
+
+
+@contextlib.contextmanager
+def exporting():
+    exporter = ListExporter()
+    tracing.set_exporter(exporter)
+    try:
+        yield exporter
+    finally:
+        tracing.set_exporter(None)
+
+
+class TestTracing:
+    """Test cases for spans, request summaries and exporters"""
+
+    def test_nested_spans_and_summary(self):
+        """Test nesting, errors and the per-request summary"""
+        with exporting() as exporter:
+            with tracing.span("request") as request:
+                with tracing.span(tracing.MODEL_SPAN, queue_wait_s=0.5):
+                    pass
+                with tracing.span("tool.search", kind=tracing.TOOL_KIND) as tool:
+                    assert tracing.current_span() is tool
+                with pytest.raises(ValueError):
+                    with tracing.span("tool.search", kind=tracing.TOOL_KIND):
+                        raise ValueError("no index")
+                tracing.record("ingest.parse", 0.25, files=3)
+
+            assert tracing.current_span() is None
+            summary = request.summary()
+            assert summary["model_calls"] == 1
+            assert summary["tool_calls"] == 2
+            assert summary["queue_wait_s"] == 0.5
+            assert summary["total_s"] >= summary["model_s"] + summary["tool_s"]
+
+            [spans] = exporter.batches
+            assert {s.parent_id for s in spans if s is not request} == {request.span_id}
+            assert {s.trace.trace_id for s in spans} == {summary["trace_id"]}
+            assert spans[2].error == "ValueError: no index"
+            assert spans[3].duration == 0.25
+
+    def test_traced_functions(self):
+        """Test the decorator on functions and coroutine functions"""
+        with exporting() as exporter:
+
+            @tracing.traced("sync.step")
+            def step():
+                return tracing.current_span().name
+
+            @tracing.traced()
+            async def async_step():
+                await asyncio.sleep(0)
+                return step()
+
+            assert asyncio.run(async_step()) == "sync.step"
+            [spans] = exporter.batches
+            assert [s.name for s in spans] == [
+                "sync.step",
+                "TestTracing.test_traced_functions.<locals>.async_step",
+            ]
+
+    def test_background_loop_joins_trace(self):
+        """Test that work submitted to the runner's loop thread joins the caller's trace"""
+        with exporting() as exporter:
+            runner = AsyncRunner(max_concurrency=2, timeout=5)
+
+            async def background(name):
+                with tracing.span(name, kind=tracing.TOOL_KIND):
+                    await asyncio.sleep(0.01)
+
+            try:
+                with tracing.span("request") as request:
+                    runner.run(background("first"))
+                    runner.submit(background("second")).result()
+                runner.run(background("untraced"))
+            finally:
+                runner.close()
+
+            assert request.summary()["tool_calls"] == 2
+            assert [[s.name for s in batch] for batch in exporter.batches] == [
+                ["first", "second", "request"],
+                ["untraced"],
+            ]
+
+    def test_agent_run_summary(self):
+        """Test that model requests and tool calls of an agent run are counted"""
+        with exporting():
+            with patch.dict(os.environ, {"GOOGLE_API_KEY": "test-key"}):
+                agent = search_agent.init_agent(ingest.fit_index(DOCS), "owner", "repo")
+            model = ScheduledModel(stand_in_model(), scheduler=Scheduler(rpm=0, tpm=0))
+
+            async def ask():
+                with tracing.span("request") as request:
+                    result = await agent.run("How do I install Kafka?", model=model)
+                return request, result
+
+            request, result = asyncio.run(ask())
+            assert "faq/kafka.md" in result.output
+            summary = request.summary()
+            assert summary["model_calls"] == 2
+            assert summary["tool_calls"] == 1
+            [tool] = [s for s in request.spans() if s.name == "tool.search"]
+            assert tool.parent_id == request.span_id
+            assert tool.attributes["results"] > 0
+
+    def test_file_export_formats(self):
+        """Test the JSONL and OTLP/JSON file formats"""
+        with tempfile.TemporaryDirectory() as trace_dir:
+            for format in ("jsonl", "otlp"):
+                path = Path(trace_dir) / format / "spans.jsonl"
+                file_exporter = tracing.FileExporter(path, format)
+                tracing.set_exporter(file_exporter)
+                try:
+                    with tracing.span("request", source="cli"):
+                        with tracing.span("ingest.fit", docs=2, hybrid=False):
+                            pass
+                finally:
+                    tracing.set_exporter(None)
+                    file_exporter.close()
+
+                lines = [json.loads(line) for line in path.read_text().splitlines()]
+                if format == "jsonl":
+                    assert [line["name"] for line in lines] == ["ingest.fit", "request"]
+                    assert lines[0]["parent_id"] == lines[1]["span_id"]
+                    assert lines[0]["attributes"] == {"docs": 2, "hybrid": False}
+                else:
+                    [request] = lines
+                    spans = request["resourceSpans"][0]["scopeSpans"][0]["spans"]
+                    assert spans[0]["parentSpanId"] == spans[1]["spanId"]
+                    assert {"key": "docs", "value": {"intValue": "2"}} in spans[0]["attributes"]
+                    assert int(spans[1]["endTimeUnixNano"]) >= int(spans[1]["startTimeUnixNano"])
+
+            with pytest.raises(ValueError):
+                tracing.FileExporter(Path(trace_dir) / "x", "xml")
+
+    def test_summary_logged_with_interaction(self):
+        """Test that the request summary reaches the log entry and the log store"""
+        with tempfile.TemporaryDirectory() as log_dir:
+            with tracing.span("request") as request:
+                with tracing.span(tracing.MODEL_SPAN):
+                    pass
+                with (
+                    patch("logs.LOG_FORMAT", "json"),
+                    patch("logs.LOG_DIR", Path(log_dir)),
+                ):
+                    path = logs.log_interaction_to_file(
+                        agent_name="gitsensei_web",
+                        user_prompt="How do I install Kafka?",
+                        agent_response="Use docker",
+                        trace=request.summary(),
+                    )
+
+            entry = json.loads(path.read_text())
+            assert entry["trace"]["model_calls"] == 1
+            record = log_store.extract_record(entry)
+            assert record["model_s"] == entry["trace"]["model_s"]
+            assert record["tool_s"] == 0
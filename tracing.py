@@ -0,0 +1,325 @@
+"""
+Lightweight tracing of request stages.
+
+    with tracing.span("request", question=question) as request:
+        ...
+    request.summary()  # total, model and tool time, tool calls
+
+    @tracing.traced("ingest.fit")
+    def fit(...): ...
+
+Spans nest through a context variable, so they follow asyncio tasks. Work
+submitted to another thread's event loop joins the caller's trace when the
+coroutine is wrapped with `bind`. Timings use `time.perf_counter`.
+
+Finished traces are exported when their root span ends. Set
+`TRACE_EXPORT=jsonl` to write one JSON object per span, or
+`TRACE_EXPORT=otlp` to write OTLP/JSON export requests (one per line, as
+read by the OpenTelemetry Collector's `otlpjsonfile` receiver), to
+`TRACE_FILE`. Spans are recorded for request summaries either way.
+"""
+
+import os
+import json
+import time
+import atexit
+import secrets
+import inspect
+import functools
+import threading
+import contextvars
+from pathlib import Path
+
+
+TRACE_EXPORT = os.getenv("TRACE_EXPORT", "").lower()
+
+TRACE_FILE = Path(os.getenv("TRACE_FILE", "traces/spans.jsonl"))
+
+SERVICE_NAME = "gitsensei"
+
+# Spans every model request and tool call is recorded under
+MODEL_SPAN = "model.request"
+TOOL_KIND = "tool"
+
+_current = contextvars.ContextVar("current_span", default=None)
+
+
+class _Trace:
+    def __init__(self):
+        self.trace_id = secrets.token_hex(16)
+        self.spans = []
+        self.exported = False
+        self.lock = threading.Lock()
+
+
+class Span:
+    """A timed stage with attributes; use `span()` to create one."""
+
+    def __init__(self, name, parent=None, attributes=None):
+        self.name = name
+        self.trace = parent.trace if parent is not None else _Trace()
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attributes = dict(attributes or {})
+        self.error = None
+        self.start_time_ns = time.time_ns()
+        self._start = time.perf_counter()
+        self.duration = None
+        self._exported = False
+
+    @property
+    def is_root(self):
+        return self.parent_id is None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+        return self
+
+    def end(self, error=None, duration=None):
+        if self.duration is not None:
+            return
+        self.duration = duration if duration is not None else time.perf_counter() - self._start
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        with self.trace.lock:
+            self.trace.spans.append(self)
+            if not (self.is_root or self.trace.exported):
+                return
+            pending = [s for s in self.trace.spans if not s._exported]
+            for s in pending:
+                s._exported = True
+            self.trace.exported = True
+        exporter = get_exporter()
+        if exporter is not None:
+            exporter.export(pending)
+
+    def spans(self):
+        """Finished spans of this span's trace, including itself once ended."""
+        with self.trace.lock:
+            return list(self.trace.spans)
+
+    def summary(self):
+        """
+        Where the time of this span went: total seconds, seconds in model
+        requests (and their queue wait) and in tool calls, and call counts.
+        """
+        spans = [s for s in self.spans() if s is not self]
+        model = [s for s in spans if s.name == MODEL_SPAN]
+        tools = [s for s in spans if s.attributes.get("kind") == TOOL_KIND]
+        total = self.duration if self.duration is not None else time.perf_counter() - self._start
+        return {
+            "trace_id": self.trace.trace_id,
+            "total_s": total,
+            "model_s": sum(s.duration for s in model),
+            "model_calls": len(model),
+            "queue_wait_s": sum(s.attributes.get("queue_wait_s", 0.0) for s in model),
+            "tool_s": sum(s.duration for s in tools),
+            "tool_calls": len(tools),
+        }
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start_time_ns / 1e9,
+            "duration_s": self.duration,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class span:
+    """
+    Context manager timing a stage as a child of the current span:
+    `with span("ingest.fit", docs=n) as s: ...; s.set(engine="native")`.
+    An exception ends the span with its error and is re-raised.
+    """
+
+    def __init__(self, name, **attributes):
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self):
+        self.span = Span(self.name, _current.get(), self.attributes)
+        self._token = _current.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        _current.reset(self._token)
+        self.span.end(error=exc)
+        return False
+
+
+def traced(name=None, **attributes):
+    """Decorator running every call of a function or coroutine function in a span."""
+
+    def decorate(func):
+        span_name = name or func.__qualname__
+
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(span_name, **attributes):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name, **attributes):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def start_span(name, **attributes):
+    """
+    Child span of the current span that does not become current; call
+    `end()` on it. For stages that do not map to one block of code.
+    """
+    return Span(name, _current.get(), attributes)
+
+
+def record(name, duration, **attributes):
+    """
+    Add a finished child span of `duration` seconds, for time accumulated
+    across many small steps (e.g. parsing each file of an archive).
+    """
+    finished = Span(name, _current.get(), attributes)
+    finished.end(duration=duration)
+    return finished
+
+
+def current_span():
+    return _current.get()
+
+
+async def _in_span(parent, coro):
+    token = _current.set(parent)
+    try:
+        return await coro
+    finally:
+        _current.reset(token)
+
+
+def bind(coro):
+    """
+    `coro` running under the current span wherever it is awaited, e.g. on
+    the background event loop of `async_runner`.
+    """
+    parent = _current.get()
+    if parent is None:
+        return coro
+    return _in_span(parent, coro)
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def otlp_request(spans):
+    """OTLP/JSON `ExportTraceServiceRequest` for finished spans."""
+    otlp_spans = []
+    for s in spans:
+        start = s.start_time_ns
+        otlp_span = {
+            "traceId": s.trace.trace_id,
+            "spanId": s.span_id,
+            "name": s.name,
+            "kind": 1,
+            "startTimeUnixNano": str(start),
+            "endTimeUnixNano": str(start + int(s.duration * 1e9)),
+            "attributes": [
+                {"key": key, "value": _otlp_value(value)}
+                for key, value in s.attributes.items()
+            ],
+            "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+        }
+        if s.parent_id is not None:
+            otlp_span["parentSpanId"] = s.parent_id
+        otlp_spans.append(otlp_span)
+
+    return {
+        "resourceSpans": [
+            {
+                "resource": {
+                    "attributes": [
+                        {"key": "service.name", "value": {"stringValue": SERVICE_NAME}}
+                    ]
+                },
+                "scopeSpans": [{"scope": {"name": "gitsensei.tracing"}, "spans": otlp_spans}],
+            }
+        ]
+    }
+
+
+class FileExporter:
+    """
+    Appends finished traces to `path`: one line per span ("jsonl") or one
+    OTLP/JSON export request per trace ("otlp").
+    """
+
+    def __init__(self, path=TRACE_FILE, format="jsonl"):
+        if format not in ("jsonl", "otlp"):
+            raise ValueError(f"Unknown trace export format: {format}")
+        self.path = Path(path)
+        self.format = format
+        self._file = None
+        self._lock = threading.Lock()
+
+    def export(self, spans):
+        if not spans:
+            return
+        if self.format == "otlp":
+            lines = json.dumps(otlp_request(spans)) + "\n"
+        else:
+            lines = "".join(json.dumps(s.to_dict(), default=str) + "\n" for s in spans)
+        with self._lock:
+            if self._file is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._file = self.path.open("a", encoding="utf-8")
+            self._file.write(lines)
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+_exporter = None
+_exporter_configured = False
+_exporter_lock = threading.Lock()
+
+
+def get_exporter():
+    """The exporter configured by `TRACE_EXPORT`, or None."""
+    global _exporter, _exporter_configured
+    if not _exporter_configured:
+        with _exporter_lock:
+            if not _exporter_configured:
+                if TRACE_EXPORT:
+                    _exporter = FileExporter(TRACE_FILE, TRACE_EXPORT)
+                    atexit.register(_exporter.close)
+                _exporter_configured = True
+    return _exporter
+
+
+def set_exporter(exporter):
+    """Export traces with `exporter` (anything with `export(spans)`), or stop with None."""
+    global _exporter, _exporter_configured
+    with _exporter_lock:
+        _exporter = exporter
+        _exporter_configured = True